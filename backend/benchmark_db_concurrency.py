@@ -0,0 +1,154 @@
+"""
+Database concurrency benchmark: plain driver defaults vs the tuned profile
+
+Worker threads commit stage updates and idea batches (what pipelines do)
+while reader threads run the API's run status and idea list queries.
+Reports throughput, p99 latency and "database is locked" errors for
+DATABASE_PROFILE=plain and DATABASE_PROFILE=tuned.
+
+Run with: python benchmark_db_concurrency.py [--writers 8] [--readers 16] [--seconds 10]
+          [--database-url postgresql://...]   (default: a throwaway SQLite file)
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from src.models import Base, Run, Idea
+from src.models.profiles import PROFILES, create_sync_engine
+
+STAGES = ['Поиск реальных болей пользователей', 'Анализ найденных болей', 'Генерация бизнес-идей']
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {'read': [], 'write': []}
+        self.errors = {'read': 0, 'write': 0}
+        self.locked = 0
+
+    def record(self, kind: str, seconds: float):
+        with self.lock:
+            self.latencies[kind].append(seconds * 1000)
+
+    def error(self, kind: str, error: Exception):
+        with self.lock:
+            self.errors[kind] += 1
+            if 'locked' in str(error):
+                self.locked += 1
+
+
+def writer(Session, run_ids, stop, stats: Stats):
+    """One pipeline: stage updates, then a batch of ideas, in its own transactions"""
+    index = 0
+    while not stop.is_set():
+        run_id = run_ids[index % len(run_ids)]
+        index += 1
+        started = time.perf_counter()
+        db = Session()
+        try:
+            run = db.get(Run, run_id)
+            run.current_stage = STAGES[index % len(STAGES)]
+            db.commit()
+            for order in range(5):
+                db.add(Idea(
+                    run_id=run_id, title=f"Idea {order}", pain_description="pain " * 50, segment="segment",
+                    confidence_level='high', brief_evidence="evidence", plan_7days="plan", plan_30days="plan",
+                    order_index=order
+                ))
+            run.ideas_count = (run.ideas_count or 0) + 5
+            db.commit()
+            stats.record('write', time.perf_counter() - started)
+        except OperationalError as e:
+            db.rollback()
+            stats.error('write', e)
+        finally:
+            db.close()
+
+
+def reader(Session, run_ids, stop, stats: Stats):
+    """API reads: run status and its idea list"""
+    index = 0
+    while not stop.is_set():
+        run_id = run_ids[index % len(run_ids)]
+        index += 1
+        started = time.perf_counter()
+        db = Session()
+        try:
+            db.get(Run, run_id).to_dict()
+            ideas = db.query(Idea).filter(Idea.run_id == run_id).order_by(Idea.order_index).limit(50).all()
+            [idea.to_dict_brief() for idea in ideas]
+            stats.record('read', time.perf_counter() - started)
+        except OperationalError as e:
+            stats.error('read', e)
+        finally:
+            db.close()
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def bench(database_url: str, profile: str, writers: int, readers: int, seconds: float) -> Stats:
+    engine = create_sync_engine(database_url, profile)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    run_ids = [str(uuid.uuid4()) for _ in range(writers)]
+    db.add_all(Run(id=run_id, status='running') for run_id in run_ids)
+    db.commit()
+    db.close()
+
+    stats = Stats()
+    stop = threading.Event()
+    threads = (
+        [threading.Thread(target=writer, args=(Session, [run_id], stop, stats)) for run_id in run_ids]
+        + [threading.Thread(target=reader, args=(Session, run_ids, stop, stats)) for _ in range(readers)]
+    )
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pain_to_idea_bench_')
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile")
+    print(f"{'profile':<8} {'writes/s':>9} {'w p99 ms':>9} {'reads/s':>9} {'r p99 ms':>9} {'errors':>7} {'locked':>7}")
+    for profile in reversed(PROFILES):
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmpdir, f'{profile}.db')}"
+        stats = bench(database_url, profile, args.writers, args.readers, args.seconds)
+        print(
+            f"{profile:<8} {len(stats.latencies['write']) / args.seconds:>9.0f} "
+            f"{percentile(stats.latencies['write'], 0.99):>9.1f} "
+            f"{len(stats.latencies['read']) / args.seconds:>9.0f} "
+            f"{percentile(stats.latencies['read'], 0.99):>9.1f} "
+            f"{stats.errors['read'] + stats.errors['write']:>7} {stats.locked:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Event-loop lag benchmark: sync vs async database sessions in API handlers
+
+Serves the run status and idea detail reads the way the API does, from
+many concurrent coroutines, once through the synchronous Session (what
+the routes used to do) and once through the AsyncSession. A probe task
+measures how late the event loop wakes it up; with the sync session every
+query stalls the loop and with it every open SSE stream.
+
+Run with: python benchmark_event_loop_lag.py [--clients 50] [--requests 40]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# Benchmark against a throwaway database, never the real one
+_tmpdir = tempfile.mkdtemp(prefix='pain_to_idea_bench_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from src.models import Base, engine, async_engine, SessionLocal, AsyncSessionLocal, Run, Idea, Analogue  # noqa: E402
+from src.services.run_service import get_run_status, get_run_status_async  # noqa: E402
+from src.services.idea_service import get_idea_detail, get_idea_detail_async  # noqa: E402
+
+PROBE_INTERVAL_SECONDS = 0.005
+
+
+def seed(ideas: int = 10) -> (str, list):
+    """One completed run with ideas and analogues"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        run = Run(status='completed', selected_direction='benchmark', ideas_count=ideas)
+        db.add(run)
+        db.flush()
+        for index in range(ideas):
+            idea = Idea(
+                run_id=run.id, title=f"Idea {index}", pain_description="pain " * 100, segment="segment",
+                confidence_level='high', brief_evidence="evidence", plan_7days="plan", plan_30days="plan",
+                order_index=index
+            )
+            idea.analogues = [
+                Analogue(name=f"Analogue {n}", description="description", url="https://example.com", order_index=n)
+                for n in range(3)
+            ]
+            db.add(idea)
+        db.commit()
+        return run.id, [idea.id for idea in db.query(Idea).filter(Idea.run_id == run.id)]
+    finally:
+        db.close()
+
+
+async def probe(stop: asyncio.Event, lags: list):
+    """Record how much later than requested the loop wakes this task up"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL_SECONDS
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        lags.append(max(loop.time() - expected, 0) * 1000)
+
+
+async def sync_client(run_id: str, idea_ids: list, requests: int):
+    for index in range(requests):
+        db = SessionLocal()
+        try:
+            get_run_status(db, run_id).to_dict()
+            get_idea_detail(db, idea_ids[index % len(idea_ids)]).to_dict_full()
+        finally:
+            db.close()
+        await asyncio.sleep(0)
+
+
+async def async_client(run_id: str, idea_ids: list, requests: int):
+    for index in range(requests):
+        async with AsyncSessionLocal() as db:
+            (await get_run_status_async(db, run_id)).to_dict()
+            (await get_idea_detail_async(db, idea_ids[index % len(idea_ids)])).to_dict_full()
+
+
+async def measure(client, run_id: str, idea_ids: list, clients: int, requests: int) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stop, lags))
+    await asyncio.sleep(PROBE_INTERVAL_SECONDS * 2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(run_id, idea_ids, requests) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe_task
+    lags.sort()
+    return {
+        'rps': clients * requests / elapsed,
+        'p50': statistics.median(lags),
+        'p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))],
+        'max': lags[-1],
+    }
+
+
+async def main(clients: int, requests: int):
+    run_id, idea_ids = seed()
+
+    # Warm up both connection pools
+    await measure(sync_client, run_id, idea_ids, 1, 2)
+    await measure(async_client, run_id, idea_ids, 1, 2)
+
+    print(f"{clients} concurrent clients x {requests} requests (run status + idea detail)")
+    print(f"{'session':<8} {'req/s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for name, client in (('sync', sync_client), ('async', async_client)):
+        result = await measure(client, run_id, idea_ids, clients, requests)
+        print(f"{name:<8} {result['rps']:>8.0f} {result['p50']:>11.1f} {result['p99']:>11.1f} {result['max']:>11.1f}")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=40)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.requests))
@@ -0,0 +1,205 @@
+"""
+Purchase ingestion benchmark: direct INSERT per click vs the Redis buffer
+
+Sends clicks to POST /api/purchases in-process (ASGI transport, so the
+numbers are API + Redis + database cost without the network) from many
+concurrent clients, half of them on one popular idea. Reports accepted
+clicks per second and, for the buffered mode, how long the flusher
+needed until every click was in the database.
+
+The "ingest" row queues the same clicks without HTTP (idea cache + RPUSH,
+what the route does per click), and the run ends by comparing both
+buffered rows with the target of TARGET_CLICKS_PER_SECOND.
+
+On SQLite the ingest path takes about 8-10k clicks/s, but the buffered
+HTTP row stays at about 1000-1200/s, short of the target: the httpx
+client, FastAPI and the flusher share one event loop on one core here,
+and the in-process client alone caps an empty FastAPI route at about
+3000 requests/s. The HTTP row is the rate of a single API worker; the
+target over HTTP is for several workers (uvicorn --workers N) sharing
+the Redis buffer.
+
+Needs Redis at REDIS_URL.
+
+Run with: python benchmark_purchase_ingest.py [--clicks 5000] [--concurrency 200]
+          [--database-url postgresql://...]   (default: a throwaway SQLite file)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TARGET_CLICKS_PER_SECOND = 2000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clicks', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--target', type=int, default=TARGET_CLICKS_PER_SECOND,
+                        help="clicks per second the buffered ingest should sustain")
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'purchases.db')}"
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import delete, func, select
+
+from src.api import purchases
+from src.config import settings
+from src.migrations import upgrade
+from src.models import SessionLocal, engine, Run, Idea, Purchase, IdeaPurchaseTotal, PurchaseBucket
+from src.services.purchase_ingest import (
+    BUFFER_KEY, purchase_flusher, buffered_count, idea_cache, buffer_purchase, new_idempotency_key
+)
+from src.services.redis_client import get_async_redis
+
+# httpx logs every request at INFO: two log writes per click on the client side
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+def seed_ideas(count: int = 20) -> list:
+    db = SessionLocal()
+    try:
+        run = Run(id=os.urandom(8).hex(), status='completed')
+        db.add(run)
+        ideas = [
+            Idea(
+                run_id=run.id, title=f"Idea {i}", pain_description="pain", segment="segment",
+                confidence_level="high", brief_evidence="evidence", plan_7days="plan", plan_30days="plan",
+                order_index=i
+            )
+            for i in range(count)
+        ]
+        db.add_all(ideas)
+        db.commit()
+        return [idea.id for idea in ideas]
+    finally:
+        db.close()
+
+
+def stored_purchases() -> int:
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count(Purchase.id)))
+    finally:
+        db.close()
+
+
+def reset_purchases():
+    db = SessionLocal()
+    try:
+        for model in (Purchase, IdeaPurchaseTotal, PurchaseBucket):
+            db.execute(delete(model))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def send_clicks(client: httpx.AsyncClient, idea_ids: list, clicks: int, concurrency: int) -> int:
+    popular = idea_ids[0]
+    remaining = iter(range(clicks))
+    failures = 0
+
+    async def clicker():
+        nonlocal failures
+        for _ in remaining:
+            idea_id = popular if random.random() < 0.5 else random.choice(idea_ids)
+            response = await client.post("/api/purchases", json={'idea_id': idea_id})
+            if response.status_code != 200:
+                failures += 1
+
+    await asyncio.gather(*(clicker() for _ in range(concurrency)))
+    return failures
+
+
+async def queue_clicks(idea_ids: list, clicks: int, concurrency: int) -> int:
+    """What create_purchase does per buffered click, without HTTP"""
+    popular = idea_ids[0]
+    remaining = iter(range(clicks))
+    failures = 0
+
+    async def clicker():
+        nonlocal failures
+        for _ in remaining:
+            idea_id = popular if random.random() < 0.5 else random.choice(idea_ids)
+            exists, run_id = await idea_cache.run_of(idea_id)
+            if not exists:
+                failures += 1
+                continue
+            await buffer_purchase({
+                'idea_id': idea_id, 'run_id': run_id, 'created_at': datetime.utcnow().isoformat(),
+                'user_ip': None, 'user_agent': "benchmark", 'idempotency_key': new_idempotency_key()
+            })
+
+    await asyncio.gather(*(clicker() for _ in range(concurrency)))
+    return failures
+
+
+async def run_mode(mode: str, idea_ids: list) -> dict:
+    settings.purchase_ingest_mode = 'direct' if mode == 'direct' else 'buffered'
+    reset_purchases()
+
+    app = FastAPI()
+    app.include_router(purchases.router, prefix="/api")
+    transport = httpx.ASGITransport(app=app)
+
+    if mode != 'direct':
+        purchase_flusher.start()
+
+    started = time.perf_counter()
+    if mode == 'ingest':
+        failures = await queue_clicks(idea_ids, args.clicks, args.concurrency)
+    else:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            failures = await send_clicks(client, idea_ids, args.clicks, args.concurrency)
+    accepted_seconds = time.perf_counter() - started
+
+    if mode != 'direct':
+        while await buffered_count():
+            await asyncio.sleep(0.01)
+        await purchase_flusher.stop()
+    stored_seconds = time.perf_counter() - started
+
+    return {
+        'accepted_per_second': args.clicks / accepted_seconds,
+        'stored_per_second': args.clicks / stored_seconds,
+        'stored': stored_purchases(),
+        'failures': failures,
+    }
+
+
+async def main() -> int:
+    upgrade(engine)
+    await get_async_redis().delete(BUFFER_KEY)
+    idea_ids = seed_ideas()
+
+    print(f"{args.clicks} clicks from {args.concurrency} concurrent clients, {engine.url.get_backend_name()}")
+    print(f"{'mode':<10} {'accepted/s':>12} {'stored/s':>10} {'stored':>8} {'failed':>8}")
+    results = {}
+    for mode in ('direct', 'buffered', 'ingest'):
+        result = results[mode] = await run_mode(mode, idea_ids)
+        print(
+            f"{mode:<10} {result['accepted_per_second']:>12.0f} {result['stored_per_second']:>10.0f} "
+            f"{result['stored']:>8} {result['failures']:>8}"
+        )
+
+    print(f"\ntarget: {args.target} clicks/s")
+    for mode in ('buffered', 'ingest'):
+        rate = results[mode]['accepted_per_second']
+        verdict = "met" if rate >= args.target else f"missed, {args.target / rate:.1f}x short"
+        print(f"  {mode:<8} {rate:>6.0f}/s  {verdict}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,118 @@
+"""
+Full-text idea search benchmark
+
+Seeds a throwaway database with synthetic ideas (indexed by the triggers
+of migration 0006, as in production) and times GET /api/ideas/search
+queries: common and rare words, a prefix, and the second page of a
+common word. Descriptions mix a few domain words (each in about a tenth
+of the ideas) with a long tail of filler words. Target: under 10 ms per
+query at 1M ideas.
+
+Run with: python benchmark_search.py [--ideas 1000000] [--queries 50]
+          [--database-url postgresql://...]   (default: a throwaway SQLite file)
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ideas', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--database-url', default=None)
+    return parser.parse_args()
+
+
+args = parse_args()
+os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+
+from sqlalchemy import insert
+
+from src.migrations import upgrade
+from src.models import SessionLocal, AsyncSessionLocal, engine, Run, Idea
+from src.services.search_service import search_ideas_async
+
+SEED_BATCH = 10_000
+
+WORDS = (
+    "учет склад кофейня салон доставка клиент запись бронирование аренда ремонт "
+    "бухгалтерия отчет налог касса сотрудник смена график зарплата поставщик заказ "
+    "остатки списание маркетплейс отзыв реклама сайт бот уведомление оплата подписка "
+    "школа репетитор клиника пациент ветеринар автосервис шиномонтаж фитнес тренер "
+    "стоматология юрист договор документ склейка логистика курьер ресторан меню"
+).split()
+
+RARE_WORD = "пивоварня"
+
+FILLER_WORDS = 20_000
+
+QUERIES = [("common word", "клиент"), ("two words", "учет склад"), ("prefix", "бухгал*"), ("rare word", RARE_WORD)]
+
+
+def sentence(rng: random.Random, length: int, domain_words: int) -> str:
+    words = rng.sample(WORDS, domain_words) + [f"слово{rng.randrange(FILLER_WORDS)}" for _ in range(length - domain_words)]
+    rng.shuffle(words)
+    return ' '.join(words)
+
+
+def seed(count: int):
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        run = Run(id=os.urandom(8).hex(), status='completed')
+        db.add(run)
+        db.commit()
+        for start in range(0, count, SEED_BATCH):
+            rows = [
+                {
+                    'run_id': run.id,
+                    'title': sentence(rng, 4, 2) + (f" {RARE_WORD}" if i % 10_000 == 0 else ''),
+                    'pain_description': sentence(rng, 30, 3),
+                    'segment': sentence(rng, 3, 1),
+                    'confidence_level': 'medium',
+                    'brief_evidence': 'evidence',
+                    'plan_7days': 'plan',
+                    'plan_30days': 'plan',
+                    'order_index': i % 15,
+                }
+                for i in range(start, min(start + SEED_BATCH, count))
+            ]
+            db.execute(insert(Idea), rows)
+            db.commit()
+    finally:
+        db.close()
+
+
+async def time_query(q: str, second_page: bool) -> list:
+    timings = []
+    async with AsyncSessionLocal() as db:
+        cursor = (await search_ideas_async(db, q))['next_cursor'] if second_page else None
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            await search_ideas_async(db, q, cursor)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def main() -> int:
+    upgrade(engine)
+    started = time.perf_counter()
+    seed(args.ideas)
+    print(f"Seeded {args.ideas} ideas in {time.perf_counter() - started:.0f}s, {engine.url.get_backend_name()}")
+
+    print(f"{'query':<20} {'p50 ms':>8} {'p95 ms':>8}")
+    for label, q in QUERIES + [("common, page 2", QUERIES[0][1])]:
+        timings = sorted(await time_query(q, second_page=label.endswith("page 2")))
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{label:<20} {statistics.median(timings):>8.2f} {p95:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,139 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Literal, Optional
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from ..models import get_async_db, AsyncSessionLocal
+from ..services.batch_service import create_batch_async, get_batch_summary_async
+from ..services.admission import AdmissionRejected
+from ..services.progress_bus import progress_bus
+from ..config import settings, logger
+from .runs import get_client_key, SSE_KEEPALIVE_SECONDS
+import asyncio
+import json
+
+router = APIRouter()
+limiter = Limiter(key_func=get_remote_address)
+
+
+class CreateBatchRequest(BaseModel):
+    directions: List[Annotated[str, Field(min_length=1, max_length=500)]] = Field(
+        ..., min_length=1, max_length=settings.batch_max_runs
+    )
+    # Batches are scripted work: bulk by default, never interactive
+    priority: Literal['default', 'bulk'] = 'bulk'
+    # Children scheduled or running at once
+    concurrency: int = Field(settings.batch_default_concurrency, ge=1, le=settings.batch_max_concurrency)
+    # Latency target of every child run
+    deadline_seconds: Optional[int] = Field(None, ge=30, le=settings.generation_timeout_seconds)
+
+
+@router.post("/runs/batch")
+@limiter.limit(f"{settings.rate_limit_batches_per_hour}/hour")
+async def create_new_batch(
+    request: Request,
+    request_data: CreateBatchRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create one run per direction; progress at /api/batches/{batch_id}/progress"""
+    try:
+        batch = await create_batch_async(
+            db,
+            request_data.directions,
+            client_key=get_client_key(request),
+            priority=request_data.priority,
+            concurrency=request_data.concurrency,
+            deadline_seconds=request_data.deadline_seconds
+        )
+        logger.info(f"Created batch {batch.id} of {batch.runs_count} runs")
+
+        return await get_batch_summary_async(db, batch.id)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много прогонов в очереди. Попробуйте позже.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Error creating batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка создания пакета: {str(e)}")
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Aggregate status of a batch and the status of each of its runs"""
+    summary = await get_batch_summary_async(db, batch_id)
+
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Пакет не найден")
+
+    return summary
+
+
+async def _load_batch_snapshot(batch_id: str) -> Optional[dict]:
+    """Read a batch once with a short-lived session (not held by the stream)"""
+    async with AsyncSessionLocal() as db:
+        return await get_batch_summary_async(db, batch_id)
+
+
+@router.get("/batches/{batch_id}/progress")
+async def stream_batch_progress(batch_id: str):
+    """
+    Server-Sent Events stream of a batch's aggregate progress
+
+    One connection for all runs of the batch: it listens to the progress
+    bus channels of every child and re-reads the batch whenever one of
+    them changes (updates arriving together cost one read).
+    """
+    async def event_generator():
+        max_duration = 3600
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + max_duration
+
+        data = await _load_batch_snapshot(batch_id)
+        if data is None:
+            yield f"event: error\ndata: {json.dumps({'error_message': 'Пакет не найден'})}\n\n"
+            return
+
+        run_ids = [run['run_id'] for run in data['runs']]
+        # Subscribe, then read again so no update between the two is missed
+        updates = progress_bus.subscribe_many(run_ids)
+        try:
+            data = await _load_batch_snapshot(batch_id)
+            while True:
+                if data is None:
+                    yield f"event: error\ndata: {json.dumps({'error_message': 'Пакет не найден'})}\n\n"
+                    return
+                if data['status'] in ('completed', 'failed'):
+                    yield f"event: complete\ndata: {json.dumps(data)}\n\n"
+                    return
+
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield f"event: error\ndata: {json.dumps({'error_message': 'Превышено время ожидания'})}\n\n"
+                    return
+                try:
+                    await asyncio.wait_for(updates.get(), timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    # Doubles as the keep-alive and a resync
+                    pass
+                while not updates.empty():
+                    updates.get_nowait()
+
+                data = await _load_batch_snapshot(batch_id)
+        finally:
+            progress_bus.unsubscribe_many(run_ids, updates)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
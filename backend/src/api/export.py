@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import List, Optional, Literal
+
+from ..models import get_async_db
+from ..services.run_service import get_run_status_async
+from ..services.export_service import (
+    MEDIA_TYPES,
+    EXTENSIONS,
+    export_stream,
+    run_export_query,
+    bulk_export_query
+)
+from ..config import settings
+
+router = APIRouter()
+
+ExportFormat = Literal['markdown', 'csv', 'jsonl']
+
+
+class ExportRunRequest(BaseModel):
+    run_id: str
+    # Only these ideas of the run; all of them if omitted
+    idea_ids: Optional[List[int]] = Field(None, max_length=100)
+
+
+def _export_response(export_format: str, query, filename: str, gzip: bool = False) -> StreamingResponse:
+    media_type = MEDIA_TYPES[export_format]
+    filename = f"{filename}.{EXTENSIONS[export_format]}"
+    if gzip:
+        media_type, filename = 'application/gzip', f"{filename}.gz"
+    return StreamingResponse(
+        export_stream(export_format, query, gzip),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+@router.post("/export/{export_format}")
+async def export_run(
+    export_format: ExportFormat,
+    request_data: ExportRunRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Download the ideas of a completed run as Markdown, CSV or JSONL"""
+    run = await get_run_status_async(db, request_data.run_id)
+
+    if not run:
+        raise HTTPException(status_code=404, detail="Прогон не найден")
+
+    if run.status != 'completed':
+        raise HTTPException(
+            status_code=400,
+            detail=f"Прогон еще не завершен. Текущий статус: {run.status}"
+        )
+
+    return _export_response(
+        export_format,
+        run_export_query(run.id, request_data.idea_ids),
+        f"ideas-{run.id}"
+    )
+
+
+@router.get("/admin/export")
+async def export_all(
+    export_format: ExportFormat = Query('jsonl', alias="format"),
+    since: Optional[datetime] = Query(None, description="Идеи, созданные не раньше (UTC, ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Идеи, созданные раньше (UTC, ISO 8601)"),
+    gzip: bool = False,
+    api_key: Optional[str] = Header(None, alias="X-API-Key")
+):
+    """Stream the ideas of all completed runs (protected endpoint)"""
+    if api_key != settings.admin_api_key:
+        raise HTTPException(status_code=401, detail="Неверный API ключ")
+
+    # Stored timestamps are naive UTC
+    since, until = (
+        moment.astimezone(timezone.utc).replace(tzinfo=None) if moment and moment.tzinfo else moment
+        for moment in (since, until)
+    )
+
+    return _export_response(
+        export_format,
+        bulk_export_query(since, until),
+        f"ideas-{datetime.utcnow():%Y%m%d-%H%M%S}",
+        gzip
+    )
@@ -1,19 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Literal
 
-from ..models import get_db
-from ..services.idea_service import get_idea_detail
+from ..models import get_async_db
+from ..services.idea_service import get_idea_detail_async, list_ideas_async
+from ..services.search_service import search_ideas_async
+from ..services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from ..services.response_cache import response_cache, idea_key, cached_response
 from ..config import logger
 
 router = APIRouter()
 
 
+@router.get("/ideas")
+async def list_ideas(
+    confidence: Optional[Literal['high', 'medium', 'low']] = None,
+    cursor: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ideas of all runs, newest first; pass next_cursor of a page to get the next one"""
+    try:
+        return await list_ideas_async(db, confidence, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+# Registered before /ideas/{idea_id}, which would otherwise match "search"
+@router.get("/ideas/search")
+async def search_ideas(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over ideas of all runs, most relevant first"""
+    try:
+        return await search_ideas_async(db, q, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
 @router.get("/ideas/{idea_id}")
-async def get_idea(idea_id: int, db: Session = Depends(get_db)):
-    """Get full details of a specific idea"""
-    idea = get_idea_detail(db, idea_id)
+async def get_idea(idea_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get full details of a specific idea
+
+    Ideas are stored together with their run's completion and never
+    change afterwards, so the detail is cached (see response_cache).
+    """
+    cached = response_cache.get(idea_key(idea_id))
+    if cached:
+        return cached_response(request, cached)
+
+    idea = await get_idea_detail_async(db, idea_id)
 
     if not idea:
         raise HTTPException(status_code=404, detail="Идея не найдена")
 
-    return idea.to_dict_full()
+    return cached_response(request, response_cache.put(idea_key(idea_id), idea.to_dict_full()))
@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from rq import Queue
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+
+from ..services import metrics, scheduler
+from ..services.redis_client import redis_conn
+from ..services.progress_bus import progress_bus
+from ..services.run_events import event_bus
+from ..workers.stage_jobs import worker_queue_names
+
+router = APIRouter()
+
+
+def collect_sse_connections():
+    metrics.SSE_CONNECTIONS.set(progress_bus.connections, stream='progress')
+    metrics.SSE_CONNECTIONS.set(event_bus.connections, stream='logs')
+
+
+def collect_queue_stats():
+    """Depth and oldest job age of every RQ queue plus the scheduler backlog"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    for name in worker_queue_names():
+        queue = Queue(name, connection=redis_conn)
+        metrics.QUEUE_DEPTH.set(queue.count, queue=name)
+
+        oldest_age = 0.0
+        job_ids = queue.get_job_ids(0, 1)
+        if job_ids:
+            try:
+                job = Job.fetch(job_ids[0], connection=redis_conn)
+                if job.enqueued_at:
+                    oldest_age = (now - job.enqueued_at.replace(tzinfo=None)).total_seconds()
+            except NoSuchJobError:
+                pass
+        metrics.QUEUE_OLDEST_JOB_AGE.set(round(oldest_age, 3), queue=name)
+
+    metrics.QUEUE_DEPTH.set(scheduler.pending_count(), queue='scheduler')
+
+
+metrics.REGISTRY.add_collector(collect_sse_connections)
+metrics.REGISTRY.add_collector(collect_queue_stats)
+
+
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics of this API process"""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
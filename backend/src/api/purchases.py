@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Literal
 
-from ..models import get_db, Purchase, Idea
+from ..models import get_async_db, AsyncSessionLocal
+from ..services.purchase_service import get_purchases_stats_async, insert_purchases_async
+from ..services.purchase_ingest import idea_cache, buffer_purchase, new_idempotency_key
 from ..config import settings, logger
 
 router = APIRouter()
@@ -18,37 +21,57 @@ class CreatePurchaseRequest(BaseModel):
 async def create_purchase(
     request: Request,
     purchase_data: CreatePurchaseRequest,
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=64)
 ):
-    """Record a purchase (button click) for an idea"""
+    """
+    Record a purchase (button click) for an idea
+
+    In buffered mode the click is acknowledged once it is queued and
+    stored by the flusher shortly after, so purchase_id is null. A retry
+    with the same Idempotency-Key header is acknowledged but not counted.
+    """
     try:
-        # Get idea to validate it exists
-        idea = db.query(Idea).filter(Idea.id == purchase_data.idea_id).first()
-        if not idea:
+        # Validate the idea against the per-process cache of known ideas
+        exists, run_id = await idea_cache.run_of(purchase_data.idea_id)
+        if not exists:
             raise HTTPException(status_code=404, detail="Идея не найдена")
 
         # Get user IP and user agent
         user_ip = request.client.host if request.client else None
         user_agent = request.headers.get("user-agent", "")[:500]
 
-        # Create purchase record
-        purchase = Purchase(
-            idea_id=purchase_data.idea_id,
-            run_id=idea.run_id,
-            user_ip=user_ip,
-            user_agent=user_agent
-        )
+        purchase = {
+            'idea_id': purchase_data.idea_id,
+            'run_id': run_id,
+            'created_at': datetime.utcnow(),
+            'user_ip': user_ip,
+            'user_agent': user_agent,
+            'idempotency_key': idempotency_key or new_idempotency_key()
+        }
+
+        if settings.purchase_ingest_mode == 'buffered':
+            try:
+                await buffer_purchase({**purchase, 'created_at': purchase['created_at'].isoformat()})
+                logger.debug(f"Purchase queued: idea_id={purchase_data.idea_id}, ip={user_ip}")
+                return {
+                    "success": True,
+                    "message": "Спасибо, запрос отправлен.",
+                    "purchase_id": None
+                }
+            except Exception as e:
+                logger.warning(f"Purchase buffer unavailable, storing directly: {e}")
 
-        db.add(purchase)
-        db.commit()
-        db.refresh(purchase)
+        # Direct write, rollups counted in the same transaction
+        async with AsyncSessionLocal() as db:
+            purchase_ids = await insert_purchases_async(db, [purchase])
+            await db.commit()
 
         logger.info(f"Purchase recorded: idea_id={purchase_data.idea_id}, ip={user_ip}")
 
         return {
             "success": True,
             "message": "Спасибо, запрос отправлен.",
-            "purchase_id": purchase.id
+            "purchase_id": purchase_ids[0] if purchase_ids else None
         }
 
     except HTTPException:
@@ -60,44 +83,37 @@ async def create_purchase(
 
 @router.get("/admin/purchases")
 async def get_purchases_stats(
+    since: Optional[datetime] = Query(None, description="Начало окна (UTC, ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Конец окна (UTC, ISO 8601)"),
+    hours: Optional[int] = Query(None, ge=1, le=24 * 366, description="Окно: последние N часов"),
+    run_id: Optional[str] = Query(None),
+    granularity: Literal['hour', 'day'] = 'hour',
     api_key: Optional[str] = Header(None, alias="X-API-Key"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get purchase statistics (protected endpoint)"""
+    """
+    Get purchase statistics (protected endpoint)
+
+    With a window (since/until or hours) totals and top ideas cover only
+    that window, rounded to whole hours, and a per-hour or per-day series
+    is added.
+    """
     # Simple API key authentication
     if api_key != settings.admin_api_key:
         raise HTTPException(status_code=401, detail="Неверный API ключ")
 
-    try:
-        # Total purchases count
-        total_purchases = db.query(func.count(Purchase.id)).scalar()
-
-        # Recent purchases (last 50)
-        recent_purchases = db.query(Purchase).order_by(
-            Purchase.created_at.desc()
-        ).limit(50).all()
-
-        # Top ideas by purchases
-        top_ideas = db.query(
-            Idea.id,
-            Idea.title,
-            func.count(Purchase.id).label('purchase_count')
-        ).join(Purchase).group_by(Idea.id).order_by(
-            func.count(Purchase.id).desc()
-        ).limit(10).all()
+    if hours and not since:
+        since = datetime.utcnow() - timedelta(hours=hours)
+    # Stored timestamps are naive UTC
+    since, until = (
+        moment.astimezone(timezone.utc).replace(tzinfo=None) if moment and moment.tzinfo else moment
+        for moment in (since, until)
+    )
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="Начало окна должно быть раньше конца")
 
-        return {
-            "total_purchases": total_purchases,
-            "recent_purchases": [p.to_dict() for p in recent_purchases],
-            "top_ideas": [
-                {
-                    "idea_id": idea_id,
-                    "title": title,
-                    "purchase_count": count
-                }
-                for idea_id, title, count in top_ideas
-            ]
-        }
+    try:
+        return await get_purchases_stats_async(db, since, until, run_id, granularity)
 
     except Exception as e:
         logger.error(f"Error fetching purchase stats: {e}")
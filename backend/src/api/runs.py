@@ -1,23 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-from ..models import get_db
-from ..services.run_service import create_run, get_run_status, get_run_ideas
+from ..models import get_async_db, AsyncSessionLocal
+from ..services.run_service import (
+    create_run_async,
+    cancel_run_async,
+    get_run_status_async,
+    get_run_ideas_async,
+    list_runs_async,
+    TERMINAL_STATUSES
+)
+from ..services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from ..services.cancellation import touch_watched
+from ..services.redis_client import write_behind
+from ..services.admission import AdmissionRejected, run_eta
+from ..services.progress_bus import progress_bus, RESYNC
+from ..services.run_events import event_bus, read_events, FINAL_KINDS
+from ..services.response_cache import response_cache, run_ideas_key, cached_response
 from ..config import settings, logger
 import asyncio
 import json
+import re
+import time
 
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
+# Idle progress streams send a comment (or a fresh ETA) this often
+SSE_KEEPALIVE_SECONDS = 15
+
+# Events read from the run's stream per round trip
+LOG_BATCH_SIZE = 100
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
 
 class CreateRunRequest(BaseModel):
     optional_direction: Optional[str] = None
+    # 'interactive' pre-empts bulk runs and is only granted to the web UI,
+    # see granted_priority
+    priority: Literal['interactive', 'default', 'bulk'] = 'default'
+    # Latency target; the pipeline degrades to finish within it
+    deadline_seconds: Optional[int] = Field(None, ge=30, le=settings.generation_timeout_seconds)
+
+
+def get_client_key(request: Request) -> str:
+    """Key for per-client fair scheduling: API key if sent, otherwise IP"""
+    api_key = request.headers.get("X-API-Key")
+    return f"key:{api_key}" if api_key else f"ip:{get_remote_address(request)}"
+
+
+def granted_priority(request: Request, requested: str) -> str:
+    """
+    Scheduling class a run actually gets
+
+    Callers with an API key are scripts and always run as bulk.
+    'interactive' is only granted to browser requests (the web UI): a
+    browser sends Sec-Fetch-Mode on every fetch, a plain HTTP client does
+    not, so a script looping over POST /api/runs gets 'default' instead.
+    """
+    if request.headers.get("X-API-Key"):
+        return 'bulk'
+    if requested == 'interactive' and not request.headers.get("Sec-Fetch-Mode"):
+        return 'default'
+    return requested
 
 
 @router.post("/runs")
@@ -25,27 +76,55 @@ class CreateRunRequest(BaseModel):
 async def create_new_run(
     request: Request,
     request_data: CreateRunRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new idea generation run"""
     try:
-        run = create_run(db, request_data.optional_direction)
+        run = await create_run_async(
+            db,
+            request_data.optional_direction,
+            client_key=get_client_key(request),
+            priority=granted_priority(request, request_data.priority),
+            deadline_seconds=request_data.deadline_seconds
+        )
         logger.info(f"Created new run: {run.id}")
 
         return {
             "run_id": run.id,
             "status": run.status,
-            "created_at": run.created_at.isoformat()
+            "created_at": run.created_at.isoformat(),
+            **(await asyncio.to_thread(run_eta, run.id))
         }
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много прогонов в очереди. Попробуйте позже.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Error creating run: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка создания прогона: {str(e)}")
 
 
+@router.get("/runs")
+async def list_runs(
+    status: Optional[Literal['pending', 'running', 'completed', 'failed', 'cancelled']] = None,
+    direction: Optional[str] = Query(None, max_length=1000),
+    cursor: Optional[str] = Query(None, max_length=200),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Past runs, newest first; pass next_cursor of a page to get the next one"""
+    try:
+        return await list_runs_async(db, status, direction, cursor, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
 @router.get("/runs/{run_id}")
-async def get_run(run_id: str, db: Session = Depends(get_db)):
+async def get_run(run_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get run status and details"""
-    run = get_run_status(db, run_id)
+    run = await get_run_status_async(db, run_id)
 
     if not run:
         raise HTTPException(status_code=404, detail="Прогон не найден")
@@ -53,42 +132,91 @@ async def get_run(run_id: str, db: Session = Depends(get_db)):
     return run.to_dict()
 
 
+@router.post("/runs/{run_id}/cancel")
+async def cancel(run_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Cancel a run; a running one stops within a second"""
+    run = await cancel_run_async(db, run_id)
+
+    if not run:
+        raise HTTPException(status_code=404, detail="Прогон не найден")
+
+    if run.status in ('completed', 'failed'):
+        raise HTTPException(status_code=409, detail=f"Прогон уже завершен. Текущий статус: {run.status}")
+
+    return {
+        "run_id": run.id,
+        # 'cancelling' until the worker has stopped the pipeline
+        "status": run.status if run.status == 'cancelled' else 'cancelling'
+    }
+
+
+async def _load_run_snapshot(run_id: str) -> Optional[dict]:
+    """Read a run once with a short-lived session (not held by the stream)"""
+    async with AsyncSessionLocal() as db:
+        run = await get_run_status_async(db, run_id)
+        return run.to_dict() if run else None
+
+
 @router.get("/runs/{run_id}/progress")
-async def stream_progress(run_id: str, db: Session = Depends(get_db)):
+async def stream_progress(run_id: str):
     """
     Server-Sent Events endpoint for real-time progress updates
 
-    Note: For MVP, we use polling fallback. Full SSE can be added later.
+    The run is read from the database once on connect; after that updates
+    are pushed by the workers through the Redis progress bus.
     """
     async def event_generator():
         """Generate SSE events with run progress"""
         max_duration = 600  # 10 minutes timeout
-        start_time = asyncio.get_event_loop().time()
-
-        while True:
-            current_time = asyncio.get_event_loop().time()
-            if current_time - start_time > max_duration:
-                yield f"event: error\ndata: {json.dumps({'error_message': 'Превышено время ожидания'})}\n\n"
-                break
-
-            # IMPORTANT: Refresh DB session to get latest data
-            db.expire_all()
-            run = get_run_status(db, run_id)
-
-            if not run:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + max_duration
+
+        # Subscribe before reading so no update between the two is missed
+        updates = progress_bus.subscribe(run_id)
+        try:
+            data = await _load_run_snapshot(run_id)
+            if data is None:
                 yield f"event: error\ndata: {json.dumps({'error_message': 'Прогон не найден'})}\n\n"
-                break
-
-            if run.status == 'completed':
-                yield f"event: complete\ndata: {json.dumps(run.to_dict())}\n\n"
-                break
-            elif run.status == 'failed':
-                yield f"event: error\ndata: {json.dumps(run.to_dict())}\n\n"
-                break
-            else:
-                yield f"event: progress\ndata: {json.dumps(run.to_dict())}\n\n"
-
-            await asyncio.sleep(5)  # Poll every 5 seconds
+                return
+
+            while True:
+                if data['status'] == 'completed':
+                    yield f"event: complete\ndata: {json.dumps(data)}\n\n"
+                    return
+                elif data['status'] in ('failed', 'cancelled'):
+                    yield f"event: error\ndata: {json.dumps(data)}\n\n"
+                    return
+
+                write_behind(touch_watched, run_id)
+                if data['status'] == 'pending':
+                    data.update(await asyncio.to_thread(run_eta, run_id))
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+
+                # Wait for the next update; pending runs also get a periodic
+                # ETA refresh, running ones a keep-alive comment
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        yield f"event: error\ndata: {json.dumps({'error_message': 'Превышено время ожидания'})}\n\n"
+                        return
+                    try:
+                        update = await asyncio.wait_for(updates.get(), timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+                    except asyncio.TimeoutError:
+                        if data['status'] == 'pending':
+                            break
+                        write_behind(touch_watched, run_id)
+                        yield ": keep-alive\n\n"
+                        continue
+
+                    data = await _load_run_snapshot(run_id) if update is RESYNC else update
+                    if data is None:
+                        yield f"event: error\ndata: {json.dumps({'error_message': 'Прогон не найден'})}\n\n"
+                        return
+                    break
+        finally:
+            progress_bus.unsubscribe(run_id, updates)
+            # Unwatched time counts from the moment the page was closed
+            write_behind(touch_watched, run_id)
 
     return StreamingResponse(
         event_generator(),
@@ -101,76 +229,71 @@ async def stream_progress(run_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/runs/{run_id}/logs")
-async def stream_logs(run_id: str, db: Session = Depends(get_db)):
-    """Stream live logs for a running generation"""
-    import time
+async def stream_logs(run_id: str, request: Request):
+    """
+    Stream the structured event log of a run
+
+    Retained events are replayed on the first connect. After a reconnect
+    the browser sends Last-Event-ID and only newer events are sent.
+    """
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id and not STREAM_ID_PATTERN.match(last_event_id):
+        last_event_id = None
 
     async def log_generator():
-        """Generate simulated logs based on run status"""
+        """Tail the run's Redis Stream, woken up by the event bus"""
         max_duration = 600
-        start_time = time.time()
-
-        # Initial logs
-        yield f"data: {json.dumps({'timestamp': time.time(), 'message': f'Starting generation for run {run_id}...'})}\n\n"
-        await asyncio.sleep(0.5)
-        yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'Connecting to OpenRouter API...'})}\n\n"
-        await asyncio.sleep(0.5)
-        yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'Model: anthropic/claude-3.5-sonnet'})}\n\n"
-        await asyncio.sleep(0.5)
-        yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'Temperature: 0.7, Max tokens: 8000'})}\n\n"
-        await asyncio.sleep(1)
-
-        log_messages = [
-            "Analyzing pain signals from public sources...",
-            "Searching for user complaints and feedback...",
-            "Identifying recurring pain patterns...",
-            "Evaluating market segments...",
-            "Generating business ideas...",
-            "Brainstorming creative solutions...",
-            "Searching for analogues and competitors...",
-            "Analyzing successful implementations...",
-            "Creating validation evidence...",
-            "Drafting 7-day action plans...",
-            "Drafting 30-day roadmaps...",
-            "Finalizing idea descriptions...",
-        ]
-
-        log_index = 0
-
-        while True:
-            current_time = time.time()
-            if current_time - start_time > max_duration:
-                yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'ERROR: Timeout exceeded', 'type': 'error'})}\n\n"
-                break
-
-            # IMPORTANT: Refresh DB session to get latest data
-            db.expire_all()
-            run = get_run_status(db, run_id)
-
-            if not run:
-                yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'ERROR: Run not found', 'type': 'error'})}\n\n"
-                break
-
-            # Log current status for debugging
-            yield f"data: {json.dumps({'timestamp': time.time(), 'message': f'[DEBUG] Status: {run.status}, Ideas: {run.ideas_count}'})}\n\n"
-
-            if run.status == 'completed':
-                yield f"data: {json.dumps({'timestamp': time.time(), 'message': f'✓ Successfully generated {run.ideas_count} ideas!', 'type': 'success'})}\n\n"
-                yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'Generation complete. Redirecting...', 'type': 'success'})}\n\n"
-                break
-            elif run.status == 'failed':
-                yield f"data: {json.dumps({'timestamp': time.time(), 'message': f'ERROR: {run.error_message}', 'type': 'error'})}\n\n"
-                break
-            else:
-                # Send a log message every few seconds
-                if log_index < len(log_messages):
-                    yield f"data: {json.dumps({'timestamp': time.time(), 'message': log_messages[log_index]})}\n\n"
-                    log_index += 1
-                else:
-                    # Repeat some generic messages
-                    yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'Processing... Please wait...'})}\n\n"
-
-            await asyncio.sleep(3)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + max_duration
+        cursor = last_event_id
+
+        # Subscribe before reading so no event between the two is missed
+        wakeups = event_bus.subscribe(run_id)
+        try:
+            run = await _load_run_snapshot(run_id)
+            if run is None:
+                yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'ERROR: Run not found', 'type': 'error', 'final': True})}\n\n"
+                return
+
+            yield "retry: 3000\n\n"
+
+            while True:
+                events = await asyncio.to_thread(read_events, run_id, cursor, LOG_BATCH_SIZE)
+                for entry_id, event in events:
+                    cursor = entry_id
+                    event['final'] = event.get('kind') in FINAL_KINDS
+                    yield f"id: {entry_id}\ndata: {json.dumps(event)}\n\n"
+                    if event['final']:
+                        return
+
+                if len(events) == LOG_BATCH_SIZE:
+                    continue
+
+                if run['status'] in TERMINAL_STATUSES:
+                    # Finished before the event log existed or after it expired
+                    if run['status'] == 'completed':
+                        event = {'kind': 'run_completed', 'message': f"✓ Successfully generated {run['ideas_count']} ideas!", 'type': 'success', 'percent': 100}
+                    elif run['status'] == 'cancelled':
+                        event = {'kind': 'run_cancelled', 'message': run['error_message'], 'type': 'warning'}
+                    else:
+                        event = {'kind': 'run_failed', 'message': f"ERROR: {run['error_message']}", 'type': 'error'}
+                    yield f"data: {json.dumps({'timestamp': time.time(), **event, 'final': True})}\n\n"
+                    return
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    yield f"data: {json.dumps({'timestamp': time.time(), 'message': 'ERROR: Timeout exceeded', 'type': 'error', 'final': True})}\n\n"
+                    return
+
+                try:
+                    wakeup = await asyncio.wait_for(wakeups.get(), timeout=min(SSE_KEEPALIVE_SECONDS, remaining))
+                    if wakeup is RESYNC:
+                        run = await _load_run_snapshot(run_id) or run
+                except asyncio.TimeoutError:
+                    # Also re-reads the stream in case a notification was lost
+                    yield ": keep-alive\n\n"
+        finally:
+            event_bus.unsubscribe(run_id, wakeups)
 
     return StreamingResponse(
         log_generator(),
@@ -184,9 +307,13 @@ async def stream_logs(run_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/runs/{run_id}/ideas")
-async def get_ideas(run_id: str, db: Session = Depends(get_db)):
-    """Get all ideas for a completed run"""
-    run = get_run_status(db, run_id)
+async def get_ideas(run_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get all ideas for a completed run (immutable from then on, so cached)"""
+    cached = response_cache.get(run_ideas_key(run_id))
+    if cached:
+        return cached_response(request, cached)
+
+    run = await get_run_status_async(db, run_id)
 
     if not run:
         raise HTTPException(status_code=404, detail="Прогон не найден")
@@ -197,12 +324,12 @@ async def get_ideas(run_id: str, db: Session = Depends(get_db)):
             detail=f"Прогон еще не завершен. Текущий статус: {run.status}"
         )
 
-    ideas = get_run_ideas(db, run_id)
+    ideas = await get_run_ideas_async(db, run_id)
 
-    return {
+    return cached_response(request, response_cache.put(run_ideas_key(run_id), {
         "run_id": run_id,
         "ideas_count": len(ideas),
         "selected_direction": run.selected_direction,
         "optional_direction": run.optional_direction,
         "ideas": [idea.to_dict_brief() for idea in ideas]
-    }
+    }))
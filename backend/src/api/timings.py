@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy.orm import Session
+from typing import Optional, Literal
+
+from ..models import get_db
+from ..services.run_service import get_run_status
+from ..services.timing_service import get_run_timings, get_span_percentiles
+from ..config import settings, logger
+
+router = APIRouter()
+
+# Plain def: these admin routes use the sync session, so FastAPI runs them
+# in its threadpool instead of on the event loop
+
+
+@router.get("/runs/{run_id}/timings")
+def get_timings(run_id: str, db: Session = Depends(get_db)):
+    """Waterfall of stage, search, LLM and DB spans of a run"""
+    run = get_run_status(db, run_id)
+
+    if not run:
+        raise HTTPException(status_code=404, detail="Прогон не найден")
+
+    return get_run_timings(db, run)
+
+
+@router.get("/admin/timings")
+def get_timings_stats(
+    hours: int = Query(24, ge=1, le=24 * 30),
+    category: Literal['stage', 'tavily', 'llm', 'db'] = 'stage',
+    api_key: Optional[str] = Header(None, alias="X-API-Key"),
+    db: Session = Depends(get_db)
+):
+    """p50/p95/p99 span durations over a time window (protected endpoint)"""
+    if api_key != settings.admin_api_key:
+        raise HTTPException(status_code=401, detail="Неверный API ключ")
+
+    try:
+        return get_span_percentiles(db, hours=hours, category=category)
+    except Exception as e:
+        logger.error(f"Error fetching timing stats: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка получения статистики")
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+
+from ..models import get_db, Run
+from ..services.usage import day_cost
+from ..config import settings, logger
+
+router = APIRouter()
+
+# Plain def: these admin routes use the sync session, so FastAPI runs them
+# in its threadpool instead of on the event loop
+
+
+@router.get("/admin/usage")
+def get_usage_stats(
+    days: int = Query(7, ge=1, le=90),
+    api_key: Optional[str] = Header(None, alias="X-API-Key"),
+    db: Session = Depends(get_db)
+):
+    """Token usage and LLM cost per day and in total (protected endpoint)"""
+    if api_key != settings.admin_api_key:
+        raise HTTPException(status_code=401, detail="Неверный API ключ")
+
+    try:
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+        day = func.date(Run.created_at)
+
+        rows = db.query(
+            day.label('day'),
+            func.count(Run.id),
+            func.coalesce(func.sum(Run.prompt_tokens), 0),
+            func.coalesce(func.sum(Run.completion_tokens), 0),
+            func.coalesce(func.sum(Run.cost_usd), 0.0)
+        ).filter(Run.created_at >= since).group_by(day).order_by(day).all()
+
+        per_day = [
+            {
+                "day": str(run_day),
+                "runs": runs,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost, 4),
+                "avg_cost_per_run_usd": round(cost / runs, 4) if runs else 0.0
+            }
+            for run_day, runs, prompt_tokens, completion_tokens, cost in rows
+        ]
+
+        return {
+            "days": days,
+            "total_runs": sum(d["runs"] for d in per_day),
+            "total_tokens": sum(d["prompt_tokens"] + d["completion_tokens"] for d in per_day),
+            "total_cost_usd": round(sum(d["cost_usd"] for d in per_day), 4),
+            "per_day": per_day,
+            "budgets": {
+                "run_budget_usd": settings.run_budget_usd,
+                "daily_budget_usd": settings.daily_budget_usd,
+                "today_cost_usd": round(day_cost(), 4)
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching usage stats: {e}")
+        raise HTTPException(status_code=500, detail="Ошибка получения статистики")
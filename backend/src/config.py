@@ -21,9 +21,22 @@ class Settings(BaseSettings):
 
     # Redis
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    # Connections of the API process's asyncio client; requests beyond it wait for one
+    redis_max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
 
     # Database
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./pain_to_idea.db")
+    # 'tuned' (WAL/pragmas for SQLite, pooling for PostgreSQL) or 'plain' driver defaults
+    database_profile: str = os.getenv("DATABASE_PROFILE", "tuned")
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+    sqlite_mmap_size_mb: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+    # PostgreSQL pool per process; each in-flight pipeline holds one connection,
+    # so keep DB_POOL_SIZE + DB_MAX_OVERFLOW above ASYNC_WORKER_CONCURRENCY
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout_seconds: int = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    db_pool_recycle_seconds: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    db_statement_timeout_ms: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
 
     # Rate Limiting
     rate_limit_runs_per_hour: int = int(os.getenv("RATE_LIMIT_RUNS_PER_HOUR", "5"))
@@ -31,6 +44,79 @@ class Settings(BaseSettings):
     # Performance
     generation_timeout_seconds: int = int(os.getenv("GENERATION_TIMEOUT_SECONDS", "600"))
 
+    # Pipeline mode: 'monolithic' (one job per run) or 'staged' (one job per stage)
+    pipeline_mode: str = os.getenv("PIPELINE_MODE", "monolithic")
+    stage_search_concurrency: int = int(os.getenv("STAGE_SEARCH_CONCURRENCY", "20"))
+    stage_analysis_concurrency: int = int(os.getenv("STAGE_ANALYSIS_CONCURRENCY", "10"))
+    stage_generation_concurrency: int = int(os.getenv("STAGE_GENERATION_CONCURRENCY", "10"))
+    stage_persistence_concurrency: int = int(os.getenv("STAGE_PERSISTENCE_CONCURRENCY", "4"))
+
+    # Async worker (many pipelines per process on one event loop)
+    async_worker_concurrency: int = int(os.getenv("ASYNC_WORKER_CONCURRENCY", "20"))
+    async_worker_drain_seconds: int = int(os.getenv("ASYNC_WORKER_DRAIN_SECONDS", "120"))
+
+    # Prometheus exporter of worker processes (0 disables it); with several
+    # workers on one host each takes the next free port
+    worker_metrics_port: int = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+    # Worker supervisor (autoscaled pool of async workers)
+    supervisor_min_workers: int = int(os.getenv("SUPERVISOR_MIN_WORKERS", "1"))
+    supervisor_max_workers: int = int(os.getenv("SUPERVISOR_MAX_WORKERS", "4"))
+    supervisor_scale_interval_seconds: int = int(os.getenv("SUPERVISOR_SCALE_INTERVAL_SECONDS", "5"))
+    supervisor_max_job_age_seconds: int = int(os.getenv("SUPERVISOR_MAX_JOB_AGE_SECONDS", "30"))
+    supervisor_scale_down_idle_seconds: int = int(os.getenv("SUPERVISOR_SCALE_DOWN_IDLE_SECONDS", "60"))
+
+    # Fair scheduling: runs dispatched into RQ ahead of workers, client weights "key=weight,..."
+    scheduler_dispatch_window: int = int(os.getenv("SCHEDULER_DISPATCH_WINDOW", "2"))
+    scheduler_client_weights: str = os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")
+
+    # Admission control for POST /api/runs
+    admission_max_backlog: int = int(os.getenv("ADMISSION_MAX_BACKLOG", "50"))
+    admission_default_run_seconds: int = int(os.getenv("ADMISSION_DEFAULT_RUN_SECONDS", "120"))
+    admission_latency_window: int = int(os.getenv("ADMISSION_LATENCY_WINDOW", "50"))
+
+    # LLM cost accounting (USD per million tokens, used when OpenRouter reports no cost)
+    # and budgets after which runs degrade (0 disables a budget)
+    llm_prompt_price_per_mtok: float = float(os.getenv("LLM_PROMPT_PRICE_PER_MTOK", "3.0"))
+    llm_completion_price_per_mtok: float = float(os.getenv("LLM_COMPLETION_PRICE_PER_MTOK", "15.0"))
+    run_budget_usd: float = float(os.getenv("RUN_BUDGET_USD", "1.0"))
+    daily_budget_usd: float = float(os.getenv("DAILY_BUDGET_USD", "0"))
+
+    # Latency target of a run, counted from when a worker starts it; stages
+    # are scaled down to finish in time (a request may set a shorter one)
+    run_deadline_seconds: int = int(os.getenv("RUN_DEADLINE_SECONDS", "300"))
+
+    # Cancel a run once nobody has watched its status page for this long
+    # (0 disables; runs that were never watched are not affected)
+    run_auto_cancel_unwatched_seconds: int = int(os.getenv("RUN_AUTO_CANCEL_UNWATCHED_SECONDS", "0"))
+
+    # Per-run event log (Redis Stream behind /api/runs/{id}/logs)
+    run_events_max_length: int = int(os.getenv("RUN_EVENTS_MAX_LENGTH", "1000"))
+    run_events_ttl_seconds: int = int(os.getenv("RUN_EVENTS_TTL_SECONDS", "86400"))
+
+    # Purchase clicks: 'buffered' (Redis list drained in batches by the API
+    # processes) or 'direct' (one INSERT per click)
+    purchase_ingest_mode: str = os.getenv("PURCHASE_INGEST_MODE", "buffered")
+    purchase_flush_interval_ms: int = int(os.getenv("PURCHASE_FLUSH_INTERVAL_MS", "200"))
+    purchase_flush_batch: int = int(os.getenv("PURCHASE_FLUSH_BATCH", "1000"))
+
+    # In-process cache of completed runs' idea lists and idea details
+    response_cache_max_mb: int = int(os.getenv("RESPONSE_CACHE_MAX_MB", "64"))
+    response_cache_ttl_seconds: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    # Cache-Control max-age of those responses (they are immutable)
+    response_cache_max_age_seconds: int = int(os.getenv("RESPONSE_CACHE_MAX_AGE_SECONDS", "86400"))
+
+    # Idea search ranks at most this many of the newest matches of a query
+    search_max_candidates: int = int(os.getenv("SEARCH_MAX_CANDIDATES", "2000"))
+
+    # Batches of runs (POST /api/runs/batch): size and concurrency limits,
+    # and how long Tavily/LLM results shared between sibling runs are kept
+    batch_max_runs: int = int(os.getenv("BATCH_MAX_RUNS", "50"))
+    batch_default_concurrency: int = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "3"))
+    batch_max_concurrency: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "10"))
+    rate_limit_batches_per_hour: int = int(os.getenv("RATE_LIMIT_BATCHES_PER_HOUR", "2"))
+    batch_cache_ttl_seconds: int = int(os.getenv("BATCH_CACHE_TTL_SECONDS", "86400"))
+
     # Admin
     admin_api_key: str = os.getenv("ADMIN_API_KEY", "111")
 
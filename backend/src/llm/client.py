@@ -1,7 +1,9 @@
 import httpx
 import asyncio
+import time
 from typing import Optional, Dict, Any
 from ..config import settings, logger
+from ..services import run_events, tracing, metrics, batch_cache, usage as usage_accounting
 
 
 class OpenRouterClient:
@@ -17,13 +19,31 @@ class OpenRouterClient:
         prompt: str,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 4000
+        max_tokens: int = 4000,
+        timeout: float = 120.0,
+        shared: bool = False
     ) -> str:
-        """Generate text using OpenRouter API"""
+        """
+        Generate text using OpenRouter API
+
+        With shared=True the answer is reused by the sibling runs of a batch
+        sending the same request (see services.batch_cache).
+        """
 
         if not self.api_key:
             raise ValueError("OpenRouter API key not configured")
 
+        if shared:
+            request = {
+                'model': self.model, 'system_prompt': system_prompt, 'prompt': prompt,
+                'temperature': temperature, 'max_tokens': max_tokens
+            }
+            return await batch_cache.shared(
+                'llm', request,
+                lambda: self.generate(prompt, system_prompt, temperature, max_tokens, timeout),
+                lock_seconds=timeout
+            )
+
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -52,15 +72,20 @@ class OpenRouterClient:
         logger.info(f"  User prompt length: {len(prompt)} chars")
         logger.info(f"  User prompt preview: {prompt[:200]}...")
 
+        started = time.monotonic()
+
         try:
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
-                )
-                response.raise_for_status()
-                data = response.json()
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                with tracing.span('llm_call', 'llm', model=self.model, max_tokens=max_tokens) as llm_span:
+                    response = await client.post(
+                        f"{self.base_url}/chat/completions",
+                        headers=headers,
+                        json=payload
+                    )
+                    llm_span.bytes = len(response.content)
+                    response.raise_for_status()
+                    data = response.json()
+                    llm_span.tokens = (data.get('usage') or {}).get('total_tokens')
 
                 # Log response details
                 content = data['choices'][0]['message']['content']
@@ -71,13 +96,32 @@ class OpenRouterClient:
                 if 'usage' in data:
                     logger.info(f"  Token usage: {data['usage']}")
 
+                usage = data.get('usage') or {}
+                for token_type in ('prompt', 'completion'):
+                    if usage.get(f'{token_type}_tokens'):
+                        metrics.LLM_TOKENS.inc(usage[f'{token_type}_tokens'], model=self.model, type=token_type)
+                cost = usage_accounting.record_llm_call(self.model, usage, stage=tracing.current_stage())
+                llm_span.attributes['cost_usd'] = round(cost, 6)
+                run_events.emit(
+                    'llm_usage',
+                    f"OpenRouter {self.model}: {usage.get('prompt_tokens', '?')} prompt + "
+                    f"{usage.get('completion_tokens', '?')} completion tokens (~${cost:.4f})",
+                    model=self.model,
+                    usage=usage,
+                    cost_usd=round(cost, 6),
+                    duration_ms=round((time.monotonic() - started) * 1000)
+                )
+
                 return content
 
         except httpx.HTTPStatusError as e:
             logger.error(f"OpenRouter API error: {e.response.text}")
+            run_events.emit('llm_error', f"OpenRouter API error: {e.response.status_code}", level='error',
+                            model=self.model, status_code=e.response.status_code)
             raise Exception(f"Ошибка OpenRouter API: {e.response.status_code}")
         except Exception as e:
             logger.error(f"OpenRouter client error: {e}")
+            run_events.emit('llm_error', f"OpenRouter client error: {e}", level='error', model=self.model)
             raise Exception(f"Ошибка генерации: {str(e)}")
 
 
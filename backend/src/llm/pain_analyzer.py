@@ -1,10 +1,13 @@
 """
 Pain Analyzer - extracts structured pain data from raw search results
 """
+import asyncio
 import json
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from .client import llm_client
 from ..config import logger
+from ..services import run_events, tracing, usage, deadline
 
 
 class PainAnalyzer:
@@ -12,16 +15,25 @@ class PainAnalyzer:
     Analyzes raw search results and extracts structured user pains
     """
 
+    # Search results sent to the LLM per request
+    BATCH_SIZE = 15
+
     def __init__(self, llm_client_instance=None):
         self.llm = llm_client_instance or llm_client
 
-    async def extract_pains(self, search_results: List[Dict], direction: str) -> List[Dict]:
+    async def extract_pains(
+        self,
+        search_results: List[Dict],
+        direction: str,
+        max_batches: Optional[int] = None
+    ) -> List[Dict]:
         """
         Extract structured pain data from search results
 
         Args:
             search_results: List of Tavily search results
             direction: Business direction context
+            max_batches: Analyze only the first N batches (all by default)
 
         Returns:
             List of structured pains:
@@ -44,18 +56,53 @@ class PainAnalyzer:
         logger.info(f"[PainAnalyzer] Analyzing {len(search_results)} search results")
 
         # Group results into batches to avoid token limits
-        batch_size = 15
+        batch_size = self.BATCH_SIZE
         batches = [search_results[i:i+batch_size] for i in range(0, len(search_results), batch_size)]
+        batches = batches[:max_batches]
 
         all_pains = []
 
         for idx, batch in enumerate(batches):
+            # Over budget or out of time: keep what the first batches found, drop the rest
+            if idx > 0:
+                skipped = len(batches) - idx
+                # Reads the daily total from Redis
+                exhausted = await asyncio.to_thread(usage.budget_exceeded)
+                if exhausted:
+                    deadline.record_degradation(
+                        'budget_fewer_batches',
+                        f"Cost budget ({exhausted}) exhausted: skipped {skipped} of {len(batches)} analysis batches",
+                        budget=exhausted,
+                        skipped_batches=skipped
+                    )
+                    break
+                if not deadline.allowed_steps(1, deadline.EST_ANALYSIS_BATCH_SECONDS):
+                    deadline.record_degradation(
+                        'deadline_fewer_batches',
+                        f"Deadline close: skipped {skipped} of {len(batches)} analysis batches",
+                        skipped_batches=skipped
+                    )
+                    break
+
             logger.info(f"[PainAnalyzer] Processing batch {idx+1}/{len(batches)}")
+            started = time.monotonic()
             try:
-                pains_batch = await self._analyze_batch(batch, direction)
+                with tracing.span('analyze_batch', 'llm', batch=idx + 1, results=len(batch)) as batch_span:
+                    pains_batch = await self._analyze_batch(batch, direction)
+                    batch_span.attributes['pains'] = len(pains_batch)
                 all_pains.extend(pains_batch)
+                run_events.emit(
+                    'analysis_batch',
+                    f"Analysis batch {idx+1}/{len(batches)}: {len(pains_batch)} pains from {len(batch)} discussions",
+                    batch=idx + 1,
+                    batches=len(batches),
+                    results=len(batch),
+                    pains=len(pains_batch),
+                    duration_ms=round((time.monotonic() - started) * 1000)
+                )
             except Exception as e:
                 logger.error(f"[PainAnalyzer] Error processing batch {idx+1}: {e}")
+                run_events.emit('analysis_error', f"Analysis batch {idx+1} failed: {e}", level='warning', batch=idx + 1)
                 continue
 
         # Cluster similar pains
@@ -116,7 +163,9 @@ class PainAnalyzer:
                 prompt=prompt,
                 system_prompt="Ты эксперт по анализу пользовательских болей. Ты извлекаешь структурированные данные из сырых текстов.",
                 temperature=0.3,  # Lower temperature for more consistent extraction
-                max_tokens=4000
+                max_tokens=4000,
+                timeout=deadline.call_timeout(120.0, reserve_seconds=deadline.GENERATION_RESERVE_SECONDS),
+                shared=True  # Siblings in a batch with the same direction and results
             )
 
             # Parse JSON response
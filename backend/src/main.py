@@ -1,11 +1,19 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from .config import settings, logger
-from .api import runs, ideas, purchases
+from .models import async_engine
+from .models.profiles import ASYNC_DRIVERS
+from .api import runs, ideas, purchases, timings, usage, metrics, export, batches
+from .services.metrics import HTTP_REQUEST_DURATION
+from .services.progress_bus import progress_bus
+from .services.run_events import event_bus
+from .services.purchase_ingest import purchase_flusher
 
 # Create FastAPI application
 app = FastAPI(
@@ -28,6 +36,24 @@ limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Request latency per route template (not per raw path, to keep label sets small)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        )
+
 # Health check endpoint
 @app.get("/health")
 def health_check():
@@ -36,19 +62,34 @@ def health_check():
 
 # Include routers
 app.include_router(runs.router, prefix="/api", tags=["runs"])
+app.include_router(batches.router, prefix="/api", tags=["batches"])
 app.include_router(ideas.router, prefix="/api", tags=["ideas"])
 app.include_router(purchases.router, prefix="/api", tags=["purchases"])
+app.include_router(timings.router, prefix="/api", tags=["timings"])
+app.include_router(usage.router, prefix="/api", tags=["usage"])
+app.include_router(export.router, prefix="/api", tags=["export"])
+app.include_router(metrics.router, tags=["metrics"])
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     logger.info(f"Starting {settings.app_name} v{settings.version}")
     logger.info(f"Environment: {settings.environment}")
+    if async_engine is None:
+        raise RuntimeError(f"DATABASE_URL has no asyncio driver for the API (supported: {', '.join(ASYNC_DRIVERS)})")
+    progress_bus.start()
+    event_bus.start()
+    if settings.purchase_ingest_mode == 'buffered':
+        purchase_flusher.start()
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info(f"Shutting down {settings.app_name}")
+    await progress_bus.stop()
+    await event_bus.stop()
+    if settings.purchase_ingest_mode == 'buffered':
+        await purchase_flusher.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,93 @@
+"""
+Versioned database migrations
+
+Every migration is a module in this package with a VERSION, a
+DESCRIPTION and an upgrade(connection) function. Applied versions are
+recorded in the schema_migrations table; each pending migration runs in
+its own transaction, in version order. Upgrades are written to be
+idempotent (IF NOT EXISTS, column checks), so databases already patched
+by the former migrate_*.py scripts or created from the models converge on
+the same schema. Table definitions are frozen in the migrations rather
+than taken from the models; tests/test_migrations.py checks that the
+migrated schema still matches the models.
+
+Run with: python -m src.migrations [upgrade|status|check-plans]
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+from ..config import logger
+from . import (
+    m0001_baseline, m0002_hot_path_indexes, m0003_purchase_rollups, m0004_purchase_idempotency_key,
+    m0005_history_indexes, m0006_idea_search, m0007_run_batches
+)
+
+MIGRATIONS = [
+    m0001_baseline,
+    m0002_hot_path_indexes,
+    m0003_purchase_rollups,
+    m0004_purchase_idempotency_key,
+    m0005_history_indexes,
+    m0006_idea_search,
+    m0007_run_batches,
+]
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations',
+    _metadata,
+    Column('version', String(20), primary_key=True),
+    Column('description', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def has_column(connection: Connection, table: str, column: str) -> bool:
+    return column in {info['name'] for info in inspect(connection).get_columns(table)}
+
+
+def applied_versions(engine: Engine) -> List[str]:
+    with engine.connect() as connection:
+        if not inspect(connection).has_table('schema_migrations'):
+            return []
+        return list(connection.scalars(select(schema_migrations.c.version)))
+
+
+def pending_migrations(engine: Engine) -> list:
+    applied = set(applied_versions(engine))
+    return [migration for migration in MIGRATIONS if migration.VERSION not in applied]
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[str]:
+    """
+    Apply all pending migrations
+
+    Returns:
+        Versions applied by this call
+    """
+    if engine is None:
+        from ..models import engine
+
+    _metadata.create_all(bind=engine)
+
+    applied = []
+    for migration in pending_migrations(engine):
+        logger.info(f"[Migrations] Applying {migration.VERSION}: {migration.DESCRIPTION}")
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=migration.VERSION,
+                description=migration.DESCRIPTION,
+                applied_at=datetime.utcnow()
+            ))
+        applied.append(migration.VERSION)
+
+    if applied:
+        logger.info(f"[Migrations] Applied {', '.join(applied)}")
+    else:
+        logger.info("[Migrations] Database is up to date")
+    return applied
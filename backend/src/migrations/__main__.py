@@ -0,0 +1,47 @@
+"""
+Migration command line
+
+    python -m src.migrations            apply pending migrations
+    python -m src.migrations status     list applied and pending versions
+    python -m src.migrations check-plans  verify hot queries use indexes
+"""
+import sys
+
+from ..models import engine
+from . import MIGRATIONS, applied_versions, pending_migrations, upgrade
+from .query_plans import check_query_plans
+
+
+def main(argv):
+    command = argv[0] if argv else 'upgrade'
+
+    if command == 'upgrade':
+        applied = upgrade(engine)
+        print(f"✓ Applied {', '.join(applied)}" if applied else "✓ Database is up to date")
+        return 0
+
+    if command == 'status':
+        applied = set(applied_versions(engine))
+        for migration in MIGRATIONS:
+            mark = '✓' if migration.VERSION in applied else ' '
+            print(f"[{mark}] {migration.VERSION} {migration.DESCRIPTION}")
+        return 0
+
+    if command == 'check-plans':
+        pending = pending_migrations(engine)
+        if pending:
+            print(f"✗ Pending migrations: {', '.join(m.VERSION for m in pending)} (run upgrade first)")
+            return 1
+        problems = check_query_plans(engine)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print("✓ All hot queries use indexes")
+        return 1 if problems else 0
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
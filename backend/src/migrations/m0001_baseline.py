@@ -0,0 +1,125 @@
+"""
+Baseline: all tables, plus the columns the former migrate_*.py scripts added
+
+The tables are spelled out as they were when versioned migrations were
+introduced, not taken from the models: later schema changes belong in
+later migrations, and this one must create the same schema forever.
+"""
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, inspect, text
+)
+from sqlalchemy.engine import Connection
+
+VERSION = '0001'
+DESCRIPTION = 'Baseline schema'
+
+# Columns that older databases may lack (added by the former migrate_add_*.py)
+RUN_COLUMNS = {
+    'selected_direction': "VARCHAR(1000)",
+    'started_at': "TIMESTAMP",
+    'prompt_tokens': "INTEGER NOT NULL DEFAULT 0",
+    'completion_tokens': "INTEGER NOT NULL DEFAULT 0",
+    'cost_usd': "FLOAT NOT NULL DEFAULT 0",
+    'deadline_seconds': "INTEGER",
+    'degradations': "TEXT",
+}
+
+metadata = MetaData()
+
+Table(
+    'runs', metadata,
+    Column('id', String, primary_key=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('started_at', DateTime, nullable=True),
+    Column('completed_at', DateTime, nullable=True),
+    Column('status', String, nullable=False),
+    Column('current_stage', String(100), nullable=True),
+    Column('optional_direction', String(500), nullable=True),
+    Column('selected_direction', String(1000), nullable=True),
+    Column('ideas_count', Integer, nullable=False),
+    Column('error_message', Text, nullable=True),
+    Column('prompt_tokens', Integer, nullable=False),
+    Column('completion_tokens', Integer, nullable=False),
+    Column('cost_usd', Float, nullable=False),
+    Column('deadline_seconds', Integer, nullable=True),
+    Column('degradations', Text, nullable=True),
+)
+
+Table(
+    'ideas', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('run_id', String, ForeignKey('runs.id', ondelete='CASCADE'), nullable=False),
+    Column('title', String(200), nullable=False),
+    Column('pain_description', Text, nullable=False),
+    Column('segment', String(200), nullable=False),
+    Column('confidence_level', String, nullable=False),
+    Column('brief_evidence', Text, nullable=False),
+    Column('detailed_evidence', Text, nullable=True),
+    Column('plan_7days', Text, nullable=False),
+    Column('plan_30days', Text, nullable=False),
+    Column('order_index', Integer, nullable=False),
+    Column('created_at', DateTime, nullable=False),
+)
+
+Table(
+    'analogues', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('idea_id', Integer, ForeignKey('ideas.id', ondelete='CASCADE'), nullable=False),
+    Column('name', String(200), nullable=False),
+    Column('description', Text, nullable=False),
+    Column('url', String(500), nullable=False),
+    Column('order_index', Integer, nullable=False),
+)
+
+Table(
+    'evidences', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('idea_id', Integer, ForeignKey('ideas.id', ondelete='CASCADE'), nullable=False),
+    Column('pattern_description', Text, nullable=False),
+    Column('source_type', String(50), nullable=False),
+    Column('source_url', String(500), nullable=True),
+    Column('example_quote', Text, nullable=True),
+    Column('created_at', DateTime, nullable=False),
+)
+
+Table(
+    'purchases', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('idea_id', Integer, ForeignKey('ideas.id'), nullable=False),
+    Column('run_id', String, ForeignKey('runs.id'), nullable=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('user_ip', String(50), nullable=True),
+    Column('user_agent', String(500), nullable=True),
+)
+
+Table(
+    'run_spans', metadata,
+    Column('id', Integer, primary_key=True, autoincrement=True),
+    Column('run_id', String, ForeignKey('runs.id', ondelete='CASCADE'), nullable=False),
+    Column('seq', Integer, nullable=False),
+    Column('parent_seq', Integer, nullable=True),
+    Column('name', String(50), nullable=False),
+    Column('category', String(20), nullable=False),
+    Column('started_at', DateTime, nullable=False),
+    Column('duration_ms', Integer, nullable=False),
+    Column('bytes', Integer, nullable=True),
+    Column('tokens', Integer, nullable=True),
+    Column('status', String(10), nullable=False),
+    Column('attributes', Text, nullable=True),
+    Index('idx_run_spans_run_id', 'run_id'),
+    Index('idx_run_spans_category_started_at', 'category', 'started_at'),
+)
+
+
+def upgrade(connection: Connection):
+    from . import has_column
+
+    existing_tables = set(inspect(connection).get_table_names())
+
+    # Only creates what is missing (purchases, run_spans, ...)
+    metadata.create_all(bind=connection, checkfirst=True)
+
+    if 'runs' in existing_tables:
+        for name, definition in RUN_COLUMNS.items():
+            if not has_column(connection, 'runs', name):
+                connection.execute(text(f"ALTER TABLE runs ADD COLUMN {name} {definition}"))
@@ -0,0 +1,31 @@
+"""
+Indexes for the hot read paths
+
+    ideas(run_id, order_index)  get_run_ideas: filter by run, ordered
+    analogues(idea_id)          idea detail / eager loads
+    evidences(idea_id)          idea detail / eager loads
+    purchases(idea_id)          admin top ideas
+    purchases(created_at)       admin recent purchases
+    runs(status)                pending/running run lookups
+
+The purchases indexes already exist where the former migrate_add_purchases.py ran.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = '0002'
+DESCRIPTION = 'Indexes on hot query paths'
+
+INDEXES = {
+    'idx_ideas_run_id_order': "ideas (run_id, order_index)",
+    'idx_analogues_idea_id': "analogues (idea_id)",
+    'idx_evidences_idea_id': "evidences (idea_id)",
+    'idx_purchases_idea_id': "purchases (idea_id)",
+    'idx_purchases_created_at': "purchases (created_at)",
+    'idx_runs_status': "runs (status)",
+}
+
+
+def upgrade(connection: Connection):
+    for name, target in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
@@ -0,0 +1,73 @@
+"""
+Purchase rollups for the admin statistics
+
+Creates idea_purchase_totals and purchase_buckets and fills them from
+the purchases recorded so far; from then on the purchase write path
+keeps them up to date.
+
+The backfill is plain INSERT ... SELECT ... GROUP BY against the tables
+below, not the write path's upserts: those follow the models.
+"""
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table,
+    column, delete, func, insert, literal_column, select, table
+)
+from sqlalchemy.engine import Connection
+
+VERSION = '0003'
+DESCRIPTION = 'Purchase rollups'
+
+metadata = MetaData()
+
+# Referenced tables, only so the foreign keys resolve (created by 0001)
+Table('runs', metadata, Column('id', String, primary_key=True))
+Table('ideas', metadata, Column('id', Integer, primary_key=True))
+
+idea_purchase_totals = Table(
+    'idea_purchase_totals', metadata,
+    Column('idea_id', Integer, ForeignKey('ideas.id', ondelete='CASCADE'), primary_key=True),
+    Column('run_id', String, ForeignKey('runs.id'), nullable=True),
+    Column('purchase_count', Integer, nullable=False),
+    Column('last_purchase_at', DateTime, nullable=True),
+    Index('idx_idea_purchase_totals_count', 'purchase_count'),
+)
+
+purchase_buckets = Table(
+    'purchase_buckets', metadata,
+    Column('bucket_start', DateTime, primary_key=True),
+    Column('idea_id', Integer, ForeignKey('ideas.id', ondelete='CASCADE'), primary_key=True),
+    Column('run_id', String, ForeignKey('runs.id'), nullable=True),
+    Column('purchase_count', Integer, nullable=False),
+    Index('idx_purchase_buckets_run_id', 'run_id', 'bucket_start'),
+)
+
+purchases = table('purchases', column('id'), column('idea_id'), column('run_id'), column('created_at'))
+
+
+def _hour(connection: Connection, moment):
+    """Start of the hour, stored the way the write path stores bucket_start"""
+    if connection.dialect.name == 'sqlite':
+        # SQLAlchemy keeps SQLite datetimes as text with microseconds
+        return func.strftime('%Y-%m-%d %H:00:00.000000', moment)
+    return func.date_trunc(literal_column("'hour'"), moment)
+
+
+def upgrade(connection: Connection):
+    for rollup in (idea_purchase_totals, purchase_buckets):
+        rollup.create(bind=connection, checkfirst=True)
+        connection.execute(delete(rollup))
+
+    connection.execute(insert(idea_purchase_totals).from_select(
+        ['idea_id', 'run_id', 'purchase_count', 'last_purchase_at'],
+        select(
+            purchases.c.idea_id, func.max(purchases.c.run_id), func.count(), func.max(purchases.c.created_at)
+        ).group_by(purchases.c.idea_id)
+    ))
+
+    bucket_start = _hour(connection, purchases.c.created_at)
+    connection.execute(insert(purchase_buckets).from_select(
+        ['bucket_start', 'idea_id', 'run_id', 'purchase_count'],
+        select(
+            bucket_start, purchases.c.idea_id, func.max(purchases.c.run_id), func.count()
+        ).group_by(bucket_start, purchases.c.idea_id)
+    ))
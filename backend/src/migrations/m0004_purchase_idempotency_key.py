@@ -0,0 +1,23 @@
+"""
+Idempotency key of purchases
+
+Buffered clicks are inserted with ON CONFLICT DO NOTHING on this key, so
+a batch replayed after a crash, or a click retried by the client, is
+stored once. Existing rows keep NULL, which the unique index allows
+any number of times.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = '0004'
+DESCRIPTION = 'Idempotency key of purchases'
+
+
+def upgrade(connection: Connection):
+    from . import has_column
+
+    if not has_column(connection, 'purchases', 'idempotency_key'):
+        connection.execute(text("ALTER TABLE purchases ADD COLUMN idempotency_key VARCHAR(64)"))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_purchases_idempotency_key ON purchases (idempotency_key)"
+    ))
@@ -0,0 +1,28 @@
+"""
+Indexes for the keyset-paginated run and idea history
+
+GET /api/runs and GET /api/ideas page on (created_at, id), newest first,
+optionally filtered by one column. Each combination gets an index with
+the filter column first, so a page is a range read in index order. The
+runs(status, created_at, id) index also serves plain status lookups and
+replaces idx_runs_status.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = '0005'
+DESCRIPTION = 'Indexes for run and idea history'
+
+INDEXES = {
+    'idx_runs_created_at_id': "runs (created_at, id)",
+    'idx_runs_status_created_at_id': "runs (status, created_at, id)",
+    'idx_runs_direction_created_at_id': "runs (selected_direction, created_at, id)",
+    'idx_ideas_created_at_id': "ideas (created_at, id)",
+    'idx_ideas_confidence_created_at_id': "ideas (confidence_level, created_at, id)",
+}
+
+
+def upgrade(connection: Connection):
+    for name, target in INDEXES.items():
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+    connection.execute(text("DROP INDEX IF EXISTS idx_runs_status"))
@@ -0,0 +1,120 @@
+"""
+Full-text index over ideas
+
+SQLite: an FTS5 table ideas_fts (rowid = ideas.id) with the title, pain
+description, segment and analogue names, ranked by bm25 with the title
+weighted highest. PostgreSQL: a weighted tsvector column
+ideas.search_vector with a GIN index.
+
+Both are maintained by triggers, so every write path (including the bulk
+inserts of save_ideas) keeps the index in sync incrementally: a new idea
+is indexed on insert and each analogue appends its name to its idea's
+entry. Existing ideas are indexed here once.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+VERSION = '0006'
+DESCRIPTION = 'Full-text search over ideas'
+
+# Column weights: title, pain description, segment, analogue names
+SQLITE_RANK = "bm25(10.0, 3.0, 2.0, 1.0)"
+
+SQLITE_STATEMENTS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ideas_fts USING fts5(
+        title, pain_description, segment, analogues,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"INSERT INTO ideas_fts (ideas_fts, rank) VALUES ('rank', '{SQLITE_RANK}')",
+    """
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_insert AFTER INSERT ON ideas BEGIN
+        INSERT INTO ideas_fts (rowid, title, pain_description, segment, analogues)
+        VALUES (new.id, new.title, new.pain_description, new.segment, '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_update AFTER UPDATE OF title, pain_description, segment ON ideas BEGIN
+        UPDATE ideas_fts
+        SET title = new.title, pain_description = new.pain_description, segment = new.segment
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_delete AFTER DELETE ON ideas BEGIN
+        DELETE FROM ideas_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_analogue AFTER INSERT ON analogues BEGIN
+        UPDATE ideas_fts SET analogues = analogues || ' ' || new.name WHERE rowid = new.idea_id;
+    END
+    """,
+    "DELETE FROM ideas_fts",
+    """
+    INSERT INTO ideas_fts (rowid, title, pain_description, segment, analogues)
+    SELECT ideas.id, ideas.title, ideas.pain_description, ideas.segment,
+           coalesce((SELECT group_concat(name, ' ') FROM analogues WHERE analogues.idea_id = ideas.id), '')
+    FROM ideas
+    """,
+]
+
+# Russian configuration: Russian words are stemmed, Latin ones with the English stemmer
+POSTGRES_STATEMENTS = [
+    "ALTER TABLE ideas ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION ideas_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.pain_description, '')), 'B') ||
+            setweight(to_tsvector('russian', coalesce(NEW.segment, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS ideas_search_vector ON ideas",
+    """
+    CREATE TRIGGER ideas_search_vector BEFORE INSERT OR UPDATE OF title, pain_description, segment ON ideas
+    FOR EACH ROW EXECUTE FUNCTION ideas_search_vector()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION analogues_search_vector() RETURNS trigger AS $$
+    BEGIN
+        UPDATE ideas
+        SET search_vector = search_vector || setweight(to_tsvector('russian', NEW.name), 'D')
+        WHERE id = NEW.idea_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS analogues_search_vector ON analogues",
+    """
+    CREATE TRIGGER analogues_search_vector AFTER INSERT ON analogues
+    FOR EACH ROW EXECUTE FUNCTION analogues_search_vector()
+    """,
+    """
+    UPDATE ideas SET search_vector =
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(pain_description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(segment, '')), 'C') ||
+        setweight(to_tsvector('russian', coalesce(
+            (SELECT string_agg(name, ' ') FROM analogues WHERE analogues.idea_id = ideas.id), ''
+        )), 'D')
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ideas_search_vector ON ideas USING gin (search_vector)",
+]
+
+
+def upgrade(connection: Connection):
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_STATEMENTS
+    elif dialect == 'postgresql':
+        statements = POSTGRES_STATEMENTS
+    else:
+        raise ValueError(f"Full-text search does not support '{dialect}'")
+
+    for statement in statements:
+        connection.execute(text(statement))
@@ -0,0 +1,30 @@
+"""
+Batches of runs
+
+Creates run_batches and links child runs to their batch through
+runs.batch_id. Existing runs keep NULL: they were submitted one by one.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+from sqlalchemy.engine import Connection
+
+VERSION = '0007'
+DESCRIPTION = 'Batches of runs'
+
+run_batches = Table(
+    'run_batches', MetaData(),
+    Column('id', String, primary_key=True),
+    Column('created_at', DateTime, nullable=False),
+    Column('client_key', String(200), nullable=False),
+    Column('priority', String(20), nullable=False),
+    Column('concurrency', Integer, nullable=False),
+    Column('runs_count', Integer, nullable=False),
+)
+
+
+def upgrade(connection: Connection):
+    from . import has_column
+
+    run_batches.create(bind=connection, checkfirst=True)
+    if not has_column(connection, 'runs', 'batch_id'):
+        connection.execute(text("ALTER TABLE runs ADD COLUMN batch_id VARCHAR REFERENCES run_batches (id) ON DELETE CASCADE"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS idx_runs_batch_id ON runs (batch_id)"))
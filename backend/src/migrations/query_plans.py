@@ -0,0 +1,97 @@
+"""
+Query-plan check for the hot read paths
+
+Asks the database how it would execute the queries behind the API's
+read paths and reports every one that scans a whole table instead of
+using an index. Run after migrations (exit code 1 on a problem):
+
+    python -m src.migrations check-plans
+"""
+import re
+from typing import List, Tuple
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import Select
+
+from ..models import Run, Idea, Analogue, Evidence, Purchase, IdeaPurchaseTotal
+
+# Name, query, table that must be read through an index
+HOT_QUERIES: List[Tuple[str, Select, str]] = [
+    ('run ideas', select(Idea).where(Idea.run_id == 'run').order_by(Idea.order_index), 'ideas'),
+    ('idea analogues', select(Analogue).where(Analogue.idea_id.in_([1, 2])), 'analogues'),
+    ('idea evidences', select(Evidence).where(Evidence.idea_id.in_([1, 2])), 'evidences'),
+    ('idea purchases', select(func.count(Purchase.id)).where(Purchase.idea_id == 1), 'purchases'),
+    ('recent purchases', select(Purchase).order_by(Purchase.created_at.desc()).limit(50), 'purchases'),
+    ('top ideas', select(IdeaPurchaseTotal.idea_id).order_by(IdeaPurchaseTotal.purchase_count.desc()).limit(10),
+     'idea_purchase_totals'),
+    ('runs by status', select(Run.id).where(Run.status == 'pending'), 'runs'),
+]
+
+
+def _newest_first(query: Select, model) -> Select:
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(21)
+
+
+# Keyset-paginated listings: must also read the index in order instead of sorting
+ORDERED_QUERIES: List[Tuple[str, Select, str]] = [
+    ('runs page', _newest_first(select(Run.id), Run), 'runs'),
+    ('runs page by status', _newest_first(select(Run.id).where(Run.status == 'completed'), Run), 'runs'),
+    ('runs page by direction', _newest_first(select(Run.id).where(Run.selected_direction == 'x'), Run), 'runs'),
+    ('ideas page', _newest_first(select(Idea.id), Idea), 'ideas'),
+    ('ideas page by confidence', _newest_first(select(Idea.id).where(Idea.confidence_level == 'high'), Idea), 'ideas'),
+]
+
+
+def _sqlite_plan(connection: Connection, sql: str) -> List[str]:
+    return [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def _sqlite_full_scan(plan: List[str], table: str) -> bool:
+    # "SCAN ideas" is a full scan; "SCAN ideas USING INDEX ..." and "SEARCH ..." are not
+    return any(re.match(rf"SCAN {table}\b(?!.*USING (COVERING )?INDEX)", line) for line in plan)
+
+
+def _sqlite_sorts(plan: List[str]) -> bool:
+    return any(line.startswith("USE TEMP B-TREE FOR ORDER BY") for line in plan)
+
+
+def _postgres_plan(connection: Connection, sql: str) -> List[str]:
+    # Small tables are always cheapest to scan; ask whether an index path exists
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    return [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {sql}")]
+
+
+def _postgres_full_scan(plan: List[str], table: str) -> bool:
+    return any(re.search(rf"Seq Scan on {table}\b", line) for line in plan)
+
+
+def _postgres_sorts(plan: List[str]) -> bool:
+    return any(re.match(r"\s*(->\s*)?(Incremental )?Sort\b", line) for line in plan)
+
+
+def check_query_plans(engine: Engine) -> List[str]:
+    """
+    Returns:
+        One message per hot query that needs a full table scan, or a sort
+        for the ordered ones (empty if fine)
+    """
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        explain, full_scan, sorts = _sqlite_plan, _sqlite_full_scan, _sqlite_sorts
+    elif dialect == 'postgresql':
+        explain, full_scan, sorts = _postgres_plan, _postgres_full_scan, _postgres_sorts
+    else:
+        raise ValueError(f"Query-plan check does not support '{dialect}'")
+
+    problems = []
+    with engine.begin() as connection:
+        checks = [(query, False) for query in HOT_QUERIES] + [(query, True) for query in ORDERED_QUERIES]
+        for (name, query, table), ordered in checks:
+            sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = explain(connection, sql)
+            if full_scan(plan, table):
+                problems.append(f"{name}: full scan of {table} ({' | '.join(plan)})")
+            elif ordered and sorts(plan):
+                problems.append(f"{name}: sorts {table} instead of reading an index in order ({' | '.join(plan)})")
+    return problems
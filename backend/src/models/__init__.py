@@ -1,17 +1,23 @@
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from ..config import settings
+from .profiles import create_sync_engine, create_async_engine_for, has_async_driver
 
-# Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Create database engine (settings per DATABASE_PROFILE, see profiles.py)
+engine = create_sync_engine(settings.database_url)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and sessions used by the FastAPI routes (workers stay sync).
+# A database without an asyncio driver (profiles.ASYNC_DRIVERS) still
+# serves workers and scripts; only the API refuses to start on it
+async_engine = create_async_engine_for(settings.database_url) if has_async_driver(settings.database_url) else None
+
+# Objects stay readable after commit; async sessions cannot lazy-load them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -23,11 +29,19 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency for FastAPI
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Import models to register them with Base
+from .run_batch import RunBatch
 from .run import Run
 from .idea import Idea
 from .analogue import Analogue
 from .evidence import Evidence
 from .purchase import Purchase
+from .purchase_rollup import IdeaPurchaseTotal, PurchaseBucket
+from .run_span import RunSpan
 
-__all__ = ['Base', 'engine', 'SessionLocal', 'get_db', 'Run', 'Idea', 'Analogue', 'Evidence', 'Purchase']
+__all__ = ['Base', 'engine', 'SessionLocal', 'get_db', 'async_engine', 'AsyncSessionLocal', 'AsyncSession', 'get_async_db', 'RunBatch', 'Run', 'Idea', 'Analogue', 'Evidence', 'Purchase', 'IdeaPurchaseTotal', 'PurchaseBucket', 'RunSpan']
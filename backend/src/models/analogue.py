@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from . import Base
 
@@ -16,6 +16,10 @@ class Analogue(Base):
     # Relationships
     idea = relationship("Idea", back_populates="analogues")
 
+    __table_args__ = (
+        Index('idx_analogues_idea_id', 'idea_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
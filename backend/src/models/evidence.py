@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -18,6 +18,10 @@ class Evidence(Base):
     # Relationships
     idea = relationship("Idea", back_populates="evidences")
 
+    __table_args__ = (
+        Index('idx_evidences_idea_id', 'idea_id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
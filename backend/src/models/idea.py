@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime
+from sqlalchemy import Column, String, Integer, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -22,10 +22,18 @@ class Idea(Base):
 
     # Relationships
     run = relationship("Run", back_populates="ideas")
-    analogues = relationship("Analogue", back_populates="idea", cascade="all, delete-orphan")
+    analogues = relationship(
+        "Analogue", back_populates="idea", cascade="all, delete-orphan", order_by="Analogue.order_index"
+    )
     evidences = relationship("Evidence", back_populates="idea", cascade="all, delete-orphan")
     purchases = relationship("Purchase", back_populates="idea", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('idx_ideas_run_id_order', 'run_id', 'order_index'),
+        Index('idx_ideas_created_at_id', 'created_at', 'id'),
+        Index('idx_ideas_confidence_created_at_id', 'confidence_level', 'created_at', 'id'),
+    )
+
     def to_dict_brief(self):
         """Brief representation for ideas list"""
         return {
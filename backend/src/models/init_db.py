@@ -2,15 +2,17 @@
 Database initialization script
 Run with: python -m src.models.init_db
 """
-from . import Base, engine
+from . import engine
 from ..config import logger
+from ..migrations import upgrade
 
 
 def init_database():
     """Create all tables in the database"""
     try:
         logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        # The migrations are the only source of the schema
+        upgrade(engine)
         logger.info("Database tables created successfully!")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
@@ -0,0 +1,137 @@
+"""
+Database profiles: engine settings per backend
+
+DATABASE_PROFILE=tuned (default) configures the engines for a worker
+fleet committing stage updates while the API reads:
+
+    SQLite      WAL journal (readers never wait for the writer),
+                synchronous=NORMAL, memory-mapped reads and a busy
+                timeout instead of immediate "database is locked"
+    PostgreSQL  sized connection pool with pre-ping and recycling, and a
+                server-side statement timeout
+
+DATABASE_PROFILE=plain keeps the driver defaults (used by the benchmark
+as the baseline).
+"""
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from ..config import settings
+
+PROFILES = ('tuned', 'plain')
+
+# Async drivers for the API, which must not block its event loop
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def has_async_driver(database_url: str) -> bool:
+    return make_url(database_url).get_backend_name() in ASYNC_DRIVERS
+
+
+def async_database_url(database_url: str) -> str:
+    """Same database as DATABASE_URL, through its asyncio driver"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _profile(profile: Optional[str]) -> str:
+    profile = profile or settings.database_profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown DATABASE_PROFILE '{profile}', expected one of {', '.join(PROFILES)}")
+    return profile
+
+
+def _is_memory_sqlite(database_url: str) -> bool:
+    return make_url(database_url).database in (None, '', ':memory:')
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': settings.sqlite_busy_timeout_ms,
+        'mmap_size': settings.sqlite_mmap_size_mb * 1024 * 1024,
+    }
+
+
+def _install_sqlite_pragmas(engine: Engine, database_url: str):
+    pragmas = sqlite_pragmas()
+    if _is_memory_sqlite(database_url):
+        # WAL needs a database file
+        pragmas.pop('journal_mode')
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _postgres_pool_options() -> Dict[str, Any]:
+    return {
+        'pool_size': settings.db_pool_size,
+        'max_overflow': settings.db_max_overflow,
+        'pool_timeout': settings.db_pool_timeout_seconds,
+        'pool_recycle': settings.db_pool_recycle_seconds,
+        'pool_pre_ping': True,
+    }
+
+
+def create_sync_engine(database_url: str, profile: Optional[str] = None) -> Engine:
+    """Engine for workers, scripts and the threadpool routes"""
+    backend = make_url(database_url).get_backend_name()
+
+    if _profile(profile) == 'plain':
+        connect_args = {"check_same_thread": False} if backend == 'sqlite' else {}
+        return create_engine(database_url, connect_args=connect_args)
+
+    if backend == 'sqlite':
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False, "timeout": settings.sqlite_busy_timeout_ms / 1000}
+        )
+        _install_sqlite_pragmas(engine, database_url)
+        return engine
+
+    if backend == 'postgresql':
+        return create_engine(
+            database_url,
+            connect_args={"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"},
+            **_postgres_pool_options()
+        )
+
+    return create_engine(database_url)
+
+
+def create_async_engine_for(database_url: str, profile: Optional[str] = None) -> AsyncEngine:
+    """Async engine for the FastAPI routes, tuned like the sync one"""
+    async_url = async_database_url(database_url)
+    backend = make_url(database_url).get_backend_name()
+
+    if _profile(profile) == 'plain':
+        return create_async_engine(async_url)
+
+    if backend == 'sqlite':
+        engine = create_async_engine(
+            async_url,
+            connect_args={"timeout": settings.sqlite_busy_timeout_ms / 1000}
+        )
+        _install_sqlite_pragmas(engine.sync_engine, database_url)
+        return engine
+
+    # postgresql
+    return create_async_engine(
+        async_url,
+        connect_args={"server_settings": {"statement_timeout": str(settings.db_statement_timeout_ms)}},
+        **_postgres_pool_options()
+    )
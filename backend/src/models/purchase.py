@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -13,10 +13,17 @@ class Purchase(Base):
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
     user_ip = Column(String(50), nullable=True)
     user_agent = Column(String(500), nullable=True)
+    idempotency_key = Column(String(64), nullable=True)  # Client key or server-generated, dedups replays
 
     # Relationships
     idea = relationship("Idea", back_populates="purchases")
 
+    __table_args__ = (
+        Index('idx_purchases_idea_id', 'idea_id'),
+        Index('idx_purchases_created_at', 'created_at'),
+        Index('uq_purchases_idempotency_key', 'idempotency_key', unique=True),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
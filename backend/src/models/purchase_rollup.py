@@ -0,0 +1,30 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
+from . import Base
+
+
+class IdeaPurchaseTotal(Base):
+    """All-time purchase counter of one idea, maintained on every purchase"""
+    __tablename__ = "idea_purchase_totals"
+
+    idea_id = Column(Integer, ForeignKey('ideas.id', ondelete='CASCADE'), primary_key=True)
+    run_id = Column(String, ForeignKey('runs.id'), nullable=True)
+    purchase_count = Column(Integer, nullable=False, default=0)
+    last_purchase_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_idea_purchase_totals_count', 'purchase_count'),
+    )
+
+
+class PurchaseBucket(Base):
+    """Purchases of one idea within one UTC hour, maintained on every purchase"""
+    __tablename__ = "purchase_buckets"
+
+    bucket_start = Column(DateTime, primary_key=True)  # Start of the hour
+    idea_id = Column(Integer, ForeignKey('ideas.id', ondelete='CASCADE'), primary_key=True)
+    run_id = Column(String, ForeignKey('runs.id'), nullable=True)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index('idx_purchase_buckets_run_id', 'run_id', 'bucket_start'),
+    )
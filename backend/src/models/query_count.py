@@ -0,0 +1,53 @@
+"""
+Counting the SQL statements a block of code sends
+
+Used to keep read paths free of N+1 queries: the number of statements a
+request issues must not grow with the number of rows it returns.
+
+    with assert_query_count(async_engine, 1):
+        client.get(f"/api/ideas/{idea_id}")
+"""
+from contextlib import contextmanager
+from typing import List, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine: Union[Engine, AsyncEngine]):
+    """Collect every statement executed on the engine inside the block"""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    counter = QueryCounter()
+    event.listen(sync_engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", counter._record)
+
+
+@contextmanager
+def assert_query_count(engine: Union[Engine, AsyncEngine], expected: int):
+    """
+    Raises:
+        AssertionError: when the block executed a different number of statements
+    """
+    with count_queries(engine) as counter:
+        yield counter
+
+    if counter.count != expected:
+        executed = '\n'.join(f"  {statement}" for statement in counter.statements)
+        raise AssertionError(f"Expected {expected} queries, got {counter.count}:\n{executed}")
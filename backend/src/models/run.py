@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text
+from sqlalchemy import Column, String, Integer, DateTime, Text, Float, Index, ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import json
 import uuid
 from . import Base
 
@@ -10,16 +11,31 @@ class Run(Base):
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
-    status = Column(String, nullable=False, default='pending')  # pending, running, completed, failed
+    status = Column(String, nullable=False, default='pending')  # pending, running, completed, failed, cancelled
     current_stage = Column(String(100), nullable=True)
     optional_direction = Column(String(500), nullable=True)
     selected_direction = Column(String(1000), nullable=True)  # Фактически выбранное направление (может быть случайным)
     ideas_count = Column(Integer, nullable=False, default=0)
     error_message = Column(Text, nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)  # Estimated LLM cost
+    deadline_seconds = Column(Integer, nullable=True)  # Latency target, RUN_DEADLINE_SECONDS if empty
+    degradations = Column(Text, nullable=True)  # JSON list of steps scaled down for deadline/budget
+    batch_id = Column(String, ForeignKey('run_batches.id', ondelete='CASCADE'), nullable=True)  # POST /api/runs/batch
 
     # Relationships
     ideas = relationship("Idea", back_populates="run", cascade="all, delete-orphan")
+    batch = relationship("RunBatch", back_populates="runs")
+
+    __table_args__ = (
+        Index('idx_runs_created_at_id', 'created_at', 'id'),
+        Index('idx_runs_status_created_at_id', 'status', 'created_at', 'id'),
+        Index('idx_runs_direction_created_at_id', 'selected_direction', 'created_at', 'id'),
+        Index('idx_runs_batch_id', 'batch_id'),
+    )
 
     def to_dict(self):
         return {
@@ -32,7 +48,15 @@ class Run(Base):
             'ideas_count': self.ideas_count,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'prompt_tokens': self.prompt_tokens or 0,
+            'completion_tokens': self.completion_tokens or 0,
+            'total_tokens': (self.prompt_tokens or 0) + (self.completion_tokens or 0),
+            'cost_usd': round(self.cost_usd or 0.0, 6),
+            'deadline_seconds': self.deadline_seconds,
+            'degradations': json.loads(self.degradations) if self.degradations else [],
+            'batch_id': self.batch_id
         }
 
     def _calculate_progress(self):
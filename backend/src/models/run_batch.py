@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.orm import relationship
+from datetime import datetime
+import uuid
+from . import Base
+
+
+class RunBatch(Base):
+    """Runs submitted together; children run at most `concurrency` at a time"""
+    __tablename__ = "run_batches"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    client_key = Column(String(200), nullable=False)
+    priority = Column(String(20), nullable=False, default='bulk')
+    concurrency = Column(Integer, nullable=False)
+    runs_count = Column(Integer, nullable=False, default=0)
+
+    # Relationships
+    runs = relationship("Run", back_populates="batch", order_by="Run.created_at")
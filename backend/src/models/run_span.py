@@ -0,0 +1,41 @@
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Index
+from datetime import datetime
+import json
+from . import Base
+
+
+class RunSpan(Base):
+    """Timing span of one pipeline step (stage, search query, LLM call, DB save)"""
+    __tablename__ = "run_spans"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String, ForeignKey('runs.id', ondelete='CASCADE'), nullable=False)
+    seq = Column(Integer, nullable=False)  # Order within the run
+    parent_seq = Column(Integer, nullable=True)  # Enclosing span, None for top level
+    name = Column(String(50), nullable=False)  # search, tavily_query, analyze_batch, llm_call, ...
+    category = Column(String(20), nullable=False)  # stage, tavily, llm, db
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    duration_ms = Column(Integer, nullable=False, default=0)
+    bytes = Column(Integer, nullable=True)
+    tokens = Column(Integer, nullable=True)
+    status = Column(String(10), nullable=False, default='ok')  # ok, error
+    attributes = Column(Text, nullable=True)  # Small JSON object
+
+    __table_args__ = (
+        Index('idx_run_spans_run_id', 'run_id'),
+        Index('idx_run_spans_category_started_at', 'category', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'parent_seq': self.parent_seq,
+            'name': self.name,
+            'category': self.category,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_ms': self.duration_ms,
+            'bytes': self.bytes,
+            'tokens': self.tokens,
+            'status': self.status,
+            'attributes': json.loads(self.attributes) if self.attributes else {}
+        }
@@ -2,8 +2,10 @@
 Tavily Search API integration for finding real user pains
 """
 import httpx
+import time
 from typing import List, Dict, Optional
 from ..config import settings, logger
+from ..services import run_events, tracing, batch_cache
 
 
 class TavilyScraper:
@@ -19,13 +21,21 @@ class TavilyScraper:
         if not self.api_key:
             raise ValueError("Tavily API key not configured")
 
-    async def search_pains(self, direction: str, max_results: int = 10) -> List[Dict]:
+    async def search_pains(
+        self,
+        direction: str,
+        max_results: int = 10,
+        max_queries: Optional[int] = None,
+        timeout: float = 30.0
+    ) -> List[Dict]:
         """
         Search for real user pain discussions related to the business direction
 
         Args:
             direction: Business direction (e.g., "B2B SaaS для стартапов")
             max_results: Maximum number of results to return (default: 10)
+            max_queries: Run only the first N queries (all by default)
+            timeout: Timeout of each Tavily request in seconds
 
         Returns:
             List of search results with pain-related content:
@@ -43,17 +53,31 @@ class TavilyScraper:
         logger.info(f"[Tavily] Searching for pains in direction: {direction}")
 
         # Build search queries focused on finding problems/pains
-        queries = self._build_pain_queries(direction)
+        queries = self._build_pain_queries(direction)[:max_queries]
 
         all_results = []
 
         for query in queries:
+            started = time.monotonic()
             try:
-                results = await self._search(query, max_results=max_results)
+                # Sibling runs of a batch send each distinct query once
+                results = await batch_cache.shared(
+                    'tavily', {'query': query, 'max_results': max_results},
+                    lambda: self._search(query, max_results=max_results, timeout=timeout),
+                    lock_seconds=timeout
+                )
                 all_results.extend(results)
                 logger.info(f"[Tavily] Query '{query}' returned {len(results)} results")
+                run_events.emit(
+                    'search_query',
+                    f"Tavily: {len(results)} results for '{query}'",
+                    query=query,
+                    results=len(results),
+                    duration_ms=round((time.monotonic() - started) * 1000)
+                )
             except Exception as e:
                 logger.error(f"[Tavily] Error searching for '{query}': {e}")
+                run_events.emit('search_error', f"Tavily query failed: {e}", level='warning', query=query)
                 continue
 
         # Remove duplicates by URL
@@ -108,13 +132,14 @@ class TavilyScraper:
         key_words = [w for w in words if w not in stop_words][:4]
         return ' '.join(key_words)
 
-    async def _search(self, query: str, max_results: int = 10) -> List[Dict]:
+    async def _search(self, query: str, max_results: int = 10, timeout: float = 30.0) -> List[Dict]:
         """
         Execute Tavily search API call
 
         Args:
             query: Search query
             max_results: Maximum results to return
+            timeout: Request timeout in seconds
 
         Returns:
             List of search results
@@ -140,12 +165,14 @@ class TavilyScraper:
         logger.info(f"  Domains: {', '.join(payload['include_domains'])}")
 
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.base_url,
-                    json=payload
-                )
-                response.raise_for_status()
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                with tracing.span('tavily_query', 'tavily', query=query) as query_span:
+                    response = await client.post(
+                        self.base_url,
+                        json=payload
+                    )
+                    query_span.bytes = len(response.content)
+                    response.raise_for_status()
                 data = response.json()
 
                 # Extract results
@@ -0,0 +1,172 @@
+"""
+Admission control and queue-aware ETA for new runs
+
+Estimates when a run will start and finish from the number of runs
+waiting in Redis, the number of worker slots and a rolling window of
+recent run durations. Beyond ADMISSION_MAX_BACKLOG waiting runs new
+submissions are rejected instead of piling up past the SSE timeout.
+"""
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from rq import Worker
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled
+from . import metrics
+from . import scheduler
+
+# Rolling window of recent run durations (seconds, newest first)
+LATENCY_KEY = "pain_to_idea:run_latencies"
+
+# Worker capacity and load are re-read from Redis at most this often
+CAPACITY_CACHE_SECONDS = 5
+
+_fleet_cache = {'capacity': 0, 'busy': 0, 'expires_at': 0.0}
+
+
+class AdmissionRejected(Exception):
+    """Raised when the backlog is too long to accept another run"""
+
+    def __init__(self, backlog: int, retry_after: int):
+        super().__init__(f"Backlog of {backlog} runs exceeds the limit of {settings.admission_max_backlog}")
+        self.backlog = backlog
+        self.retry_after = retry_after
+
+
+def waiting_runs() -> int:
+    """Runs accepted but not started: held by the scheduler or queued in RQ"""
+    return scheduler.waiting_queue().count + scheduler.pending_count()
+
+
+def record_run_latency(seconds: float):
+    """Remember how long a run took from start to completion"""
+    if redis_disabled():
+        return
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.lpush(LATENCY_KEY, f"{seconds:.1f}")
+        pipe.ltrim(LATENCY_KEY, 0, settings.admission_latency_window - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"[Admission] Failed to record run latency: {e}")
+
+
+def average_run_seconds() -> float:
+    """Mean duration of recent runs, or the configured default"""
+    latencies: List[bytes] = redis_conn.lrange(LATENCY_KEY, 0, -1)
+    if not latencies:
+        return float(settings.admission_default_run_seconds)
+    return sum(float(value) for value in latencies) / len(latencies)
+
+
+def _fleet() -> Dict[str, int]:
+    """Slots of the worker fleet and how many of them are executing a job"""
+    now = time.time()
+    if _fleet_cache['expires_at'] > now:
+        metrics.cache_lookup('worker_capacity', hit=True)
+        return _fleet_cache
+    metrics.cache_lookup('worker_capacity', hit=False)
+
+    from ..workers.async_worker import WORKER_KEY_PREFIX
+
+    capacity = 0
+    busy = 0
+    for key in redis_conn.scan_iter(match=f"{WORKER_KEY_PREFIX}*", count=100):
+        concurrency, in_flight = redis_conn.hmget(key, 'concurrency', 'in_flight')
+        capacity += int(concurrency) if concurrency else 0
+        busy += int(in_flight) if in_flight else 0
+
+    # Plain RQ workers execute one job at a time
+    for worker in Worker.all(connection=redis_conn):
+        capacity += 1
+        busy += 1 if worker.get_state() == 'busy' else 0
+
+    _fleet_cache.update(capacity=max(capacity, 1), busy=busy, expires_at=now + CAPACITY_CACHE_SECONDS)
+    return _fleet_cache
+
+
+def worker_capacity() -> int:
+    """Number of runs the worker fleet can execute at the same time"""
+    return _fleet()['capacity']
+
+
+def _running_runs() -> int:
+    # Read from worker heartbeats rather than the database, so progress
+    # streams can refresh the ETA of pending runs without a DB query
+    return _fleet()['busy']
+
+
+def _estimate(runs_ahead: int, running: int, capacity: int, avg_seconds: float) -> Dict[str, str]:
+    """Start/finish estimate for a run with runs_ahead runs queued before it"""
+    occupied = running + runs_ahead
+    waves = 0 if occupied < capacity else math.floor((occupied - capacity) / capacity) + 1
+
+    start = datetime.utcnow() + timedelta(seconds=waves * avg_seconds)
+    finish = start + timedelta(seconds=avg_seconds)
+    return {
+        'estimated_start_at': start.isoformat(),
+        'estimated_finish_at': finish.isoformat(),
+    }
+
+
+def admit():
+    """
+    Check whether a new run may be accepted
+
+    Fails open: if Redis cannot be queried the run is admitted and the
+    enqueue step reports the real error.
+
+    Raises:
+        AdmissionRejected: when the waiting backlog is at the limit
+    """
+    try:
+        backlog = waiting_runs()
+        if backlog < settings.admission_max_backlog:
+            return
+
+        capacity = worker_capacity()
+        excess = backlog - settings.admission_max_backlog + 1
+        retry_after = max(1, math.ceil(excess / capacity * average_run_seconds()))
+    except Exception as e:
+        logger.warning(f"[Admission] Could not check backlog, admitting run: {e}")
+        return
+
+    logger.warning(f"[Admission] Rejecting run: backlog {backlog}, retry after {retry_after}s")
+    raise AdmissionRejected(backlog, retry_after)
+
+
+def queue_position(run_id: str) -> Optional[int]:
+    """0-based position of a pending run among all waiting runs (None if not waiting)"""
+    queue = scheduler.waiting_queue()
+    position = redis_conn.lpos(queue.key, scheduler.waiting_job_id(run_id))
+    if position is not None:
+        return position
+
+    # Runs still held by the scheduler start after everything already in RQ
+    pending = scheduler.pending_position(run_id)
+    if pending is None:
+        return None
+    return queue.count + pending
+
+
+def run_eta(run_id: str) -> Dict:
+    """
+    Queue position and estimated start/finish times of a pending run
+
+    Returns an empty dict when the run is not waiting in the queue or the
+    estimate cannot be computed.
+    """
+    try:
+        position = queue_position(run_id)
+        if position is None:
+            return {}
+
+        eta = _estimate(position, _running_runs(), worker_capacity(), average_run_seconds())
+        eta['queue_position'] = position + 1
+        return eta
+    except Exception as e:
+        logger.warning(f"[Admission] Could not estimate ETA for run {run_id}: {e}")
+        return {}
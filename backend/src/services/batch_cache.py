@@ -0,0 +1,106 @@
+"""
+Work shared between the runs of one batch
+
+Sibling runs of a batch (POST /api/runs/batch) often send the same
+Tavily queries: queries are built from the first words of the direction,
+so related directions collide. When a pipeline has bound its batch with
+bind_batch(), shared() computes each distinct request once for the whole
+batch: the first run to ask takes a Redis lock and stores the result,
+siblings asking meanwhile wait for it instead of sending the request
+again, and later ones read it. The same applies to LLM calls made with
+shared=True (pain analysis, whose prompt depends only on the direction
+and the search results; idea generation is never shared so that
+siblings with the same direction still get different ideas).
+
+Outside a batch shared() simply computes. Failures are not stored, so a
+waiting sibling computes itself once the lock is released.
+"""
+import asyncio
+import hashlib
+import json
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled
+from . import metrics
+
+# How often a sibling checks whether the shared result has arrived
+WAIT_POLL_SECONDS = 0.2
+
+_current_batch_id: ContextVar[Optional[str]] = ContextVar('batch_cache_batch_id', default=None)
+
+
+def bind_batch(batch_id: Optional[str]):
+    """Share work of the current context with the other runs of this batch"""
+    return _current_batch_id.set(batch_id)
+
+
+def unbind_batch(token):
+    _current_batch_id.reset(token)
+
+
+def _key(batch_id: str, kind: str, request: Any) -> str:
+    digest = hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:32]
+    return f"pain_to_idea:batch:{batch_id}:{kind}:{digest}"
+
+
+# Returned by _get_or_lock while a sibling holds the lock
+_LOCKED = object()
+
+
+def _get_or_lock(key: str, lock_key: str, lock_seconds: float):
+    """The cached result, None after taking the lock, or _LOCKED"""
+    cached = redis_conn.get(key)
+    if cached is not None:
+        return cached
+    if redis_conn.set(lock_key, 1, nx=True, ex=max(1, int(lock_seconds))):
+        return None
+    # The sibling may have finished between the two commands
+    return redis_conn.get(key) or _LOCKED
+
+
+async def shared(kind: str, request: Any, compute: Callable[[], Awaitable[Any]], lock_seconds: float) -> Any:
+    """
+    Result of compute(), computed once per batch for equal requests
+
+    Args:
+        kind: Kind of work ('tavily', 'llm'), part of the key and the metric
+        request: JSON-serialisable description of the request
+        compute: Coroutine function doing the work; its result must be JSON-serialisable
+        lock_seconds: Upper bound of compute's duration; siblings wait at most this long
+    """
+    batch_id = _current_batch_id.get()
+    if batch_id is None or redis_disabled():
+        return await compute()
+
+    key = _key(batch_id, kind, request)
+    lock_key = f"{key}:lock"
+    try:
+        cached = await asyncio.to_thread(_get_or_lock, key, lock_key, lock_seconds)
+        while cached is _LOCKED:
+            # A sibling is computing it; its lock expires if it died
+            await asyncio.sleep(WAIT_POLL_SECONDS)
+            cached = await asyncio.to_thread(_get_or_lock, key, lock_key, lock_seconds)
+    except Exception as e:
+        logger.warning(f"[BatchCache] Redis unavailable, not sharing {kind}: {e}")
+        return await compute()
+
+    metrics.cache_lookup(f"batch_{kind}", hit=cached is not None)
+    if cached is not None:
+        return json.loads(cached)
+
+    try:
+        result = await compute()
+        try:
+            await asyncio.to_thread(
+                redis_conn.set, key, json.dumps(result, ensure_ascii=False), ex=settings.batch_cache_ttl_seconds
+            )
+        except Exception as e:
+            logger.warning(f"[BatchCache] Failed to store shared {kind} result: {e}")
+        return result
+    finally:
+        try:
+            await asyncio.to_thread(redis_conn.delete, lock_key)
+        except Exception as e:
+            logger.warning(f"[BatchCache] Failed to release {lock_key}: {e}")
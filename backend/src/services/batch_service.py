@@ -0,0 +1,146 @@
+"""
+Batches of runs: many directions submitted in one request
+
+A batch is a parent row with one ordinary child run per direction. The
+children are scheduled like single runs but at most the batch's
+concurrency of them at a time (see scheduler.submit_batch), and they
+share identical Tavily searches and pain analyses (see batch_cache).
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from ..models import Run, RunBatch, AsyncSession
+from ..config import logger
+from .admission import admit
+from .run_service import TERMINAL_STATUSES, STAGE_PERCENT, new_run
+from . import scheduler
+
+
+async def create_batch_async(
+    db: AsyncSession,
+    directions: List[str],
+    client_key: str = 'anonymous',
+    priority: str = 'bulk',
+    concurrency: int = 1,
+    deadline_seconds: Optional[int] = None
+) -> RunBatch:
+    """
+    Create a batch with one run per direction and hand it to the scheduler
+
+    Args:
+        db: Database session
+        directions: Business directions, one child run each
+        client_key: API key or IP used for per-client fair scheduling
+        priority: Scheduling class of the children, see scheduler.PRIORITIES
+        concurrency: Children scheduled or running at once
+        deadline_seconds: Latency target of every child (RUN_DEADLINE_SECONDS if empty)
+
+    Raises:
+        AdmissionRejected: when the queue backlog is over the limit
+    """
+    # Only `concurrency` children enter the queues, so the batch is admitted once
+    await asyncio.to_thread(admit)
+
+    now = datetime.utcnow()
+    batch = RunBatch(
+        id=str(uuid.uuid4()),
+        created_at=now,
+        client_key=client_key,
+        priority=priority,
+        concurrency=concurrency,
+        runs_count=len(directions)
+    )
+    runs = [new_run(direction, deadline_seconds) for direction in directions]
+    for index, run in enumerate(runs):
+        run.batch_id = batch.id
+        # Listed in the order of the directions
+        run.created_at = now + timedelta(microseconds=index)
+
+    db.add(batch)
+    db.add_all(runs)
+    await db.commit()
+
+    try:
+        await asyncio.to_thread(_schedule_batch, batch.id, [run.id for run in runs], client_key, priority, concurrency)
+    except Exception as e:
+        logger.error(f"Failed to enqueue batch {batch.id}: {e}")
+        for run in runs:
+            if run.status == 'pending':
+                run.status = 'failed'
+                run.error_message = f"Ошибка постановки задачи: {str(e)}"
+        await db.commit()
+
+    return batch
+
+
+def _schedule_batch(batch_id: str, run_ids: List[str], client_key: str, priority: str, concurrency: int):
+    scheduler.submit_batch(batch_id, run_ids, client_key, priority, concurrency)
+    scheduler.dispatch()
+
+
+def _run_percent(run: Run) -> int:
+    if run.status in TERMINAL_STATUSES:
+        return 100
+    if run.status == 'pending':
+        return 0
+    return STAGE_PERCENT.get(run.current_stage, 5)
+
+
+def batch_summary(batch: RunBatch, runs: List[Run]) -> Dict[str, Any]:
+    """Aggregate progress of a batch from the current state of its runs"""
+    counts = {status: 0 for status in ('pending', 'running') + TERMINAL_STATUSES}
+    for run in runs:
+        counts[run.status] = counts.get(run.status, 0) + 1
+
+    finished = sum(counts[status] for status in TERMINAL_STATUSES)
+    if finished < len(runs):
+        status = 'running' if finished or counts['running'] else 'pending'
+    else:
+        status = 'completed' if counts['completed'] else 'failed'
+
+    return {
+        'batch_id': batch.id,
+        'status': status,
+        'created_at': batch.created_at.isoformat() if batch.created_at else None,
+        'priority': batch.priority,
+        'concurrency': batch.concurrency,
+        'runs_count': len(runs),
+        'counts': counts,
+        'progress_percent': round(sum(_run_percent(run) for run in runs) / len(runs)) if runs else 100,
+        'ideas_count': sum(run.ideas_count or 0 for run in runs),
+        'runs': [
+            {
+                'run_id': run.id,
+                'status': run.status,
+                'current_stage': run.current_stage,
+                'progress_percent': _run_percent(run),
+                'optional_direction': run.optional_direction,
+                'ideas_count': run.ideas_count or 0,
+                'error_message': run.error_message,
+            }
+            for run in runs
+        ],
+    }
+
+
+async def get_batch_async(db: AsyncSession, batch_id: str) -> Optional[RunBatch]:
+    return await db.get(RunBatch, batch_id)
+
+
+async def get_batch_runs_async(db: AsyncSession, batch_id: str) -> List[Run]:
+    result = await db.execute(
+        select(Run).where(Run.batch_id == batch_id).order_by(Run.created_at, Run.id)
+    )
+    return list(result.scalars().all())
+
+
+async def get_batch_summary_async(db: AsyncSession, batch_id: str) -> Optional[Dict[str, Any]]:
+    """Aggregate progress of a batch (None if it does not exist)"""
+    batch = await get_batch_async(db, batch_id)
+    if batch is None:
+        return None
+    return batch_summary(batch, await get_batch_runs_async(db, batch_id))
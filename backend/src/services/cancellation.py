@@ -0,0 +1,151 @@
+"""
+Run cancellation
+
+POST /api/runs/{id}/cancel sets a per-run flag in Redis. Runs that have
+not started yet are marked cancelled right away; running ones are
+watched by run_cancellable(), which wraps every pipeline job and polls
+the flag every CANCEL_POLL_SECONDS. On a hit the pipeline task is
+cancelled: in-flight Tavily/OpenRouter requests are aborted, the
+pipeline marks the run 'cancelled' and the worker slot is free again.
+
+With RUN_AUTO_CANCEL_UNWATCHED_SECONDS set, a run whose status page was
+open at some point but has not been watched for that long is cancelled
+the same way. The SSE streams record when a client last watched a run.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Optional
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled
+from . import progress_bus, run_events
+
+# How often a running pipeline checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.5
+
+# Flags and watch timestamps outlive any run
+KEY_TTL_SECONDS = 24 * 3600
+
+REASONS = {
+    'user': "Прогон отменён пользователем",
+    'unwatched': "Прогон отменён: страницу статуса закрыли",
+}
+
+
+class RunCancelled(Exception):
+    """Raised when a run stopped because it was cancelled"""
+
+
+def _cancel_key(run_id: str) -> str:
+    return f"pain_to_idea:run:{run_id}:cancel"
+
+
+def _watched_key(run_id: str) -> str:
+    return f"pain_to_idea:run:{run_id}:watched_at"
+
+
+def request_cancel(run_id: str, reason: str = 'user'):
+    """Ask the worker executing a run to stop it"""
+    redis_conn.set(_cancel_key(run_id), reason, ex=KEY_TTL_SECONDS)
+    logger.info(f"[Cancel] Cancellation of run {run_id} requested ({reason})")
+
+
+def cancel_reason(run_id: str) -> Optional[str]:
+    """Why the run was cancelled, or None if it was not"""
+    if redis_disabled():
+        return None
+    try:
+        reason = redis_conn.get(_cancel_key(run_id))
+    except Exception as e:
+        logger.warning(f"[Cancel] Could not read cancel flag of run {run_id}: {e}")
+        return None
+    return reason.decode() if reason else None
+
+
+def check_cancelled(run_id: str):
+    """
+    Stage-boundary check called by the pipeline
+
+    Raises:
+        RunCancelled: when the run was cancelled
+    """
+    if cancel_reason(run_id):
+        raise RunCancelled(run_id)
+
+
+def touch_watched(run_id: str):
+    """Record that a client is watching the run's progress"""
+    try:
+        redis_conn.set(_watched_key(run_id), time.time(), ex=KEY_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"[Cancel] Could not record watcher of run {run_id}: {e}")
+
+
+def _poll(run_id: str) -> Optional[str]:
+    """Cancel reason of a running run, requesting auto-cancel when it is unwatched"""
+    reason, watched_at = redis_conn.mget(_cancel_key(run_id), _watched_key(run_id))
+    if reason:
+        return reason.decode()
+
+    limit = settings.run_auto_cancel_unwatched_seconds
+    # Runs nobody ever watched (scripts, batches) are never auto-cancelled
+    if limit and watched_at and time.time() - float(watched_at) > limit:
+        request_cancel(run_id, 'unwatched')
+        return 'unwatched'
+
+    return None
+
+
+async def run_cancellable(run_id: str, work: Awaitable):
+    """
+    Execute a pipeline coroutine, cancelling it as soon as the run is cancelled
+
+    Raises:
+        RunCancelled: when the run was cancelled while it was executing
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_SECONDS)
+            if done:
+                return task.result()
+
+            try:
+                reason = await asyncio.to_thread(_poll, run_id)
+            except Exception as e:
+                logger.warning(f"[Cancel] Could not poll cancel flag of run {run_id}: {e}")
+                continue
+
+            if reason:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                if task.cancelled():
+                    raise RunCancelled(run_id)
+                # Finished before the cancellation reached it
+                return task.result()
+
+    except asyncio.CancelledError:
+        # Job timeout or worker shutdown: take the pipeline down with us
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+def set_cancelled(run, reason: str):
+    """Give a run its final 'cancelled' status (caller commits, then announces)"""
+    run.status = 'cancelled'
+    run.error_message = REASONS.get(reason, REASONS['user'])
+    run.completed_at = datetime.utcnow()
+
+
+def announce_cancelled(run, reason: str):
+    run_events.emit('run_cancelled', run.error_message, level='warning', run_id=run.id, reason=reason)
+    progress_bus.publish(run)
+
+
+def mark_cancelled(db, run, reason: str):
+    """Set a run's final 'cancelled' status and announce it (commits)"""
+    set_cancelled(run, reason)
+    db.commit()
+    announce_cancelled(run, reason)
@@ -0,0 +1,103 @@
+"""
+Per-run deadlines and graceful degradation
+
+Every run gets a latency target (RUN_DEADLINE_SECONDS, or deadline_seconds
+from the request) counted from the moment a worker starts it. Before
+each expensive step the pipeline asks how much time is left and scales
+the step down so that idea generation, which cannot be skipped, still
+fits:
+
+    search      fewer Tavily queries, each with a shorter timeout
+    analysis    fewer pain batches, or none (LLM-only prompt)
+    generation  LLM timeout capped at the time left
+
+Every degradation applied to a run (including the cost-budget ones from
+services.usage) is recorded in runs.degradations and in the event log.
+"""
+import json
+import math
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..config import settings, logger
+from . import run_events
+
+# Typical durations used to plan the remaining stages (seconds)
+EST_TAVILY_QUERY_SECONDS = 8
+EST_ANALYSIS_BATCH_SECONDS = 40
+EST_GENERATION_SECONDS = 90
+EST_PERSISTENCE_SECONDS = 5
+
+# Time kept back for generation and persistence while planning earlier stages
+GENERATION_RESERVE_SECONDS = EST_GENERATION_SECONDS + EST_PERSISTENCE_SECONDS
+
+# Never give an external call less than this, even past the deadline
+MIN_CALL_TIMEOUT_SECONDS = 10
+
+
+class RunDeadline:
+    """Deadline of one pipeline invocation and the degradations it caused"""
+
+    def __init__(self, run):
+        self.run = run
+        self.seconds = run.deadline_seconds or settings.run_deadline_seconds
+        self.degradations: List[Dict] = []
+
+    def remaining(self) -> float:
+        started_at = self.run.started_at or datetime.utcnow()
+        return self.seconds - (datetime.utcnow() - started_at).total_seconds()
+
+
+_current_deadline: ContextVar[Optional[RunDeadline]] = ContextVar('deadline_run', default=None)
+
+
+def start_deadline(run):
+    """Track the deadline of a run in the current context"""
+    return _current_deadline.set(RunDeadline(run))
+
+
+def finish_deadline(token):
+    _current_deadline.reset(token)
+
+
+def remaining_seconds() -> float:
+    """Seconds left until the run's deadline (infinite outside a run)"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else math.inf
+
+
+def allowed_steps(requested: int, step_seconds: float, reserve_seconds: float = GENERATION_RESERVE_SECONDS) -> int:
+    """How many steps of a stage fit before the reserve for later stages"""
+    budget = remaining_seconds() - reserve_seconds
+    if budget == math.inf:
+        return requested
+    return max(0, min(requested, math.floor(budget / step_seconds)))
+
+
+def call_timeout(default: float, reserve_seconds: float = 0) -> float:
+    """Timeout for one external call: the default, capped by the time left"""
+    budget = remaining_seconds() - reserve_seconds
+    return max(min(default, budget), MIN_CALL_TIMEOUT_SECONDS)
+
+
+def record_degradation(kind: str, message: str, **details):
+    """Remember a degradation applied to the current run and log it as an event"""
+    deadline = _current_deadline.get()
+    entry = {'kind': kind, 'message': message, **details}
+    if deadline is not None:
+        deadline.degradations.append(entry)
+
+    logger.warning(f"[Deadline] {message}")
+    run_events.emit('degraded', message, level='warning', degradation=kind, **details)
+
+
+def apply_to_run(run):
+    """Append the degradations not yet saved to runs.degradations (caller commits)"""
+    deadline = _current_deadline.get()
+    if deadline is None or deadline.run.id != run.id or not deadline.degradations:
+        return
+
+    saved = json.loads(run.degradations) if run.degradations else []
+    run.degradations = json.dumps(saved + deadline.degradations, ensure_ascii=False)
+    deadline.degradations = []
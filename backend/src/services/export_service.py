@@ -0,0 +1,196 @@
+"""
+Streaming export of ideas as Markdown, CSV or JSONL
+
+Ideas are read with one query joining runs and analogues, iterated in
+chunks of EXPORT_CHUNK_ROWS rows (a server-side cursor where the driver
+has one), rendered chunk by chunk and sent as they are produced, so the
+memory used does not depend on how many ideas are exported. Bulk exports
+can be gzip-compressed on the fly.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import Select, select
+
+from ..models import AsyncSessionLocal, Run, Idea, Analogue
+
+# Joined rows fetched per round trip (an idea has up to 3 analogue rows)
+EXPORT_CHUNK_ROWS = 1000
+
+MEDIA_TYPES = {
+    'markdown': 'text/markdown; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+EXTENSIONS = {'markdown': 'md', 'csv': 'csv', 'jsonl': 'jsonl'}
+
+CSV_COLUMNS = [
+    'run_id', 'direction', 'idea_id', 'title', 'segment', 'confidence_level', 'pain_description',
+    'brief_evidence', 'plan_7days', 'plan_30days', 'analogues', 'created_at'
+]
+
+_EXPORT_COLUMNS = (
+    Run.id.label('run_id'),
+    Run.selected_direction,
+    Idea.id,
+    Idea.title,
+    Idea.pain_description,
+    Idea.segment,
+    Idea.confidence_level,
+    Idea.brief_evidence,
+    Idea.plan_7days,
+    Idea.plan_30days,
+    Idea.created_at,
+    Analogue.name.label('analogue_name'),
+    Analogue.description.label('analogue_description'),
+    Analogue.url.label('analogue_url'),
+)
+
+
+def _export_query() -> Select:
+    return (
+        select(*_EXPORT_COLUMNS)
+        .select_from(Idea)
+        .join(Run, Run.id == Idea.run_id)
+        .outerjoin(Analogue, Analogue.idea_id == Idea.id)
+    )
+
+
+def run_export_query(run_id: str, idea_ids: Optional[List[int]] = None) -> Select:
+    """Ideas of one run (optionally only the given ones) in the order shown to the user"""
+    query = _export_query().where(Idea.run_id == run_id)
+    if idea_ids:
+        query = query.where(Idea.id.in_(idea_ids))
+    return query.order_by(Idea.order_index, Idea.id, Analogue.order_index)
+
+
+def bulk_export_query(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Select:
+    """
+    Ideas of all completed runs
+
+    Ordered by id, the primary key, so the database streams them instead
+    of sorting the whole table first; ideas of a run are saved together
+    and so stay together.
+    """
+    query = _export_query().where(Run.status == 'completed')
+    if since is not None:
+        query = query.where(Idea.created_at >= since)
+    if until is not None:
+        query = query.where(Idea.created_at < until)
+    return query.order_by(Idea.id, Analogue.order_index)
+
+
+async def _idea_chunks(query: Select) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Ideas with their analogues, a chunk of joined rows at a time"""
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        idea = None
+        async for rows in result.partitions():
+            ideas = []
+            for row in rows:
+                if idea is None or idea['id'] != row.id:
+                    if idea is not None:
+                        ideas.append(idea)
+                    idea = {
+                        'run_id': row.run_id,
+                        'direction': row.selected_direction,
+                        'id': row.id,
+                        'title': row.title,
+                        'pain_description': row.pain_description,
+                        'segment': row.segment,
+                        'confidence_level': row.confidence_level,
+                        'brief_evidence': row.brief_evidence,
+                        'plan_7days': row.plan_7days,
+                        'plan_30days': row.plan_30days,
+                        'created_at': row.created_at.isoformat(),
+                        'analogues': [],
+                    }
+                if row.analogue_name is not None:
+                    idea['analogues'].append({
+                        'name': row.analogue_name,
+                        'description': row.analogue_description,
+                        'url': row.analogue_url,
+                    })
+            # The last idea may continue in the next chunk
+            if ideas:
+                yield ideas
+        if idea is not None:
+            yield [idea]
+
+
+async def _render_markdown(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    run_id, number = None, 0
+    async for ideas in chunks:
+        parts = []
+        for idea in ideas:
+            if idea['run_id'] != run_id:
+                run_id, number = idea['run_id'], 0
+                parts.append(f"# Идеи: {idea['direction'] or 'без направления'}\n\nПрогон: `{run_id}`\n\n")
+            number += 1
+            parts.append(
+                f"## {number}. {idea['title']}\n\n"
+                f"**Сегмент:** {idea['segment']}  \n"
+                f"**Уверенность:** {idea['confidence_level']}\n\n"
+                f"### Боль\n\n{idea['pain_description']}\n\n"
+                f"### Обоснование\n\n{idea['brief_evidence']}\n\n"
+            )
+            if idea['analogues']:
+                parts.append("### Аналоги\n\n")
+                parts.extend(
+                    f"- [{analogue['name']}]({analogue['url']}) — {analogue['description']}\n"
+                    for analogue in idea['analogues']
+                )
+                parts.append("\n")
+            parts.append(
+                f"### План на 7 дней\n\n{idea['plan_7days']}\n\n"
+                f"### План на 30 дней\n\n{idea['plan_30days']}\n\n"
+            )
+        yield ''.join(parts)
+
+
+async def _render_csv(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so that Excel opens the Cyrillic text as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    async for ideas in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [
+                idea['run_id'], idea['direction'], idea['id'], idea['title'], idea['segment'],
+                idea['confidence_level'], idea['pain_description'], idea['brief_evidence'],
+                idea['plan_7days'], idea['plan_30days'],
+                '; '.join(analogue['name'] for analogue in idea['analogues']), idea['created_at']
+            ]
+            for idea in ideas
+        )
+        yield buffer.getvalue()
+
+
+async def _render_jsonl(chunks: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for ideas in chunks:
+        yield ''.join(json.dumps(idea, ensure_ascii=False) + '\n' for idea in ideas)
+
+
+RENDERERS = {'markdown': _render_markdown, 'csv': _render_csv, 'jsonl': _render_jsonl}
+
+
+async def export_stream(export_format: str, query: Select, gzip: bool = False) -> AsyncIterator[bytes]:
+    """Encoded (and optionally gzip-compressed) export of the ideas of query"""
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    async for text in RENDERERS[export_format](_idea_chunks(query)):
+        data = text.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
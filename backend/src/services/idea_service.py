@@ -1,8 +1,52 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+from typing import Any, Dict, Optional
 
-from ..models import Idea
+from ..models import Idea, AsyncSession
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+
+def _idea_detail_query(idea_id: int):
+    # Analogues come in the same query (LEFT OUTER JOIN), not a lazy load per access
+    return select(Idea).where(Idea.id == idea_id).options(joinedload(Idea.analogues))
 
 
 def get_idea_detail(db: Session, idea_id: int) -> Idea:
     """Get full idea details with analogues and evidence"""
-    return db.query(Idea).filter(Idea.id == idea_id).first()
+    return db.execute(_idea_detail_query(idea_id)).unique().scalar_one_or_none()
+
+
+async def get_idea_detail_async(db: AsyncSession, idea_id: int) -> Optional[Idea]:
+    """Get full idea details; analogues are loaded up front (no lazy loads in async)"""
+    result = await db.execute(_idea_detail_query(idea_id))
+    return result.unique().scalar_one_or_none()
+
+
+def _idea_summary(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'run_id': row.run_id,
+        'title': row.title,
+        'segment': row.segment,
+        'confidence_level': row.confidence_level,
+        'created_at': row.created_at.isoformat()
+    }
+
+
+async def list_ideas_async(
+    db: AsyncSession,
+    confidence: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Page of generated ideas across runs, newest first
+
+    Raises:
+        InvalidCursor: when the cursor cannot be decoded
+    """
+    query = select(Idea.id, Idea.run_id, Idea.title, Idea.segment, Idea.confidence_level, Idea.created_at)
+    if confidence:
+        query = query.where(Idea.confidence_level == confidence)
+
+    return await keyset_page(db, query, Idea.created_at, Idea.id, _idea_summary, cursor, limit)
@@ -0,0 +1,302 @@
+"""
+In-process Prometheus metrics
+
+A deliberately small registry (counters, gauges, histograms with labels)
+rendered in the Prometheus text format, so neither the API nor the
+workers need an extra dependency or an external service:
+
+    curl http://localhost:8000/metrics          # API process
+    curl http://localhost:9100/metrics          # worker (WORKER_METRICS_PORT)
+
+Updates take one lock and a dict lookup; values that are expensive or
+live elsewhere (queue depth, SSE connections) are read by collector
+callbacks only when the endpoint is scraped.
+"""
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..config import logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers fast API routes up to multi-minute LLM stages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: [bucket counts..., sum, count]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            cumulative = 0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {_format_value(cumulative)}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(state[-2])}"
+            yield f"{self.name}_count{labels} {_format_value(state[-1])}"
+
+
+class Registry:
+    """Metrics of this process plus collectors refreshed on every scrape"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Callback that updates gauges right before the registry is rendered"""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"[Metrics] Collector {collector.__name__} failed: {e}")
+
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# API
+HTTP_REQUEST_DURATION = histogram(
+    'pain_to_idea_http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status'))
+SSE_CONNECTIONS = gauge(
+    'pain_to_idea_sse_connections', 'Open Server-Sent Events streams', ('stream',))
+QUEUE_DEPTH = gauge(
+    'pain_to_idea_queue_depth', 'Jobs waiting in an RQ queue or runs held by the scheduler', ('queue',))
+QUEUE_OLDEST_JOB_AGE = gauge(
+    'pain_to_idea_queue_oldest_job_age_seconds', 'Age of the oldest job waiting in an RQ queue', ('queue',))
+
+# Pipeline
+STAGE_DURATION = histogram(
+    'pain_to_idea_stage_duration_seconds', 'Pipeline stage duration', ('stage', 'status'))
+LLM_REQUEST_DURATION = histogram(
+    'pain_to_idea_llm_request_duration_seconds', 'OpenRouter request latency', ('model',))
+LLM_ERRORS = counter(
+    'pain_to_idea_llm_errors_total', 'Failed OpenRouter requests', ('model',))
+LLM_TOKENS = counter(
+    'pain_to_idea_llm_tokens_total', 'Tokens used by OpenRouter requests', ('model', 'type'))
+LLM_COST = counter(
+    'pain_to_idea_llm_cost_usd_total', 'Estimated cost of OpenRouter requests in USD', ('model',))
+TAVILY_REQUEST_DURATION = histogram(
+    'pain_to_idea_tavily_request_duration_seconds', 'Tavily search request latency')
+TAVILY_ERRORS = counter(
+    'pain_to_idea_tavily_errors_total', 'Failed Tavily search requests')
+CACHE_REQUESTS = counter(
+    'pain_to_idea_cache_requests_total', 'Cache lookups by result (hit or miss)', ('cache', 'result'))
+
+# Workers
+WORKER_JOBS = counter(
+    'pain_to_idea_worker_jobs_total', 'Jobs executed by this worker by outcome', ('queue', 'outcome'))
+WORKER_JOBS_IN_FLIGHT = gauge(
+    'pain_to_idea_worker_jobs_in_flight', 'Jobs currently executed by this worker')
+WORKER_SLOTS = gauge(
+    'pain_to_idea_worker_slots', 'Concurrent job slots of this worker')
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_span(span):
+    """Feed a finished tracing span into the matching latency metrics"""
+    seconds = span.duration_ms / 1000
+    if span.category == 'stage':
+        STAGE_DURATION.observe(seconds, stage=span.name, status=span.status)
+    elif span.name == 'llm_call':
+        model = str(span.attributes.get('model', ''))
+        LLM_REQUEST_DURATION.observe(seconds, model=model)
+        if span.status != 'ok':
+            LLM_ERRORS.inc(model=model)
+    elif span.name == 'tavily_query':
+        TAVILY_REQUEST_DURATION.observe(seconds)
+        if span.status != 'ok':
+            TAVILY_ERRORS.inc()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int, attempts: int = 1) -> Optional[int]:
+    """
+    Expose /metrics of this process on a background thread
+
+    Tries `attempts` consecutive ports so several workers on one host can
+    each get their own.
+
+    Returns:
+        The bound port, or None when disabled or no port was free
+    """
+    if not port:
+        return None
+
+    for candidate in range(port, port + attempts):
+        try:
+            server = ThreadingHTTPServer(('0.0.0.0', candidate), _MetricsHandler)
+        except OSError:
+            continue
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True).start()
+        logger.info(f"[Metrics] Serving worker metrics on :{candidate}/metrics")
+        return candidate
+
+    logger.warning(f"[Metrics] No free port in {port}-{port + attempts - 1}, worker metrics disabled")
+    return None
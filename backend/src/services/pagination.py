@@ -0,0 +1,88 @@
+"""
+Keyset (cursor) pagination on (created_at, id)
+
+A page is the next `limit` rows after the last row of the previous page
+in (created_at DESC, id DESC) order. The cursor encodes that row's key,
+so every page is an index range scan of the same cost, unlike OFFSET
+which reads and discards all earlier rows.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.sql import Select
+
+from ..models import AsyncSession
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by this module"""
+
+
+def encode_key(*values: Any) -> str:
+    """Opaque cursor for a sort key of JSON values"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_key(cursor: str, length: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise InvalidCursor(str(e)) from e
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor("unexpected cursor shape")
+    return values
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    return encode_key(created_at.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    created_at, row_id = decode_key(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+async def keyset_page(
+    db: AsyncSession,
+    query: Select,
+    created_at_column,
+    id_column,
+    to_dict: Callable[[Any], Dict[str, Any]],
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Run one page of `query` (a filtered select of plain columns)
+
+    Returns:
+        {"items": [...], "next_cursor": cursor of the next page or None}
+
+    Raises:
+        InvalidCursor: when the cursor cannot be decoded
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(created_at_column, id_column) < tuple_(created_at, row_id))
+
+    # One extra row tells whether there is a next page
+    rows: List = (await db.execute(
+        query.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last[created_at_column], last[id_column])
+
+    return {"items": [to_dict(row) for row in rows], "next_cursor": next_cursor}
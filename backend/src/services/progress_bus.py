@@ -0,0 +1,158 @@
+"""
+Redis pub/sub progress bus
+
+Workers publish a snapshot of the run after every state change to
+pain_to_idea:progress:<run_id>. Each API process holds a single pattern
+subscription and fans the messages out to the SSE connections of that
+process, so open progress streams no longer poll the database: it is
+read once when the stream is opened.
+"""
+import asyncio
+import json
+from typing import Dict, List, Optional, Set
+
+from ..config import logger
+from .redis_client import redis_conn, get_async_redis, redis_disabled, write_behind
+
+CHANNEL_PREFIX = "pain_to_idea:progress:"
+
+# Updates buffered per SSE connection before the oldest is dropped
+SUBSCRIBER_QUEUE_SIZE = 32
+
+# Back-off before re-subscribing after the Redis connection was lost
+RECONNECT_DELAY_SECONDS = 1
+
+# Put into subscriber queues when updates may have been lost; the stream
+# re-reads the run from the database once
+RESYNC = None
+
+
+def channel(run_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{run_id}"
+
+
+def publish(run):
+    """
+    Publish the current state of a run (called by the pipeline after commit)
+
+    Best effort: a Redis failure never fails the run, the stream simply
+    picks the state up on its next resync.
+    """
+    if redis_disabled():
+        return
+    write_behind(_publish, run.id, json.dumps(run.to_dict()))
+
+
+def _publish(run_id: str, snapshot: str):
+    try:
+        redis_conn.publish(channel(run_id), snapshot)
+    except Exception as e:
+        logger.warning(f"[ProgressBus] Failed to publish update for run {run_id}: {e}")
+
+
+class ProgressBus:
+    """
+    Per-process fan-out of run updates from one Redis subscription
+
+    Args:
+        channel_prefix: Channels <prefix><run_id> this bus listens to
+    """
+
+    def __init__(self, channel_prefix: str = CHANNEL_PREFIX):
+        self.channel_prefix = channel_prefix
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def subscribe(self, run_id: str) -> asyncio.Queue:
+        """Register an SSE connection for updates of one run"""
+        self.start()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(run_id, set()).add(queue)
+        return queue
+
+    def subscribe_many(self, run_ids: List[str]) -> asyncio.Queue:
+        """Register one SSE connection for updates of several runs (a batch)"""
+        self.start()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE * max(1, len(run_ids)))
+        for run_id in run_ids:
+            self._subscribers.setdefault(run_id, set()).add(queue)
+        return queue
+
+    def unsubscribe_many(self, run_ids: List[str], queue: asyncio.Queue):
+        for run_id in run_ids:
+            self.unsubscribe(run_id, queue)
+
+    def unsubscribe(self, run_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(run_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[run_id]
+
+    @property
+    def connections(self) -> int:
+        """Number of SSE connections currently attached"""
+        return len(set().union(*self._subscribers.values()))
+
+    def start(self):
+        """Start the listener task (idempotent)"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def _deliver(self, run_id: str, data):
+        for queue in self._subscribers.get(run_id, ()):
+            if queue.full():
+                # Slow consumer: keep the newest state, drop the oldest
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    def _resync_all(self):
+        for run_id in list(self._subscribers):
+            self._deliver(run_id, RESYNC)
+
+    async def _listen(self):
+        first_connect = True
+        while True:
+            pubsub = get_async_redis().pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.channel_prefix}*")
+                logger.info(f"[ProgressBus] Subscribed to {self.channel_prefix}*")
+                if not first_connect:
+                    # Updates published while we were disconnected are lost
+                    self._resync_all()
+                first_connect = False
+
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    run_id = message['channel'].decode()[len(self.channel_prefix):]
+                    try:
+                        data = json.loads(message['data'])
+                    except ValueError:
+                        continue
+                    self._deliver(run_id, data)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[ProgressBus] Subscription lost: {e}, reconnecting")
+                first_connect = False
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+progress_bus = ProgressBus()
@@ -0,0 +1,202 @@
+"""
+Buffered purchase ingestion
+
+With PURCHASE_INGEST_MODE=buffered a click on "buy" costs the API no
+database round trip:
+
+    1. the idea is validated against an in-process cache of known ideas
+       (one SELECT per idea and process, not per click)
+    2. the event, with its idempotency key, is appended to a Redis list
+       (one round trip)
+
+A PurchaseFlusher in every API process takes up to PURCHASE_FLUSH_BATCH
+events at a time under a Redis lock, writes them with one multi-row
+INSERT (plus the rollup upserts) in one transaction, and only then
+removes them from the list. A crash loses at most what Redis itself has
+not persisted. Retried clicks and a batch replayed after a crash between
+commit and trim are dropped by the unique idempotency key of purchases.
+"""
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..config import settings, logger
+from ..models import AsyncSessionLocal, Idea
+from .redis_client import get_async_redis
+from .purchase_service import insert_purchases_async
+
+BUFFER_KEY = "pain_to_idea:purchases:buffer"
+FLUSH_LOCK_KEY = "pain_to_idea:purchases:flush_lock"
+
+# Ideas remembered per process; unknown ids are re-checked after a short while
+IDEA_CACHE_SIZE = 100_000
+MISSING_IDEA_CACHE_SECONDS = 5
+
+# Back-off after a failed flush (events stay in the buffer)
+FLUSH_RETRY_SECONDS = 1
+
+
+class IdeaCache:
+    """
+    Existence set of ideas with their run, filled on demand
+
+    Ideas are never deleted while the API runs, so a known id stays valid;
+    unknown ids are cached briefly so a burst of bad ids costs one query.
+    """
+
+    def __init__(self, size: int = IDEA_CACHE_SIZE):
+        self.size = size
+        self._runs: OrderedDict = OrderedDict()
+        self._missing: Dict[int, float] = {}
+
+    async def run_of(self, idea_id: int) -> Tuple[bool, Optional[str]]:
+        """
+        Returns:
+            (whether the idea exists, its run id)
+
+        A session is only opened on a miss: opening and closing one costs
+        more than the rest of a buffered click.
+        """
+        if idea_id in self._runs:
+            self._runs.move_to_end(idea_id)
+            return True, self._runs[idea_id]
+
+        missing_until = self._missing.get(idea_id)
+        if missing_until and missing_until > time.monotonic():
+            return False, None
+
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(select(Idea.id, Idea.run_id).where(Idea.id == idea_id))).first()
+        if row is None:
+            self._missing[idea_id] = time.monotonic() + MISSING_IDEA_CACHE_SECONDS
+            return False, None
+
+        self._missing.pop(idea_id, None)
+        self._runs[idea_id] = row.run_id
+        if len(self._runs) > self.size:
+            self._runs.popitem(last=False)
+        return True, row.run_id
+
+
+idea_cache = IdeaCache()
+
+
+def new_idempotency_key() -> str:
+    return uuid.uuid4().hex
+
+
+async def buffer_purchase(event: Dict[str, Any]):
+    """Queue a purchase for the flusher (duplicates are dropped when flushed)"""
+    await get_async_redis().rpush(BUFFER_KEY, json.dumps(event))
+
+
+def _decode(raw: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        event = json.loads(raw)
+        event['created_at'] = datetime.fromisoformat(event['created_at'])
+        event['idempotency_key'] = str(event['idempotency_key'])
+        return event
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"[Purchases] Dropping malformed buffered purchase: {e}")
+        return None
+
+
+async def flush_once(batch_size: Optional[int] = None) -> int:
+    """
+    Write one batch of buffered purchases to the database
+
+    Returns:
+        Number of events taken from the buffer (0 if empty or another
+        process is flushing)
+    """
+    batch_size = batch_size or settings.purchase_flush_batch
+    redis = get_async_redis()
+
+    token = uuid.uuid4().hex
+    if not await redis.set(FLUSH_LOCK_KEY, token, nx=True, px=30_000):
+        return 0
+
+    try:
+        raw_events: List[bytes] = await redis.lrange(BUFFER_KEY, 0, batch_size - 1)
+        if not raw_events:
+            return 0
+
+        # Keyed by idempotency key: a retry within the batch is stored once
+        rows = list({
+            event['idempotency_key']: event for event in map(_decode, raw_events) if event
+        }.values())
+        async with AsyncSessionLocal() as db:
+            inserted = await insert_purchases_async(db, rows)
+            await db.commit()
+
+        # Only now are the events safe to drop; RPUSH only appends, so the
+        # head of the list is still this batch
+        await redis.ltrim(BUFFER_KEY, len(raw_events), -1)
+
+        skipped = len(raw_events) - len(inserted)
+        logger.info(
+            f"[Purchases] Flushed {len(inserted)} purchases"
+            + (f" ({skipped} duplicate or malformed skipped)" if skipped else "")
+        )
+        return len(raw_events)
+
+    finally:
+        if (await redis.get(FLUSH_LOCK_KEY)) == token.encode():
+            await redis.delete(FLUSH_LOCK_KEY)
+
+
+async def buffered_count() -> int:
+    return await get_async_redis().llen(BUFFER_KEY)
+
+
+class PurchaseFlusher:
+    """Background task of an API process that drains the purchase buffer"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the flusher task (idempotent)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        # Hand what this process accepted to the database before exiting
+        try:
+            while await flush_once():
+                pass
+        except Exception as e:
+            logger.warning(f"[Purchases] Final flush failed, events stay buffered: {e}")
+
+    async def _run(self):
+        interval = settings.purchase_flush_interval_ms / 1000
+        while True:
+            try:
+                flushed = await flush_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[Purchases] Flush failed, retrying: {e}")
+                await asyncio.sleep(FLUSH_RETRY_SECONDS)
+                continue
+
+            # A full batch means a backlog: keep draining without waiting
+            if flushed < settings.purchase_flush_batch:
+                await asyncio.sleep(interval)
+
+
+purchase_flusher = PurchaseFlusher()
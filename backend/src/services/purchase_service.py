@@ -0,0 +1,267 @@
+"""
+Purchase analytics
+
+GET /api/admin/purchases reads rollups instead of scanning the purchases
+table: an all-time counter per idea and per-hour buckets per idea (with
+the idea's run). Both are upserted in the same transaction as the
+purchases they count, so they never drift from the raw events, and a
+request costs O(result size) however many clicks have accumulated.
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models import Purchase, Idea, IdeaPurchaseTotal, PurchaseBucket, AsyncSession
+
+RECENT_PURCHASES_LIMIT = 50
+TOP_IDEAS_LIMIT = 10
+
+# INSERT .. ON CONFLICT DO UPDATE per supported database
+UPSERT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+# idea_id, run_id, created_at of a recorded purchase
+PurchaseEvent = Tuple[int, Optional[str], datetime]
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_statements(dialect: str, events: Iterable[PurchaseEvent]) -> list:
+    """
+    Upserts that add a batch of purchases to the rollups
+
+    Events are pre-aggregated, so a batch costs two statements however
+    many clicks it holds.
+    """
+    upsert = UPSERT_INSERTS[dialect]
+    totals: Dict[int, Dict[str, Any]] = {}
+    buckets: Counter = Counter()
+
+    for idea_id, run_id, created_at in events:
+        total = totals.setdefault(idea_id, {
+            'idea_id': idea_id, 'run_id': run_id, 'purchase_count': 0, 'last_purchase_at': created_at
+        })
+        total['purchase_count'] += 1
+        total['last_purchase_at'] = max(total['last_purchase_at'], created_at)
+        buckets[(hour_bucket(created_at), idea_id, run_id)] += 1
+
+    if not totals:
+        return []
+
+    insert_totals = upsert(IdeaPurchaseTotal).values(list(totals.values()))
+    excluded = insert_totals.excluded
+    insert_totals = insert_totals.on_conflict_do_update(
+        index_elements=[IdeaPurchaseTotal.idea_id],
+        set_={
+            'purchase_count': IdeaPurchaseTotal.purchase_count + excluded.purchase_count,
+            'last_purchase_at': case(
+                (excluded.last_purchase_at > IdeaPurchaseTotal.last_purchase_at, excluded.last_purchase_at),
+                else_=func.coalesce(IdeaPurchaseTotal.last_purchase_at, excluded.last_purchase_at)
+            ),
+        }
+    )
+
+    insert_buckets = upsert(PurchaseBucket).values([
+        {'bucket_start': bucket_start, 'idea_id': idea_id, 'run_id': run_id, 'purchase_count': count}
+        for (bucket_start, idea_id, run_id), count in buckets.items()
+    ])
+    insert_buckets = insert_buckets.on_conflict_do_update(
+        index_elements=[PurchaseBucket.bucket_start, PurchaseBucket.idea_id],
+        set_={'purchase_count': PurchaseBucket.purchase_count + insert_buckets.excluded.purchase_count}
+    )
+
+    return [insert_totals, insert_buckets]
+
+
+def record_rollups(db: Session, events: Iterable[PurchaseEvent]):
+    """Add purchases to the rollups in the caller's transaction"""
+    for statement in rollup_statements(db.get_bind().dialect.name, events):
+        db.execute(statement)
+
+
+async def record_rollups_async(db: AsyncSession, events: Iterable[PurchaseEvent]):
+    """Async counterpart of record_rollups"""
+    for statement in rollup_statements(db.get_bind().dialect.name, events):
+        await db.execute(statement)
+
+
+async def insert_purchases_async(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Store purchases with one multi-row INSERT and count them in the rollups
+
+    Rows whose idempotency_key is already stored are skipped, so retried
+    clicks and replayed batches are not counted twice. Caller commits.
+
+    Returns:
+        Ids of the purchases actually inserted
+    """
+    if not rows:
+        return []
+
+    upsert = UPSERT_INSERTS[db.get_bind().dialect.name]
+    result = await db.execute(
+        upsert(Purchase).values(rows).on_conflict_do_nothing(
+            index_elements=[Purchase.idempotency_key]
+        ).returning(Purchase.id, Purchase.idea_id, Purchase.run_id, Purchase.created_at)
+    )
+    inserted = result.all()
+    await record_rollups_async(db, [(idea_id, run_id, created_at) for _, idea_id, run_id, created_at in inserted])
+    return [purchase_id for purchase_id, *_ in inserted]
+
+
+async def get_recent_purchases_async(
+    db: AsyncSession,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    run_id: Optional[str] = None,
+    limit: int = RECENT_PURCHASES_LIMIT
+) -> List[Dict[str, Any]]:
+    """
+    Latest purchases with their idea titles
+
+    One SELECT with an outer join returning plain rows, walking the
+    created_at index backwards for at most `limit` rows.
+    """
+    query = select(
+        Purchase.id,
+        Purchase.idea_id,
+        Idea.title,
+        Purchase.run_id,
+        Purchase.created_at,
+        Purchase.user_ip
+    ).outerjoin(Idea, Purchase.idea_id == Idea.id)
+
+    if since:
+        query = query.where(Purchase.created_at >= since)
+    if until:
+        query = query.where(Purchase.created_at < until)
+    if run_id:
+        query = query.where(Purchase.run_id == run_id)
+
+    rows = await db.execute(query.order_by(Purchase.created_at.desc()).limit(limit))
+    return [
+        {
+            'id': purchase_id,
+            'idea_id': idea_id,
+            'idea_title': title,
+            'run_id': run_id,
+            'created_at': created_at.isoformat() if created_at else None,
+            'user_ip': user_ip
+        }
+        for purchase_id, idea_id, title, run_id, created_at, user_ip in rows
+    ]
+
+
+def _bucket_filters(since: Optional[datetime], until: Optional[datetime], run_id: Optional[str]) -> list:
+    # Buckets are whole hours: a window starting mid-hour includes that hour
+    filters = []
+    if since:
+        filters.append(PurchaseBucket.bucket_start >= hour_bucket(since))
+    if until:
+        filters.append(PurchaseBucket.bucket_start < until)
+    if run_id:
+        filters.append(PurchaseBucket.run_id == run_id)
+    return filters
+
+
+async def get_top_ideas_async(
+    db: AsyncSession,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    run_id: Optional[str] = None,
+    limit: int = TOP_IDEAS_LIMIT
+) -> List[Dict[str, Any]]:
+    """Ideas with the most purchases, all time or within the window"""
+    if since or until:
+        count = func.sum(PurchaseBucket.purchase_count).label('purchase_count')
+        ranked = select(PurchaseBucket.idea_id, count).where(
+            *_bucket_filters(since, until, run_id)
+        ).group_by(PurchaseBucket.idea_id).order_by(count.desc()).limit(limit).subquery()
+    else:
+        query = select(IdeaPurchaseTotal.idea_id, IdeaPurchaseTotal.purchase_count)
+        if run_id:
+            query = query.where(IdeaPurchaseTotal.run_id == run_id)
+        ranked = query.order_by(IdeaPurchaseTotal.purchase_count.desc()).limit(limit).subquery()
+
+    rows = await db.execute(
+        select(ranked.c.idea_id, Idea.title, ranked.c.purchase_count).outerjoin(
+            Idea, Idea.id == ranked.c.idea_id
+        ).order_by(ranked.c.purchase_count.desc())
+    )
+    return [
+        {
+            "idea_id": idea_id,
+            "title": title,
+            "purchase_count": count
+        }
+        for idea_id, title, count in rows
+    ]
+
+
+async def get_purchase_series_async(
+    db: AsyncSession,
+    since: datetime,
+    until: Optional[datetime] = None,
+    run_id: Optional[str] = None,
+    granularity: str = 'hour'
+) -> List[Dict[str, Any]]:
+    """Purchases per hour or per day within the window (empty periods omitted)"""
+    rows = await db.execute(
+        select(PurchaseBucket.bucket_start, func.sum(PurchaseBucket.purchase_count)).where(
+            *_bucket_filters(since, until, run_id)
+        ).group_by(PurchaseBucket.bucket_start).order_by(PurchaseBucket.bucket_start)
+    )
+
+    series: Dict[datetime, int] = {}
+    for bucket_start, count in rows:
+        if granularity == 'day':
+            bucket_start = bucket_start.replace(hour=0)
+        series[bucket_start] = series.get(bucket_start, 0) + count
+
+    return [{'start': start.isoformat(), 'purchase_count': count} for start, count in series.items()]
+
+
+async def get_total_purchases_async(
+    db: AsyncSession,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    run_id: Optional[str] = None
+) -> int:
+    if since or until:
+        query = select(func.sum(PurchaseBucket.purchase_count)).where(*_bucket_filters(since, until, run_id))
+    else:
+        query = select(func.sum(IdeaPurchaseTotal.purchase_count))
+        if run_id:
+            query = query.where(IdeaPurchaseTotal.run_id == run_id)
+    return await db.scalar(query) or 0
+
+
+async def get_purchases_stats_async(
+    db: AsyncSession,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    run_id: Optional[str] = None,
+    granularity: str = 'hour'
+) -> Dict[str, Any]:
+    """
+    Admin statistics, optionally limited to a time window and a run
+
+    Totals, top ideas and the series come from the rollups; only the
+    recent purchases list reads raw events, bounded by its limit.
+    """
+    stats = {
+        "total_purchases": await get_total_purchases_async(db, since, until, run_id),
+        "recent_purchases": await get_recent_purchases_async(db, since, until, run_id),
+        "top_ideas": await get_top_ideas_async(db, since, until, run_id)
+    }
+    if since:
+        stats["series"] = await get_purchase_series_async(db, since, until, run_id, granularity)
+    return stats
@@ -0,0 +1,70 @@
+"""
+Shared Redis connection used by services and workers
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from redis import Redis
+
+from ..config import settings
+
+# Connection pool is created lazily on first command
+redis_conn = Redis.from_url(settings.redis_url, decode_responses=False)
+
+_async_redis_conn = None
+
+# Headless processes (python -m src.workers.headless) run without Redis:
+# the pipeline's scheduling, progress, event and cancellation hooks skip
+# their Redis side effects
+_redis_disabled = False
+
+
+def disable_redis():
+    """Run this process without Redis (call before starting any pipeline)"""
+    global _redis_disabled
+    _redis_disabled = True
+
+
+def redis_disabled() -> bool:
+    return _redis_disabled
+
+
+# Best-effort writes (events, progress, counters) issued by pipeline
+# coroutines go through one thread: the event loop never waits on Redis
+# and the writes still reach it in the order they were made
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='redis-writer')
+
+
+def write_behind(func, *args, **kwargs):
+    """
+    Perform a Redis write without blocking the running event loop
+
+    On an event loop the write is queued and the call returns at once;
+    elsewhere (sync workers, asyncio.to_thread) it waits for the write,
+    which still goes through the queue so earlier queued writes land
+    first. func must handle its own errors.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _writer.submit(func, *args, **kwargs).result()
+        return
+    _writer.submit(func, *args, **kwargs)
+
+
+def get_async_redis():
+    """
+    Shared asyncio Redis client for the API process
+
+    Created lazily so it binds to the running event loop. The pool blocks
+    when all connections are busy: the default one raises instead, which
+    sent buffered clicks of a burst to the direct INSERT fallback.
+    """
+    global _async_redis_conn
+    if _async_redis_conn is None:
+        from redis.asyncio import BlockingConnectionPool, Redis as AsyncRedis
+        pool = BlockingConnectionPool.from_url(
+            settings.redis_url, max_connections=settings.redis_max_connections
+        )
+        _async_redis_conn = AsyncRedis(connection_pool=pool)
+    return _async_redis_conn
@@ -0,0 +1,113 @@
+"""
+Response cache for the read paths of completed runs
+
+Once a run is completed, GET /api/runs/{id}/ideas and GET /api/ideas/{id}
+return the same JSON on every page load. Each API process keeps those
+bodies, already serialised, in an LRU bounded by RESPONSE_CACHE_MAX_MB,
+serves them with a strong ETag and answers If-None-Match revalidations
+with 304 without touching the database.
+
+Nothing changes an idea once its run completed, so browsers get
+Cache-Control: immutable with RESPONSE_CACHE_MAX_AGE_SECONDS. In the
+process an entry lives RESPONSE_CACHE_TTL_SECONDS, which only bounds how
+long a copy could outlive a manual fix in the database.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from fastapi import Request, Response
+
+from ..config import settings
+from . import metrics
+
+
+def run_ideas_key(run_id: str) -> str:
+    return f"run_ideas:{run_id}"
+
+
+def idea_key(idea_id: int) -> str:
+    return f"idea:{idea_id}"
+
+
+def serialize(content: Any) -> bytes:
+    """Same bytes FastAPI's JSONResponse would send"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def etag_of(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class ResponseCache:
+    """LRU of (body, etag) bounded by the total size of the bodies, entries expire after ttl_seconds"""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] <= time.monotonic():
+            self.discard(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        metrics.cache_lookup(key.split(':', 1)[0], hit=entry is not None)
+        return entry[:2] if entry is not None else None
+
+    def put(self, key: str, content: Any) -> Tuple[bytes, str]:
+        body = serialize(content)
+        entry = (body, etag_of(body))
+        if len(body) > self.max_bytes:
+            return entry
+
+        self.discard(key)
+        self._entries[key] = entry + (time.monotonic() + self.ttl_seconds,)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (evicted, _, _) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+        return entry
+
+    def discard(self, *keys: str):
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= len(entry[0])
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache(settings.response_cache_max_mb * 1024 * 1024, settings.response_cache_ttl_seconds)
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    candidates = (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+    return etag in candidates
+
+
+def cached_response(request: Request, entry: Tuple[bytes, str]) -> Response:
+    """200 with the cached body, or 304 if the client already holds it"""
+    body, etag = entry
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={settings.response_cache_max_age_seconds}, immutable",
+    }
+    if _matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
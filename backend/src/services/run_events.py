@@ -0,0 +1,105 @@
+"""
+Structured per-run event log
+
+The pipeline, Tavily scraper, pain analyzer and LLM client append events
+(stage start/end, search queries, analysis batches, token usage, errors)
+to a bounded Redis Stream per run, pain_to_idea:run:<run_id>:events.
+GET /api/runs/{run_id}/logs tails that stream and resumes from the
+Last-Event-ID header after a reconnect.
+
+Code that runs inside a pipeline does not pass the run id around: the
+pipeline binds it once with bind_run() and emit() picks it up from a
+context variable, which asyncio copies into every task it starts.
+"""
+import json
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled, write_behind
+from .progress_bus import ProgressBus
+
+# Wake-up notifications for /logs streams (payload: id of the new entry)
+EVENTS_CHANNEL_PREFIX = "pain_to_idea:events:"
+
+# Kinds that end a run; /logs closes the stream after sending one
+FINAL_KINDS = ('run_completed', 'run_failed', 'run_cancelled')
+
+_current_run_id: ContextVar[Optional[str]] = ContextVar('run_events_run_id', default=None)
+
+
+def stream_key(run_id: str) -> str:
+    return f"pain_to_idea:run:{run_id}:events"
+
+
+def bind_run(run_id: str):
+    """Attribute events emitted from the current context to this run"""
+    return _current_run_id.set(run_id)
+
+
+def unbind_run(token):
+    _current_run_id.reset(token)
+
+
+def current_run_id() -> Optional[str]:
+    return _current_run_id.get()
+
+
+def emit(kind: str, message: str, level: str = 'info', run_id: Optional[str] = None, **fields: Any):
+    """
+    Append an event to the run's stream
+
+    Args:
+        kind: Machine-readable event kind (stage_start, search_query, ...)
+        message: Human-readable line shown on the status page
+        level: info, success, warning or error
+        run_id: Run the event belongs to (defaults to the bound run)
+        **fields: Extra JSON-serialisable details
+
+    Best effort and a no-op outside a run: logging must never fail the
+    pipeline.
+    """
+    run_id = run_id or _current_run_id.get()
+    if not run_id or redis_disabled():
+        return
+
+    event = {'timestamp': time.time(), 'kind': kind, 'message': message, 'type': level, **fields}
+    write_behind(_append, run_id, kind, json.dumps(event, ensure_ascii=False, default=str))
+
+
+def _append(run_id: str, kind: str, data: str):
+    key = stream_key(run_id)
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.xadd(key, {'data': data}, maxlen=settings.run_events_max_length, approximate=True)
+        pipe.expire(key, settings.run_events_ttl_seconds)
+        entry_id = pipe.execute()[0]
+        redis_conn.publish(f"{EVENTS_CHANNEL_PREFIX}{run_id}", json.dumps(entry_id.decode()))
+    except Exception as e:
+        logger.warning(f"[RunEvents] Failed to record {kind} event for run {run_id}: {e}")
+
+
+def read_events(run_id: str, after: Optional[str] = None, count: int = 100) -> List[Tuple[str, Dict]]:
+    """
+    Events of a run newer than the entry id `after` (all retained events if None)
+
+    Returns:
+        List of (entry id, event) pairs in stream order
+    """
+    entries = redis_conn.xrange(stream_key(run_id), min=after or '-', max='+', count=count + 1)
+
+    events = []
+    for entry_id, fields in entries:
+        entry_id = entry_id.decode()
+        if entry_id == after:
+            continue
+        try:
+            events.append((entry_id, json.loads(fields[b'data'])))
+        except (KeyError, ValueError):
+            continue
+    return events[:count]
+
+
+# Wakes up /logs streams of this API process when new events arrive
+event_bus = ProgressBus(EVENTS_CHANNEL_PREFIX)
@@ -1,52 +1,212 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from redis import Redis
-from rq import Queue
+from typing import Any, Dict, List, Optional
+import asyncio
 import uuid
 
-from ..models import Run, Idea
-from ..config import settings, logger
+from ..models import Run, Idea, AsyncSession
+from ..config import logger
+from .admission import admit
+from . import scheduler, cancellation
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
 
-# Initialize Redis connection and queue
-redis_conn = Redis.from_url(settings.redis_url, decode_responses=False)
-queue = Queue(connection=redis_conn, default_timeout=settings.generation_timeout_seconds)
+# Statuses a run never leaves
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
 
+# Progress shown on the status page when a pipeline stage starts
+STAGE_PERCENT = {
+    'Поиск реальных болей пользователей': 20,
+    'Анализ найденных болей': 45,
+    'Генерация бизнес-идей': 70,
+    'Сохранение результатов': 90,
+}
 
-def create_run(db: Session, optional_direction: str = None) -> Run:
-    """Create a new run and enqueue generation job"""
-    # Create run record
-    run = Run(
+
+def new_run(optional_direction: Optional[str], deadline_seconds: Optional[int]) -> Run:
+    """Unsaved pending run (single runs and batch children alike)"""
+    return Run(
         id=str(uuid.uuid4()),
         optional_direction=optional_direction,
-        status='pending'
+        status='pending',
+        deadline_seconds=deadline_seconds
     )
 
-    db.add(run)
-    db.commit()
-    db.refresh(run)
 
-    # Enqueue generation job
+def _schedule(run: Run, client_key: str, priority: str) -> bool:
+    """Hand a saved run to the scheduler; marks it failed (uncommitted) on error"""
     try:
-        from ..workers.generation_pipeline import generate_ideas
-        job = queue.enqueue(
-            generate_ideas,
-            run.id,
-            job_timeout=settings.generation_timeout_seconds
-        )
-        logger.info(f"Enqueued generation job {job.id} for run {run.id}")
+        scheduler.submit(run.id, client_key, priority)
+        scheduler.dispatch()
+        return True
     except Exception as e:
         logger.error(f"Failed to enqueue job for run {run.id}: {e}")
         run.status = 'failed'
         run.error_message = f"Ошибка постановки задачи: {str(e)}"
+        return False
+
+
+def create_run(
+    db: Session,
+    optional_direction: str = None,
+    client_key: str = 'anonymous',
+    priority: str = 'default',
+    deadline_seconds: Optional[int] = None
+) -> Run:
+    """
+    Create a new run and hand it to the fair scheduler
+
+    Args:
+        db: Database session
+        optional_direction: Business direction (random if empty)
+        client_key: API key or IP used for per-client fair scheduling
+        priority: Scheduling class, see scheduler.PRIORITIES
+        deadline_seconds: Latency target of the run (RUN_DEADLINE_SECONDS if empty)
+
+    Raises:
+        AdmissionRejected: when the queue backlog is over the limit
+    """
+    admit()
+
+    # Create run record
+    run = new_run(optional_direction, deadline_seconds)
+
+    db.add(run)
+    db.commit()
+    db.refresh(run)
+
+    # Schedule generation job
+    if not _schedule(run, client_key, priority):
         db.commit()
 
     return run
 
 
+async def create_run_async(
+    db: AsyncSession,
+    optional_direction: str = None,
+    client_key: str = 'anonymous',
+    priority: str = 'default',
+    deadline_seconds: Optional[int] = None
+) -> Run:
+    """Async counterpart of create_run for the API"""
+    # The scheduler and admission control use the sync Redis client
+    await asyncio.to_thread(admit)
+
+    run = new_run(optional_direction, deadline_seconds)
+
+    db.add(run)
+    await db.commit()
+    await db.refresh(run)
+
+    if not await asyncio.to_thread(_schedule, run, client_key, priority):
+        await db.commit()
+
+    return run
+
+
+def _unschedule(run_id: str):
+    """Take a waiting run out of the scheduler or the RQ queue"""
+    if not scheduler.remove_pending(run_id):
+        scheduler.cancel_dispatched(run_id)
+
+
+def cancel_run(db: Session, run_id: str, reason: str = 'user') -> Optional[Run]:
+    """
+    Cancel a run that has not finished yet
+
+    Waiting runs are taken out of the queue and marked cancelled here;
+    a running one is stopped by its worker, which marks it cancelled
+    within CANCEL_POLL_SECONDS.
+
+    Returns:
+        The run (unchanged if it had already finished), or None if not found
+    """
+    run = get_run_status(db, run_id)
+    if not run or run.status in TERMINAL_STATUSES:
+        return run
+
+    # Set first so a worker that picks the run up meanwhile stops it itself
+    cancellation.request_cancel(run.id, reason)
+
+    if run.status == 'pending':
+        _unschedule(run.id)
+        cancellation.mark_cancelled(db, run, reason)
+        scheduler.run_finished(run.id)
+
+    logger.info(f"Cancelled run {run.id} ({run.status})")
+    return run
+
+
+async def cancel_run_async(db: AsyncSession, run_id: str, reason: str = 'user') -> Optional[Run]:
+    """Async counterpart of cancel_run for the API"""
+    run = await get_run_status_async(db, run_id)
+    if not run or run.status in TERMINAL_STATUSES:
+        return run
+
+    await asyncio.to_thread(cancellation.request_cancel, run.id, reason)
+
+    if run.status == 'pending':
+        await asyncio.to_thread(_unschedule, run.id)
+        cancellation.set_cancelled(run, reason)
+        await db.commit()
+        cancellation.announce_cancelled(run, reason)
+        await asyncio.to_thread(scheduler.run_finished, run.id)
+
+    logger.info(f"Cancelled run {run.id} ({run.status})")
+    return run
+
+
 def get_run_status(db: Session, run_id: str) -> Run:
     """Get run by ID"""
     return db.query(Run).filter(Run.id == run_id).first()
 
 
+async def get_run_status_async(db: AsyncSession, run_id: str) -> Optional[Run]:
+    """Get run by ID"""
+    return await db.get(Run, run_id)
+
+
 def get_run_ideas(db: Session, run_id: str):
     """Get all ideas for a run"""
     return db.query(Idea).filter(Idea.run_id == run_id).order_by(Idea.order_index).all()
+
+
+async def get_run_ideas_async(db: AsyncSession, run_id: str) -> List[Idea]:
+    """Get all ideas for a run"""
+    result = await db.execute(select(Idea).where(Idea.run_id == run_id).order_by(Idea.order_index))
+    return list(result.scalars())
+
+
+def _run_summary(row) -> Dict[str, Any]:
+    return {
+        'run_id': row.id,
+        'status': row.status,
+        'selected_direction': row.selected_direction,
+        'ideas_count': row.ideas_count,
+        'created_at': row.created_at.isoformat(),
+        'completed_at': row.completed_at.isoformat() if row.completed_at else None
+    }
+
+
+async def list_runs_async(
+    db: AsyncSession,
+    status: Optional[str] = None,
+    direction: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Page of past runs, newest first
+
+    Raises:
+        InvalidCursor: when the cursor cannot be decoded
+    """
+    query = select(
+        Run.id, Run.status, Run.selected_direction, Run.ideas_count, Run.created_at, Run.completed_at
+    )
+    if status:
+        query = query.where(Run.status == status)
+    if direction:
+        query = query.where(Run.selected_direction == direction)
+
+    return await keyset_page(db, query, Run.created_at, Run.id, _run_summary, cursor, limit)
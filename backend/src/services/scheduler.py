@@ -0,0 +1,432 @@
+"""
+Priority classes and per-client fair scheduling of runs
+
+New runs are not pushed straight into the RQ queue. They wait in one
+Redis sorted set per priority class and are dispatched into RQ only
+while the RQ queue holds fewer than SCHEDULER_DISPATCH_WINDOW jobs, so
+ordering decisions are made as late as possible.
+
+Within a class runs are ordered by start-time fair queuing: every client
+(API key or IP) gets a virtual clock that advances by 1/weight per
+submitted run, so a client that scripts 50 runs only gets every n-th
+slot instead of the next 50. Classes are served in strict order
+(interactive, default, bulk), and an interactive run that cannot start
+because every worker slot is busy asks the most recently started bulk
+run to yield at its next stage boundary.
+
+Runs of a batch (POST /api/runs/batch) are not all submitted at once:
+at most the batch's concurrency of them are in the scheduler or running,
+the others wait in a Redis list of the batch and each finished child
+submits the next one.
+"""
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from rq import Queue
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled
+from . import progress_bus, run_events
+
+PRIORITIES = ['interactive', 'default', 'bulk']
+
+KEY_PREFIX = "pain_to_idea:sched:"
+
+# Per-run scheduling metadata and per-client tags expire after a day
+META_TTL_SECONDS = 24 * 3600
+
+
+class RunPreempted(Exception):
+    """Raised inside the pipeline when a bulk run must yield its slot"""
+
+
+def _pending_key(priority: str) -> str:
+    return f"{KEY_PREFIX}{priority}:pending"
+
+
+def _vtime_key(priority: str) -> str:
+    return f"{KEY_PREFIX}{priority}:vtime"
+
+
+def _tags_key(priority: str) -> str:
+    return f"{KEY_PREFIX}{priority}:client_tags"
+
+
+def _meta_key(run_id: str) -> str:
+    return f"{KEY_PREFIX}run:{run_id}"
+
+
+def _preempt_key(run_id: str) -> str:
+    return f"{KEY_PREFIX}preempt:{run_id}"
+
+
+RUNNING_BULK_KEY = f"{KEY_PREFIX}running:bulk"
+
+# Held runs of every class scored by submit time, for the age of the backlog
+SUBMITTED_AT_KEY = f"{KEY_PREFIX}submitted_at"
+
+
+def _batch_waiting_key(batch_id: str) -> str:
+    return f"{KEY_PREFIX}batch:{batch_id}:waiting"
+
+
+def _batch_active_key(batch_id: str) -> str:
+    return f"{KEY_PREFIX}batch:{batch_id}:active"
+
+
+def _batch_child_key(run_id: str) -> str:
+    return f"{KEY_PREFIX}batch_child:{run_id}"
+
+
+def client_weight(client_key: str) -> float:
+    """Scheduling weight of a client (SCHEDULER_CLIENT_WEIGHTS, default 1)"""
+    for entry in settings.scheduler_client_weights.split(','):
+        name, _, weight = entry.strip().partition('=')
+        if name and name == client_key:
+            return max(float(weight), 0.01)
+    return 1.0
+
+
+def waiting_queue() -> Queue:
+    """RQ queue that holds dispatched runs which have not started yet"""
+    if settings.pipeline_mode == 'staged':
+        from ..workers.stage_jobs import STAGE_QUEUES
+        return Queue(STAGE_QUEUES['search'], connection=redis_conn)
+    return Queue('default', connection=redis_conn, default_timeout=settings.generation_timeout_seconds)
+
+
+def waiting_job_id(run_id: str) -> str:
+    """Id of the first RQ job of the run's latest dispatch"""
+    job_id = redis_conn.hget(_meta_key(run_id), 'job_id')
+    return job_id.decode() if job_id else run_id
+
+
+def submit(run_id: str, client_key: str, priority: str = 'default', resume: bool = False):
+    """
+    Put a run into its priority class with a fair-queuing tag
+
+    Args:
+        run_id: Run to schedule
+        client_key: API key or IP the run is accounted to
+        priority: One of PRIORITIES
+        resume: Re-submit a pre-empted run ahead of its class
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+
+    pending_key = _pending_key(priority)
+    vtime_key = _vtime_key(priority)
+    tags_key = _tags_key(priority)
+
+    def _submit(pipe):
+        vtime = float(pipe.get(vtime_key) or 0)
+        if resume:
+            tag = vtime
+        else:
+            last_tag = float(pipe.hget(tags_key, client_key) or 0)
+            tag = max(vtime, last_tag) + 1.0 / client_weight(client_key)
+
+        pipe.multi()
+        if not resume:
+            pipe.hset(tags_key, client_key, tag)
+            pipe.expire(tags_key, META_TTL_SECONDS)
+        pipe.zadd(pending_key, {run_id: tag})
+        pipe.zadd(SUBMITTED_AT_KEY, {run_id: time.time()})
+        pipe.hset(_meta_key(run_id), mapping={'priority': priority, 'client': client_key})
+        pipe.expire(_meta_key(run_id), META_TTL_SECONDS)
+
+    redis_conn.transaction(_submit, vtime_key, tags_key)
+    logger.info(f"[Scheduler] Run {run_id} submitted as {priority} for client {client_key}")
+
+
+def submit_batch(batch_id: str, run_ids: List[str], client_key: str, priority: str, concurrency: int):
+    """
+    Schedule the runs of a batch, at most `concurrency` of them at a time
+
+    Args:
+        batch_id: Batch the runs belong to
+        run_ids: Child runs in the order they should start
+        client_key: API key or IP the runs are accounted to
+        priority: One of PRIORITIES
+        concurrency: Children submitted to the scheduler or running at once
+    """
+    meta = json.dumps({'batch': batch_id, 'client': client_key, 'priority': priority})
+    waiting = run_ids[concurrency:]
+
+    pipe = redis_conn.pipeline()
+    for run_id in run_ids:
+        pipe.set(_batch_child_key(run_id), meta, ex=META_TTL_SECONDS)
+    if waiting:
+        pipe.rpush(_batch_waiting_key(batch_id), *waiting)
+        pipe.expire(_batch_waiting_key(batch_id), META_TTL_SECONDS)
+    pipe.execute()
+
+    for run_id in run_ids[:concurrency]:
+        _submit_batch_child(batch_id, run_id, client_key, priority)
+
+
+def _submit_batch_child(batch_id: str, run_id: str, client_key: str, priority: str):
+    active_key = _batch_active_key(batch_id)
+    redis_conn.sadd(active_key, run_id)
+    redis_conn.expire(active_key, META_TTL_SECONDS)
+    submit(run_id, client_key, priority)
+
+
+def _start_next_of_batch(run_id: str):
+    """Hand the slot of a finished batch child to the next waiting one"""
+    meta = redis_conn.getdel(_batch_child_key(run_id))
+    if not meta:
+        return
+    meta = json.loads(meta)
+
+    if not redis_conn.srem(_batch_active_key(meta['batch']), run_id):
+        # Cancelled while waiting in the batch: it held no slot
+        redis_conn.lrem(_batch_waiting_key(meta['batch']), 0, run_id)
+        return
+
+    next_run_id = redis_conn.lpop(_batch_waiting_key(meta['batch']))
+    if next_run_id:
+        _submit_batch_child(meta['batch'], next_run_id.decode(), meta['client'], meta['priority'])
+
+
+def _pop_next() -> Optional[str]:
+    """Take the run with the smallest tag from the highest non-empty class"""
+    for priority in PRIORITIES:
+        pending_key = _pending_key(priority)
+        vtime_key = _vtime_key(priority)
+
+        def _pop(pipe):
+            head = pipe.zrange(pending_key, 0, 0, withscores=True)
+            if not head:
+                return None
+            run_id, tag = head[0]
+            vtime = float(pipe.get(vtime_key) or 0)
+            pipe.multi()
+            pipe.zrem(pending_key, run_id)
+            pipe.zrem(SUBMITTED_AT_KEY, run_id)
+            pipe.set(vtime_key, max(vtime, tag))
+            return run_id.decode()
+
+        run_id = redis_conn.transaction(_pop, pending_key, vtime_key, value_from_callable=True)
+        if run_id:
+            return run_id
+
+    return None
+
+
+def _enqueue(run_id: str):
+    """
+    Hand a run over to the RQ workers
+
+    A pre-empted run is dispatched again under fresh job ids, so the
+    bookkeeping of its previous job cannot clobber the new one.
+    """
+    attempt = redis_conn.hincrby(_meta_key(run_id), 'attempts', 1)
+
+    if settings.pipeline_mode == 'staged':
+        from ..workers.stage_jobs import enqueue_staged_run
+        job = enqueue_staged_run(run_id, attempt)
+    else:
+        from ..workers.generation_pipeline import generate_ideas
+        job = waiting_queue().enqueue(
+            generate_ideas,
+            run_id,
+            job_id=run_id if attempt == 1 else f"{run_id}_{attempt}",
+            job_timeout=settings.generation_timeout_seconds
+        )
+
+    redis_conn.hset(_meta_key(run_id), 'job_id', job.id)
+    logger.info(f"[Scheduler] Dispatched run {run_id} as job {job.id}")
+
+
+def _fail_undispatchable(run_id: str, error: Exception):
+    from ..models import SessionLocal, Run
+
+    db = SessionLocal()
+    try:
+        run = db.query(Run).filter(Run.id == run_id).first()
+        if run and run.status == 'pending':
+            run.status = 'failed'
+            run.error_message = f"Ошибка постановки задачи: {str(error)}"
+            db.commit()
+            run_events.emit('run_failed', f"ERROR: {run.error_message}", level='error', run_id=run.id)
+            progress_bus.publish(run)
+    finally:
+        db.close()
+
+    try:
+        _start_next_of_batch(run_id)
+    except Exception as e:
+        logger.warning(f"[Scheduler] Failed to start the next batch run after {run_id}: {e}")
+
+
+def dispatch() -> int:
+    """
+    Move runs from the fair queues into RQ while the dispatch window has room
+
+    Called on submit and whenever a run starts or finishes.
+
+    Returns:
+        Number of runs dispatched
+    """
+    dispatched = 0
+    queue = waiting_queue()
+
+    while queue.count < settings.scheduler_dispatch_window:
+        run_id = _pop_next()
+        if run_id is None:
+            break
+
+        try:
+            _enqueue(run_id)
+            dispatched += 1
+        except Exception as e:
+            logger.error(f"[Scheduler] Failed to enqueue run {run_id}: {e}")
+            _fail_undispatchable(run_id, e)
+
+    _maybe_preempt()
+    return dispatched
+
+
+def pending_count() -> int:
+    """Runs held by the scheduler that are not yet in RQ"""
+    pipe = redis_conn.pipeline()
+    for priority in PRIORITIES:
+        pipe.zcard(_pending_key(priority))
+    return sum(pipe.execute())
+
+
+def oldest_pending_age() -> float:
+    """Seconds the longest-held run has been waiting in the scheduler (0 if none)"""
+    oldest = redis_conn.zrange(SUBMITTED_AT_KEY, 0, 0, withscores=True)
+    if not oldest:
+        return 0.0
+    return max(time.time() - oldest[0][1], 0.0)
+
+
+def pending_position(run_id: str) -> Optional[int]:
+    """0-based position of a held run across all classes (None if not held)"""
+    ahead = 0
+    for priority in PRIORITIES:
+        pending_key = _pending_key(priority)
+        rank = redis_conn.zrank(pending_key, run_id)
+        if rank is not None:
+            return ahead + rank
+        ahead += redis_conn.zcard(pending_key)
+    return None
+
+
+def remove_pending(run_id: str) -> bool:
+    """Drop a run that has not been dispatched yet"""
+    pipe = redis_conn.pipeline()
+    for priority in PRIORITIES:
+        pipe.zrem(_pending_key(priority), run_id)
+    pipe.zrem(SUBMITTED_AT_KEY, run_id)
+    return any(pipe.execute()[:len(PRIORITIES)])
+
+
+def cancel_dispatched(run_id: str) -> bool:
+    """Take a dispatched run's job out of RQ before a worker picks it up"""
+    try:
+        Job.fetch(waiting_job_id(run_id), connection=redis_conn).cancel()
+    except NoSuchJobError:
+        return False
+    return True
+
+
+def run_priority(run_id: str) -> Dict[str, str]:
+    """Priority and client a run was submitted with"""
+    meta = redis_conn.hgetall(_meta_key(run_id))
+    return {k.decode(): v.decode() for k, v in meta.items()}
+
+
+# Pipeline hooks
+
+def run_started(run_id: str):
+    """Track running bulk runs (pre-emption candidates) and refill the window"""
+    if redis_disabled():
+        return
+    try:
+        if run_priority(run_id).get('priority') == 'bulk':
+            redis_conn.zadd(RUNNING_BULK_KEY, {run_id: datetime.utcnow().timestamp()})
+        dispatch()
+    except Exception as e:
+        logger.warning(f"[Scheduler] run_started hook failed for {run_id}: {e}")
+
+
+def run_finished(run_id: str):
+    """Free the run's slot, start the next run of its batch and refill the window"""
+    if redis_disabled():
+        return
+    try:
+        _start_next_of_batch(run_id)
+    except Exception as e:
+        logger.warning(f"[Scheduler] Failed to start the next batch run after {run_id}: {e}")
+    _free_slot(run_id)
+
+
+def _free_slot(run_id: str):
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.zrem(RUNNING_BULK_KEY, run_id)
+        pipe.delete(_preempt_key(run_id))
+        pipe.execute()
+        dispatch()
+    except Exception as e:
+        logger.warning(f"[Scheduler] run_finished hook failed for {run_id}: {e}")
+
+
+def _maybe_preempt():
+    """
+    Ask the newest running bulk run to yield if interactive runs cannot start
+
+    Called after dispatch: an interactive run still held by the scheduler
+    means the dispatch window is full, and a bulk run is only pre-empted
+    when, on top of that, every worker slot is busy.
+    """
+    if not redis_conn.zcard(_pending_key('interactive')):
+        return
+
+    from .admission import worker_capacity, _running_runs
+    if _running_runs() < worker_capacity():
+        return
+
+    newest: List = redis_conn.zrevrange(RUNNING_BULK_KEY, 0, 0)
+    if not newest:
+        return
+
+    run_id = newest[0].decode()
+    redis_conn.zrem(RUNNING_BULK_KEY, run_id)
+    redis_conn.set(_preempt_key(run_id), 1, ex=settings.generation_timeout_seconds)
+    logger.info(f"[Scheduler] Requested pre-emption of bulk run {run_id}")
+
+
+def check_preempted(run_id: str):
+    """
+    Stage-boundary check called by the pipeline
+
+    Raises:
+        RunPreempted: when an interactive run asked this run to yield
+    """
+    if redis_disabled():
+        return
+    try:
+        requested = redis_conn.delete(_preempt_key(run_id))
+    except Exception as e:
+        logger.warning(f"[Scheduler] Pre-emption check failed for {run_id}: {e}")
+        return
+
+    if requested:
+        raise RunPreempted(run_id)
+
+
+def requeue_preempted(run_id: str):
+    """Put a pre-empted run back at the front of its class"""
+    meta = run_priority(run_id)
+    submit(run_id, meta.get('client', 'unknown'), meta.get('priority', 'bulk'), resume=True)
+    # Still holds its slot in the batch
+    _free_slot(run_id)
@@ -0,0 +1,233 @@
+"""
+Full-text search over ideas of all runs
+
+Backed by the index of migration 0006: FTS5 with bm25 on SQLite, a
+weighted tsvector with ts_rank_cd on PostgreSQL. Results are ordered by
+relevance and paged by a cursor over (score, id); the highlighted title
+and the pain snippet are HTML-escaped with matches wrapped in <mark>.
+
+On SQLite the FTS table only yields ids and ranks; the highlights are
+built here for the rows of the page, matching words the way the query
+does (case and diacritics folded, words ending with * as prefixes).
+
+Ranking costs time per matching idea, so only the newest
+SEARCH_MAX_CANDIDATES matches of a query are ranked: narrow queries get
+exact results, broad ones (a word in most ideas) stay within a few
+milliseconds on millions of ideas and favour recent ideas.
+"""
+import html
+import re
+import unicodedata
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, select, text
+
+from ..config import settings
+from ..models import AsyncSession, Idea
+from .pagination import DEFAULT_PAGE_SIZE, InvalidCursor, decode_key, encode_key
+
+# Match markers put in by PostgreSQL, replaced after escaping
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD = re.compile(r"\w+")
+
+# A word of the query; with a trailing * it also matches longer words
+QUERY_WORD = re.compile(r"(\w+)(\*?)")
+
+SNIPPET_WORDS = 24
+
+# Only ids and ranks: the FTS table is queried once, and FTS5's highlight()
+# would re-run prefix queries for every row of the page
+SQLITE_PAGE = text("""
+    SELECT rowid AS id, rank FROM ideas_fts
+    WHERE ideas_fts MATCH :query
+      AND rowid >= coalesce((
+          SELECT min(rowid) FROM (
+              SELECT rowid FROM ideas_fts WHERE ideas_fts MATCH :query
+              ORDER BY rowid DESC LIMIT :candidates
+          )
+      ), 0)
+      AND (:after_rank IS NULL OR rank > :after_rank OR (rank = :after_rank AND rowid > :after_id))
+    ORDER BY rank, rowid
+    LIMIT :limit
+""")
+
+# Headlines are built only for the rows of the page
+POSTGRES_SEARCH = text("""
+    WITH query AS (SELECT websearch_to_tsquery('russian', :query) AS q),
+    candidates AS (
+        SELECT ideas.id, ideas.search_vector
+        FROM ideas, query
+        WHERE ideas.search_vector @@ query.q
+        ORDER BY ideas.id DESC
+        LIMIT :candidates
+    ),
+    page AS (
+        SELECT candidates.id, ts_rank_cd(candidates.search_vector, query.q) AS score
+        FROM candidates, query
+    )
+    SELECT ideas.id, ideas.run_id, ideas.segment, ideas.confidence_level, ideas.created_at,
+           -page.score AS rank,
+           ts_headline('russian', ideas.title, query.q, :title_options) AS title,
+           ts_headline('russian', ideas.pain_description, query.q, :snippet_options) AS snippet
+    FROM (
+        SELECT * FROM page
+        WHERE CAST(:after_rank AS double precision) IS NULL OR -page.score > :after_rank
+           OR (-page.score = :after_rank AND page.id > :after_id)
+        ORDER BY page.score DESC, page.id
+        LIMIT :limit
+    ) AS page
+    JOIN ideas ON ideas.id = page.id, query
+    ORDER BY page.score DESC, page.id
+""").columns(created_at=DateTime)
+
+POSTGRES_OPTIONS = {
+    'title_options': f"StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true",
+    'snippet_options': (
+        f"StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_WORDS}, MinWords=8, "
+        f"FragmentDelimiter=…, MaxFragments=1"
+    ),
+}
+
+
+def sqlite_match_query(q: str) -> Optional[str]:
+    """
+    FTS5 query matching ideas with all words of the user's text
+
+    Words are quoted, so FTS5 operators typed by the user are plain text.
+    Only words ending with * are prefix queries: FTS5 has to read the whole
+    index entry of every word with the prefix, which for common prefixes
+    costs several times more than a whole word.
+    """
+    words = QUERY_WORD.findall(q)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"{prefix}' for word, prefix in words)
+
+
+def _highlighted(value: str) -> str:
+    return html.escape(value or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+@lru_cache(maxsize=65536)
+def _fold(word: str) -> str:
+    """Case and diacritics folding of the unicode61 tokenizer"""
+    decomposed = unicodedata.normalize('NFD', word.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _marked(value: str, q: str, snippet: bool = False) -> str:
+    """
+    value with the words matching the FTS5 query of q between markers
+
+    With snippet=True only SNIPPET_WORDS words around the first match are
+    kept, like FTS5's snippet().
+    """
+    words = [(_fold(word), bool(prefix)) for word, prefix in QUERY_WORD.findall(q)]
+    tokens = list(WORD.finditer(value))
+
+    first, last = 0, len(tokens)
+    if snippet and len(tokens) > SNIPPET_WORDS:
+        matched = next((i for i, token in enumerate(tokens) if _matches(token.group(), words)), 0)
+        first = max(0, min(matched - SNIPPET_WORDS // 4, len(tokens) - SNIPPET_WORDS))
+        last = first + SNIPPET_WORDS
+
+    parts = ['…'] if first else []
+    position = tokens[first].start() if first else 0
+    for token in tokens[first:last]:
+        if _matches(token.group(), words):
+            parts += [value[position:token.start()], MARK_START, token.group(), MARK_END]
+            position = token.end()
+    if last < len(tokens):
+        parts += [value[position:tokens[last - 1].end()], '…']
+    else:
+        parts.append(value[position:])
+    return ''.join(parts)
+
+
+def _matches(token: str, words: List[Tuple[str, bool]]) -> bool:
+    """Whether a word of the text matches one of the (folded) query words"""
+    token = _fold(token)
+    return any(token == word or (prefix and token.startswith(word)) for word, prefix in words)
+
+
+async def _sqlite_search(db: AsyncSession, q: str, params: Dict[str, Any]) -> List:
+    match = sqlite_match_query(q)
+    if match is None:
+        return []
+    page = (await db.execute(SQLITE_PAGE, {**params, 'query': match})).all()
+    if not page:
+        return []
+    ideas = {
+        row.id: row
+        for row in await db.execute(
+            select(
+                Idea.id, Idea.run_id, Idea.title, Idea.pain_description, Idea.segment,
+                Idea.confidence_level, Idea.created_at
+            ).where(Idea.id.in_([row.id for row in page]))
+        )
+    }
+    return [
+        SimpleNamespace(**{
+            **ideas[row.id]._asdict(),
+            'rank': row.rank,
+            'title': _marked(ideas[row.id].title, q),
+            'snippet': _marked(ideas[row.id].pain_description, q, snippet=True),
+        })
+        for row in page
+        if row.id in ideas
+    ]
+
+
+def _result(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'run_id': row.run_id,
+        'title': _highlighted(row.title),
+        'snippet': _highlighted(row.snippet),
+        'segment': row.segment,
+        'confidence_level': row.confidence_level,
+        'created_at': row.created_at.isoformat(),
+        'score': -row.rank,
+    }
+
+
+async def search_ideas_async(
+    db: AsyncSession,
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE
+) -> Dict[str, Any]:
+    """
+    Ideas matching q, most relevant first
+
+    Returns:
+        {"items": [...], "next_cursor": cursor of the next page or None}
+
+    Raises:
+        InvalidCursor: when the cursor cannot be decoded
+    """
+    after_rank, after_id = decode_key(cursor, 2) if cursor else (None, None)
+    if after_rank is not None and not isinstance(after_rank, (int, float)):
+        raise InvalidCursor("unexpected cursor value")
+
+    dialect = db.get_bind().dialect.name
+    params = {
+        'after_rank': after_rank, 'after_id': after_id, 'limit': limit + 1,
+        'candidates': settings.search_max_candidates,
+    }
+    if dialect == 'sqlite':
+        rows = await _sqlite_search(db, q, params)
+    elif dialect == 'postgresql':
+        rows = (await db.execute(POSTGRES_SEARCH, {**params, **POSTGRES_OPTIONS, 'query': q})).all()
+    else:
+        raise ValueError(f"Full-text search does not support '{dialect}'")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_key(rows[-1].rank, rows[-1].id)
+
+    return {"items": [_result(row) for row in rows], "next_cursor": next_cursor}
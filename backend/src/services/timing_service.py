@@ -0,0 +1,76 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from ..models import Run, RunSpan
+
+PERCENTILES = (50, 95, 99)
+
+
+def get_run_timings(db: Session, run: Run) -> Dict:
+    """
+    Waterfall of a run: every span with its offset from the run start
+
+    Nested spans (a Tavily query inside the search stage) carry the depth
+    of their parent chain so the client can indent them.
+    """
+    spans = db.query(RunSpan).filter(RunSpan.run_id == run.id).order_by(RunSpan.seq).all()
+    if not spans:
+        return {'run_id': run.id, 'total_ms': 0, 'spans': []}
+
+    origin = run.started_at or min(span.started_at for span in spans)
+    depth_by_seq: Dict[int, int] = {}
+    waterfall = []
+
+    for span in spans:
+        depth = depth_by_seq.get(span.parent_seq, -1) + 1 if span.parent_seq is not None else 0
+        depth_by_seq[span.seq] = depth
+
+        item = span.to_dict()
+        item['depth'] = depth
+        item['offset_ms'] = max(round((span.started_at - origin).total_seconds() * 1000), 0)
+        waterfall.append(item)
+
+    end_ms = max(item['offset_ms'] + item['duration_ms'] for item in waterfall)
+    if run.completed_at:
+        end_ms = max(end_ms, round((run.completed_at - origin).total_seconds() * 1000))
+
+    return {'run_id': run.id, 'total_ms': end_ms, 'spans': waterfall}
+
+
+def _percentile(sorted_values: List[int], percent: int) -> int:
+    """Nearest-rank percentile of an ascending list"""
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def get_span_percentiles(db: Session, hours: int = 24, category: str = 'stage') -> Dict:
+    """p50/p95/p99 duration per span name over the last `hours` hours"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    rows = db.query(RunSpan.name, RunSpan.duration_ms).filter(
+        RunSpan.category == category,
+        RunSpan.started_at >= since
+    ).all()
+
+    durations = defaultdict(list)
+    for name, duration_ms in rows:
+        durations[name].append(duration_ms)
+
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            'count': len(values),
+            **{f"p{p}_ms": _percentile(values, p) for p in PERCENTILES},
+            'max_ms': values[-1],
+        }
+
+    return {
+        'category': category,
+        'window_hours': hours,
+        'since': since.isoformat(),
+        'spans': stats
+    }
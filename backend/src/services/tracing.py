@@ -0,0 +1,171 @@
+"""
+Lightweight timing spans for pipeline runs
+
+    with tracing.span('tavily_query', 'tavily', query=query) as s:
+        response = await client.post(...)
+        s.bytes = len(response.content)
+
+Spans are collected in memory while a pipeline runs and written to the
+run_spans table in one insert when it finishes (or, in staged mode, when
+each stage job finishes). Outside a trace span() only measures time and
+records nothing, so scrapers and the LLM client can be traced
+unconditionally. Every finished span also feeds the Prometheus latency
+histograms in services.metrics.
+"""
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..config import logger
+from . import metrics
+
+
+class Span:
+    """One timed step; bytes/tokens/attributes may be filled in while it runs"""
+
+    __slots__ = ('seq', 'parent_seq', 'name', 'category', 'started_at', 'duration_ms',
+                 'bytes', 'tokens', 'status', 'attributes')
+
+    def __init__(self, seq: int, parent_seq: Optional[int], name: str, category: str, attributes: Dict[str, Any]):
+        self.seq = seq
+        self.parent_seq = parent_seq
+        self.name = name
+        self.category = category
+        self.started_at = datetime.utcnow()
+        self.duration_ms = 0
+        self.bytes: Optional[int] = None
+        self.tokens: Optional[int] = None
+        self.status = 'ok'
+        self.attributes = attributes
+
+
+class Trace:
+    """Spans of one pipeline invocation"""
+
+    def __init__(self, run_id: str, first_seq: int = 0):
+        self.run_id = run_id
+        self.spans: List[Span] = []
+        self.next_seq = first_seq
+
+    def new_span(self, name: str, category: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(self.next_seq, parent.seq if parent else None, name, category, attributes)
+        self.next_seq += 1
+        self.spans.append(span)
+        return span
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('tracing_trace', default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar('tracing_span', default=None)
+_current_stage: ContextVar[Optional[str]] = ContextVar('tracing_stage', default=None)
+
+
+def current_stage() -> Optional[str]:
+    """Name of the innermost enclosing stage span"""
+    return _current_stage.get()
+
+
+def _next_seq(run_id: str) -> int:
+    """Seq of the run's next span: staged runs are traced by several jobs"""
+    from ..models import SessionLocal, RunSpan
+    from sqlalchemy import func
+
+    db = SessionLocal()
+    try:
+        last_seq = db.query(func.max(RunSpan.seq)).filter(RunSpan.run_id == run_id).scalar()
+    except Exception as e:
+        logger.warning(f"[Tracing] Could not read existing spans of run {run_id}: {e}")
+        last_seq = None
+    finally:
+        db.close()
+
+    return (last_seq + 1) if last_seq is not None else 0
+
+
+def _save_spans(trace: Optional[Trace]):
+    """Insert the collected spans of a trace (best effort)"""
+    if trace is None or not trace.spans:
+        return
+
+    from ..models import SessionLocal, RunSpan
+
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(RunSpan, [
+            {
+                'run_id': trace.run_id,
+                'seq': span.seq,
+                'parent_seq': span.parent_seq,
+                'name': span.name,
+                'category': span.category,
+                'started_at': span.started_at,
+                'duration_ms': span.duration_ms,
+                'bytes': span.bytes,
+                'tokens': span.tokens,
+                'status': span.status,
+                'attributes': json.dumps(span.attributes, ensure_ascii=False, default=str) if span.attributes else None,
+            }
+            for span in trace.spans
+        ])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"[Tracing] Failed to save {len(trace.spans)} spans of run {trace.run_id}: {e}")
+    finally:
+        db.close()
+
+
+async def start_trace(run_id: str):
+    """Begin collecting spans for a run in the current context"""
+    # Pipelines run many runs on one event loop: the database is read in a thread
+    return _current_trace.set(Trace(run_id, first_seq=await asyncio.to_thread(_next_seq, run_id)))
+
+
+async def finish_trace(token):
+    """Write the collected spans (in a thread, best effort) and stop tracing"""
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    await asyncio.to_thread(_save_spans, trace)
+
+
+@contextmanager
+def span(name: str, category: str, **attributes: Any):
+    """
+    Time a block of code as a child of the enclosing span
+
+    Args:
+        name: Step name (search, tavily_query, analyze_batch, ...)
+        category: stage, tavily, llm or db
+        **attributes: Small details stored with the span (query, batch number, ...)
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = (
+        trace.new_span(name, category, parent, attributes) if trace
+        else Span(-1, None, name, category, attributes)
+    )
+    token = _current_span.set(current)
+    stage_token = _current_stage.set(name) if category == 'stage' else None
+    started = time.perf_counter()
+
+    try:
+        yield current
+    except BaseException:
+        current.status = 'error'
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - started) * 1000)
+        _current_span.reset(token)
+        if stage_token is not None:
+            _current_stage.reset(stage_token)
+        metrics.record_span(current)
+
+        # Roll bytes and tokens up so stages show what their calls used
+        if parent is not None:
+            if current.tokens:
+                parent.tokens = (parent.tokens or 0) + current.tokens
+            if current.bytes:
+                parent.bytes = (parent.bytes or 0) + current.bytes
@@ -0,0 +1,177 @@
+"""
+Token and cost accounting with per-run and per-day budgets
+
+The LLM client reports the usage of every call here. Usage is added up
+per stage and per run while the pipeline runs and written to the run's
+token/cost columns when it finishes; the cost of all runs of the day is
+kept in a Redis counter shared by every worker.
+
+Once the run budget (RUN_BUDGET_USD) or the daily budget
+(DAILY_BUDGET_USD) is spent, budget_exceeded() turns true and the
+pipeline degrades instead of spending more: remaining analysis batches
+are dropped and the analysis stage is skipped in favour of the LLM-only
+prompt (recorded like deadline degradations, see services.deadline).
+Idea generation itself always runs, so a run may overshoot its budget by
+at most that one call.
+"""
+from collections import defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+from ..config import settings, logger
+from .redis_client import redis_conn, redis_disabled, write_behind
+from . import metrics
+
+# Daily cost counters are kept a little longer than a day for the admin view
+DAY_KEY_TTL_SECONDS = 8 * 24 * 3600
+
+
+def _day_key(day: Optional[str] = None) -> str:
+    return f"pain_to_idea:usage:day:{day or datetime.utcnow().strftime('%Y-%m-%d')}"
+
+
+def call_cost(model: str, usage: Dict) -> float:
+    """Cost of one call in USD: reported by OpenRouter if present, otherwise estimated"""
+    if usage.get('cost') is not None:
+        return float(usage['cost'])
+    return (
+        (usage.get('prompt_tokens') or 0) * settings.llm_prompt_price_per_mtok
+        + (usage.get('completion_tokens') or 0) * settings.llm_completion_price_per_mtok
+    ) / 1_000_000
+
+
+class RunUsage:
+    """Usage of one pipeline invocation, with what is not yet saved to the run"""
+
+    def __init__(self, run_id: str, prior_cost: float = 0.0):
+        self.run_id = run_id
+        self.prior_cost = prior_cost
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.calls = 0
+        self.by_stage: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._saved = (0, 0, 0.0)
+
+    @property
+    def run_cost(self) -> float:
+        return self.prior_cost + self.cost_usd
+
+    def add(self, stage: str, prompt_tokens: int, completion_tokens: int, cost: float):
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost
+        self.calls += 1
+
+        stage_usage = self.by_stage[stage]
+        stage_usage['prompt_tokens'] += prompt_tokens
+        stage_usage['completion_tokens'] += completion_tokens
+        stage_usage['cost_usd'] += cost
+        stage_usage['calls'] += 1
+
+    def unsaved(self):
+        saved_prompt, saved_completion, saved_cost = self._saved
+        return (
+            self.prompt_tokens - saved_prompt,
+            self.completion_tokens - saved_completion,
+            self.cost_usd - saved_cost,
+        )
+
+    def mark_saved(self):
+        self._saved = (self.prompt_tokens, self.completion_tokens, self.cost_usd)
+
+
+_current_usage: ContextVar[Optional[RunUsage]] = ContextVar('usage_run', default=None)
+
+
+def start_usage(run):
+    """Begin accounting for a run (continues the totals of earlier stage jobs)"""
+    return _current_usage.set(RunUsage(run.id, prior_cost=run.cost_usd or 0.0))
+
+
+def finish_usage(token):
+    _current_usage.reset(token)
+
+
+def record_llm_call(model: str, usage: Dict, stage: Optional[str] = None) -> float:
+    """
+    Account one LLM call to the current run and the daily total
+
+    Returns:
+        Cost of the call in USD
+    """
+    prompt_tokens = int(usage.get('prompt_tokens') or 0)
+    completion_tokens = int(usage.get('completion_tokens') or 0)
+    cost = call_cost(model, usage)
+
+    metrics.LLM_COST.inc(cost, model=model)
+
+    run_usage = _current_usage.get()
+    if run_usage is not None:
+        run_usage.add(stage or 'other', prompt_tokens, completion_tokens, cost)
+
+    if not redis_disabled():
+        write_behind(_add_day_cost, _day_key(), cost)
+    return cost
+
+
+def _add_day_cost(key: str, cost: float):
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.incrbyfloat(key, cost)
+        pipe.expire(key, DAY_KEY_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"[Usage] Failed to update daily cost: {e}")
+
+
+def day_cost(day: Optional[str] = None) -> float:
+    """Cost of all runs on a UTC day (today by default)"""
+    value = redis_conn.get(_day_key(day))
+    return float(value) if value else 0.0
+
+
+def budget_exceeded() -> Optional[str]:
+    """
+    Which budget the current run has exhausted, if any
+
+    Returns:
+        'run' or 'day', or None while there is budget left
+    """
+    run_usage = _current_usage.get()
+    if run_usage is not None and settings.run_budget_usd and run_usage.run_cost >= settings.run_budget_usd:
+        return 'run'
+
+    # The daily total lives in Redis: not enforced in headless runs
+    if settings.daily_budget_usd and not redis_disabled():
+        try:
+            if day_cost() >= settings.daily_budget_usd:
+                return 'day'
+        except Exception as e:
+            logger.warning(f"[Usage] Could not read daily cost: {e}")
+
+    return None
+
+
+def current_stage_usage() -> Dict[str, Dict[str, float]]:
+    run_usage = _current_usage.get()
+    if run_usage is None:
+        return {}
+    return {stage: dict(values) for stage, values in run_usage.by_stage.items()}
+
+
+def apply_to_run(run):
+    """Add the not yet saved usage to the run's columns (caller commits)"""
+    run_usage = _current_usage.get()
+    if run_usage is None or run_usage.run_id != run.id:
+        return
+
+    prompt_tokens, completion_tokens, cost = run_usage.unsaved()
+    if not (prompt_tokens or completion_tokens or cost):
+        return
+
+    run.prompt_tokens = (run.prompt_tokens or 0) + prompt_tokens
+    run.completion_tokens = (run.completion_tokens or 0) + completion_tokens
+    run.cost_usd = (run.cost_usd or 0.0) + cost
+    run_usage.mark_saved()
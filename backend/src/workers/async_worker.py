@@ -0,0 +1,473 @@
+"""
+Asyncio-native RQ worker
+
+Pulls jobs from the same Redis queue as run_worker, but runs up to N
+generation pipelines concurrently on a single event loop. A run spends
+almost all of its time waiting on Tavily/OpenRouter, so one process can
+sustain dozens of runs instead of one.
+
+Jobs are popped with BLPOP, so RQ does not track them while they run.
+Each job instead holds a lease in Redis that its worker renews with
+every heartbeat; jobs of a worker that died without cleaning up (SIGKILL,
+OOM) are failed together with their runs by the next worker that notices
+the expired lease.
+
+Run with: python -m src.workers.async_worker
+"""
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from redis import Redis
+from rq import Queue
+from rq.job import Job, JobStatus
+from rq.exceptions import NoSuchJobError
+
+from ..config import settings, logger
+from ..services.metrics import WORKER_JOBS, WORKER_JOBS_IN_FLIGHT, WORKER_SLOTS, serve_metrics
+from ..services.cancellation import RunCancelled, run_cancellable
+from ..models import SessionLocal, Run
+from ..services.scheduler import waiting_job_id
+from .generation_pipeline import generate_ideas, generate_ideas_async, fail_run
+from .stage_jobs import STAGE_ASYNC_JOBS, worker_queue_names, stage_queue_limits
+
+# Jobs with a native coroutine implementation. Any other job function is
+# executed in a thread so it never blocks the event loop.
+ASYNC_JOBS = {
+    f"{generate_ideas.__module__}.{generate_ideas.__name__}": generate_ideas_async,
+    **STAGE_ASYNC_JOBS,
+}
+
+# How long a single BLPOP waits before re-checking the shutdown flag
+DEQUEUE_TIMEOUT_SECONDS = 1
+
+# How often concurrency metrics are logged and published to Redis
+METRICS_INTERVAL_SECONDS = 15
+
+# Redis key prefix for worker heartbeats (hash with concurrency metrics)
+WORKER_KEY_PREFIX = "pain_to_idea:async_worker:"
+
+# Jobs being executed by async workers, scored by when their lease runs
+# out. Workers renew the lease of their jobs with every heartbeat; a job
+# whose lease expired belongs to a worker that died (SIGKILL, OOM) and is
+# reaped by any other worker.
+IN_FLIGHT_JOBS_KEY = "pain_to_idea:async_jobs:in_flight"
+JOB_LEASE_SECONDS = METRICS_INTERVAL_SECONDS * 3
+
+ORPHANED_RUN_ERROR = "Ошибка генерации: воркер остановился во время выполнения"
+
+
+class WorkerMetrics:
+    """Concurrency metrics of one async worker process"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.jobs_started = 0
+        self.jobs_succeeded = 0
+        self.jobs_failed = 0
+        self.jobs_timed_out = 0
+        self.jobs_cancelled = 0
+        self.metrics_port: Optional[int] = None
+        self.busy_slot_seconds = 0.0
+        self._last_change = time.monotonic()
+
+    def _accumulate(self):
+        now = time.monotonic()
+        self.busy_slot_seconds += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    def job_started(self):
+        self._accumulate()
+        self.in_flight += 1
+        self.jobs_started += 1
+        WORKER_JOBS_IN_FLIGHT.set(self.in_flight)
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def job_finished(self, outcome: str):
+        self._accumulate()
+        self.in_flight -= 1
+        WORKER_JOBS_IN_FLIGHT.set(self.in_flight)
+        if outcome == 'succeeded':
+            self.jobs_succeeded += 1
+        elif outcome == 'timed_out':
+            self.jobs_timed_out += 1
+        elif outcome == 'cancelled':
+            self.jobs_cancelled += 1
+        else:
+            self.jobs_failed += 1
+
+    def utilisation(self) -> float:
+        """Average share of busy slots since the worker started"""
+        self._accumulate()
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return self.busy_slot_seconds / (elapsed * self.concurrency)
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            'pid': str(os.getpid()),
+            'concurrency': str(self.concurrency),
+            'in_flight': str(self.in_flight),
+            'peak_in_flight': str(self.peak_in_flight),
+            'jobs_started': str(self.jobs_started),
+            'jobs_succeeded': str(self.jobs_succeeded),
+            'jobs_failed': str(self.jobs_failed),
+            'jobs_timed_out': str(self.jobs_timed_out),
+            'jobs_cancelled': str(self.jobs_cancelled),
+            'utilisation': f"{self.utilisation():.3f}",
+            'metrics_port': str(self.metrics_port or ''),
+            'heartbeat_at': str(int(time.time())),
+        }
+
+
+class AsyncWorker:
+    """
+    Runs RQ jobs concurrently on one asyncio event loop
+
+    Args:
+        queue_names: Queues to listen on, in priority order
+        concurrency: Maximum number of jobs executed at the same time
+        drain_seconds: How long in-flight jobs may keep running after SIGTERM
+        queue_limits: Optional per-queue caps on concurrent jobs
+    """
+
+    def __init__(
+        self,
+        queue_names: Optional[List[str]] = None,
+        concurrency: Optional[int] = None,
+        drain_seconds: Optional[int] = None,
+        connection: Optional[Redis] = None,
+        queue_limits: Optional[Dict[str, int]] = None
+    ):
+        self.connection = connection or Redis.from_url(settings.redis_url, decode_responses=False)
+        self.queues = [
+            Queue(name, connection=self.connection)
+            for name in (queue_names or worker_queue_names())
+        ]
+        self.queue_limits = queue_limits if queue_limits is not None else stage_queue_limits()
+        self.queue_in_flight = {queue.name: 0 for queue in self.queues}
+        self.concurrency = concurrency or settings.async_worker_concurrency
+        self.drain_seconds = drain_seconds if drain_seconds is not None else settings.async_worker_drain_seconds
+        self.name = f"{socket.gethostname()}.{os.getpid()}"
+        self.metrics = WorkerMetrics(self.concurrency)
+
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: set = set()
+        self._job_ids: set = set()
+        self._stopping: Optional[asyncio.Event] = None
+        self._capacity_freed: Optional[asyncio.Event] = None
+
+    @property
+    def heartbeat_key(self) -> str:
+        return f"{WORKER_KEY_PREFIX}{self.name}"
+
+    def request_stop(self):
+        """Stop taking new jobs and let in-flight ones drain"""
+        if self._stopping and not self._stopping.is_set():
+            logger.info(f"[AsyncWorker] Shutdown requested, draining {len(self._tasks)} in-flight jobs")
+            self._stopping.set()
+
+    async def run(self):
+        """Main loop: dequeue while a slot is free, until asked to stop"""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._stopping = asyncio.Event()
+        self._capacity_freed = asyncio.Event()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except NotImplementedError:
+                # Signal handlers are not available on Windows event loops
+                pass
+
+        queue_names = ', '.join(q.name for q in self.queues)
+        logger.info(
+            f"[AsyncWorker] {self.name} listening on [{queue_names}] "
+            f"with concurrency {self.concurrency}"
+        )
+
+        WORKER_SLOTS.set(self.concurrency)
+        self.metrics.metrics_port = serve_metrics(
+            settings.worker_metrics_port,
+            attempts=settings.supervisor_max_workers + 1
+        )
+        metrics_task = asyncio.create_task(self._report_metrics())
+
+        try:
+            while await self._acquire_slot():
+                queues = self._available_queues()
+                if not queues:
+                    # Every queue we listen on is at its own limit
+                    self._slots.release()
+                    await self._wait_for_capacity()
+                    continue
+
+                try:
+                    dequeued = await asyncio.to_thread(self._dequeue, queues)
+                except Exception as e:
+                    self._slots.release()
+                    logger.error(f"[AsyncWorker] Failed to dequeue job: {e}")
+                    await asyncio.sleep(DEQUEUE_TIMEOUT_SECONDS)
+                    continue
+
+                if dequeued is None:
+                    self._slots.release()
+                    continue
+
+                job, queue = dequeued
+                self.queue_in_flight[queue.name] += 1
+                task = asyncio.create_task(self._run_job(job, queue))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            await self._drain()
+
+        finally:
+            metrics_task.cancel()
+            self.connection.delete(self.heartbeat_key)
+            logger.info(f"[AsyncWorker] {self.name} stopped: {self.metrics.to_dict()}")
+
+    async def _acquire_slot(self) -> bool:
+        """Wait for a free slot; returns False once shutdown is requested"""
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        stop = asyncio.ensure_future(self._stopping.wait())
+        await asyncio.wait({acquire, stop}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+
+        if self._stopping.is_set():
+            if acquire.done() and not acquire.cancelled():
+                self._slots.release()
+            else:
+                acquire.cancel()
+            return False
+
+        return True
+
+    def _available_queues(self) -> List[Queue]:
+        """Queues that are below their per-queue concurrency limit"""
+        return [
+            queue for queue in self.queues
+            if self.queue_in_flight[queue.name] < self.queue_limits.get(queue.name, self.concurrency)
+        ]
+
+    async def _wait_for_capacity(self):
+        self._capacity_freed.clear()
+        try:
+            await asyncio.wait_for(self._capacity_freed.wait(), timeout=DEQUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    def _dequeue(self, queues: List[Queue]):
+        """Blocking pop of the next job id (runs in a thread)"""
+        result = self.connection.blpop([q.key for q in queues], timeout=DEQUEUE_TIMEOUT_SECONDS)
+        if result is None:
+            return None
+
+        queue_key, job_id = result
+        queue_name = queue_key.decode().replace(Queue.redis_queue_namespace_prefix, '', 1)
+        queue = next(q for q in self.queues if q.name == queue_name)
+
+        try:
+            job = Job.fetch(job_id.decode(), connection=self.connection)
+        except NoSuchJobError:
+            logger.warning(f"[AsyncWorker] Job {job_id} disappeared before it could run")
+            return None
+
+        # Taken out of the queue: from now on only the lease keeps it from getting lost
+        self.connection.zadd(IN_FLIGHT_JOBS_KEY, {job.id: time.time() + JOB_LEASE_SECONDS})
+        return job, queue
+
+    async def _drain(self):
+        """Wait for in-flight jobs, cancelling whatever outlives the drain window"""
+        if not self._tasks:
+            return
+
+        logger.info(f"[AsyncWorker] Waiting up to {self.drain_seconds}s for {len(self._tasks)} jobs")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_seconds)
+
+        if pending:
+            logger.warning(f"[AsyncWorker] Cancelling {len(pending)} jobs that did not finish in time")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run_job(self, job: Job, queue: Queue):
+        """Execute one job with its timeout and record the outcome in RQ"""
+        self.metrics.job_started()
+        self._job_ids.add(job.id)
+        outcome = 'failed'
+        timeout = job.timeout or settings.generation_timeout_seconds
+
+        try:
+            # RQ bookkeeping is synchronous Redis I/O: keep it off the loop
+            await asyncio.to_thread(self._mark_started, job)
+
+            logger.info(f"[AsyncWorker] Started job {job.id} ({job.func_name}), in flight: {self.metrics.in_flight}")
+
+            coroutine_func = ASYNC_JOBS.get(job.func_name)
+            if coroutine_func is not None:
+                # Every pipeline job takes the run id first
+                work = run_cancellable(job.args[0], coroutine_func(*job.args, **job.kwargs))
+            else:
+                work = asyncio.to_thread(job.perform)
+
+            await asyncio.wait_for(work, timeout=timeout)
+            outcome = 'succeeded'
+            await asyncio.to_thread(self._mark_finished, job, queue)
+
+        except RunCancelled:
+            outcome = 'cancelled'
+            logger.info(f"[AsyncWorker] Job {job.id} stopped: run cancelled")
+            await asyncio.to_thread(self._mark_cancelled, job)
+
+        except asyncio.TimeoutError:
+            outcome = 'timed_out'
+            logger.error(f"[AsyncWorker] Job {job.id} exceeded its {timeout}s timeout")
+            await asyncio.to_thread(self._mark_failed, job, queue, f"Job exceeded maximum timeout value ({timeout} seconds)")
+
+        except asyncio.CancelledError:
+            logger.error(f"[AsyncWorker] Job {job.id} cancelled during shutdown")
+            await asyncio.to_thread(self._mark_failed, job, queue, "Job cancelled during worker shutdown")
+            raise
+
+        except Exception:
+            logger.error(f"[AsyncWorker] Job {job.id} failed")
+            await asyncio.to_thread(self._mark_failed, job, queue, traceback.format_exc())
+
+        finally:
+            self._job_ids.discard(job.id)
+            try:
+                await asyncio.to_thread(self.connection.zrem, IN_FLIGHT_JOBS_KEY, job.id)
+            except Exception as e:
+                logger.warning(f"[AsyncWorker] Could not release lease of job {job.id}: {e}")
+            self.metrics.job_finished(outcome)
+            WORKER_JOBS.inc(queue=queue.name, outcome=outcome)
+            self.queue_in_flight[queue.name] -= 1
+            self._capacity_freed.set()
+            self._slots.release()
+
+    def _mark_started(self, job: Job):
+        job.started_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        job.worker_name = self.name
+        job.set_status(JobStatus.STARTED)
+
+    def _mark_finished(self, job: Job, queue: Queue):
+        job.ended_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        job.set_status(JobStatus.FINISHED)
+        queue.finished_job_registry.add(job, job.result_ttl or 500)
+        queue.enqueue_dependents(job)
+
+    def _mark_cancelled(self, job: Job):
+        try:
+            job.ended_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            job.set_status(JobStatus.CANCELED)
+        except Exception as e:
+            logger.error(f"[AsyncWorker] Could not record cancellation of job {job.id}: {e}")
+
+    def _mark_failed(self, job: Job, queue: Queue, exc_string: str):
+        try:
+            job.ended_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            job.set_status(JobStatus.FAILED)
+            queue.failed_job_registry.add(job, ttl=job.failure_ttl, exc_string=exc_string)
+        except Exception as e:
+            logger.error(f"[AsyncWorker] Could not record failure of job {job.id}: {e}")
+
+    async def _report_metrics(self):
+        """Periodically log metrics and publish them as a heartbeat hash"""
+        while True:
+            metrics = self.metrics.to_dict()
+            logger.info(
+                f"[AsyncWorker] in_flight={metrics['in_flight']}/{self.concurrency} "
+                f"peak={metrics['peak_in_flight']} ok={metrics['jobs_succeeded']} "
+                f"failed={metrics['jobs_failed']} timed_out={metrics['jobs_timed_out']} "
+                f"utilisation={metrics['utilisation']}"
+            )
+            try:
+                await asyncio.to_thread(self._publish_heartbeat, metrics, list(self._job_ids))
+            except Exception as e:
+                logger.warning(f"[AsyncWorker] Failed to publish metrics: {e}")
+
+            try:
+                await asyncio.to_thread(reap_orphaned_jobs, self.connection)
+            except Exception as e:
+                logger.warning(f"[AsyncWorker] Failed to reap orphaned jobs: {e}")
+
+            await asyncio.sleep(METRICS_INTERVAL_SECONDS)
+
+    def _publish_heartbeat(self, metrics: Dict[str, str], job_ids: List[str]):
+        pipe = self.connection.pipeline()
+        pipe.hset(self.heartbeat_key, mapping=metrics)
+        pipe.expire(self.heartbeat_key, METRICS_INTERVAL_SECONDS * 3)
+        if job_ids:
+            lease = time.time() + JOB_LEASE_SECONDS
+            pipe.zadd(IN_FLIGHT_JOBS_KEY, {job_id: lease for job_id in job_ids}, xx=True)
+        pipe.execute()
+
+
+def reap_orphaned_jobs(connection: Redis) -> int:
+    """
+    Fail the jobs (and their runs) whose worker stopped renewing their lease
+
+    Safe to call from every worker: each expired job is claimed by exactly
+    one caller.
+
+    Returns:
+        Number of jobs reaped
+    """
+    reaped = 0
+    for job_id in connection.zrangebyscore(IN_FLIGHT_JOBS_KEY, 0, time.time()):
+        if not connection.zrem(IN_FLIGHT_JOBS_KEY, job_id):
+            continue
+        job_id = job_id.decode()
+        reaped += 1
+
+        try:
+            job = Job.fetch(job_id, connection=connection)
+        except NoSuchJobError:
+            continue
+
+        logger.error(f"[AsyncWorker] Job {job_id} lost its worker, marking it failed")
+        job.ended_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        job.set_status(JobStatus.FAILED)
+        Queue(job.origin, connection=connection).failed_job_registry.add(
+            job, ttl=job.failure_ttl, exc_string="Worker died while executing the job"
+        )
+        if job.args:
+            fail_orphaned_run(job.args[0], job_id)
+
+    return reaped
+
+
+def fail_orphaned_run(run_id: str, job_id: str):
+    """Fail a run whose job was lost, unless it has moved on without that job"""
+    db = SessionLocal()
+    try:
+        run = db.query(Run).filter(Run.id == run_id).first()
+        if run is None:
+            return
+        # A pending run is only stranded if the lost job was its latest dispatch
+        # (not if it was pre-empted and re-submitted meanwhile)
+        if run.status == 'running' or (run.status == 'pending' and waiting_job_id(run_id) == job_id):
+            fail_run(db, run, ORPHANED_RUN_ERROR)
+    finally:
+        db.close()
+
+
+def main():
+    """Start asyncio worker (optionally restricted to the queues given as arguments)"""
+    logger.info("Starting async worker...")
+    worker = AsyncWorker(queue_names=sys.argv[1:] or None)
+    asyncio.run(worker.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,15 @@ with REAL user pain data from Tavily Search
 """
 import asyncio
 import json
+import math
+import time
 from datetime import datetime
 from typing import List, Dict, Any
 
-from ..models import SessionLocal, Run, Idea, Analogue
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models import SessionLocal, Run, Idea, Analogue, Evidence
 from ..llm.client import llm_client
 from ..llm.prompts import (
     get_generate_ideas_prompt,
@@ -18,8 +23,16 @@ from ..llm.prompts import (
 )
 from ..scrapers.tavily_scraper import TavilyScraper
 from ..llm.pain_analyzer import PainAnalyzer
+from ..services.admission import record_run_latency
+from ..services import scheduler, progress_bus, run_events, tracing, usage, deadline, cancellation, batch_cache
+from ..services.scheduler import RunPreempted
+from ..services.cancellation import RunCancelled
+from ..services.run_service import STAGE_PERCENT
 from ..config import logger, settings
 
+# Tavily queries per run when there is enough time
+SEARCH_QUERIES = 3
+
 
 def generate_ideas(run_id: str):
     """
@@ -27,197 +40,484 @@ def generate_ideas(run_id: str):
 
     This function runs as a background job in RQ worker
     """
+    try:
+        asyncio.run(cancellation.run_cancellable(run_id, generate_ideas_async(run_id)))
+    except RunCancelled:
+        logger.info(f"Run {run_id} cancelled")
+
+
+async def generate_ideas_async(run_id: str):
+    """
+    Coroutine version of the generation pipeline
+
+    Used directly by the asyncio worker, which runs many pipelines
+    concurrently on one event loop, so every database and Redis step
+    runs in a worker thread
+    """
     db = SessionLocal()
+    run = None
+    events_token = run_events.bind_run(run_id)
+    trace_token = await tracing.start_trace(run_id)
+    usage_token = None
+    deadline_token = None
+    batch_token = None
 
     try:
         # Get run
-        run = db.query(Run).filter(Run.id == run_id).first()
+        run = await asyncio.to_thread(db.get, Run, run_id)
         if not run:
             logger.error(f"Run {run_id} not found")
             return
 
+        if run.status == 'cancelled':
+            logger.info(f"Run {run_id} was cancelled before it started")
+            return
+
+        usage_token = usage.start_usage(run)
+        deadline_token = deadline.start_deadline(run)
+        batch_token = batch_cache.bind_batch(run.batch_id)
+
         logger.info(f"Starting generation for run {run_id}")
 
-        # Update status
-        run.status = 'running'
-        db.commit()
+        selected_direction = await asyncio.to_thread(start_run, db, run)
 
-        # Setup asyncio loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # STAGE 1: Search for real user pains using Tavily
+        await asyncio.to_thread(set_stage, db, run, 'Поиск реальных болей пользователей')
+        search_results = await search_pains(selected_direction)
 
-        try:
-            # Determine direction
-            _, selected_direction = get_generate_ideas_prompt(run.optional_direction or "")
-            run.selected_direction = selected_direction
-            db.commit()
+        # STAGE 2: Analyze and extract structured pains
+        real_pains = []
+        if search_results:
+            await asyncio.to_thread(set_stage, db, run, 'Анализ найденных болей')
+            real_pains = await analyze_pains(search_results, selected_direction)
 
-            logger.info(f"Selected direction for run {run_id}: {selected_direction}")
+        # STAGE 3: Generate ideas
+        await asyncio.to_thread(set_stage, db, run, 'Генерация бизнес-идей')
+        ideas_data = await generate_raw_ideas(selected_direction, real_pains)
 
-            # STAGE 1: Search for real user pains using Tavily
-            run.current_stage = 'Поиск реальных болей пользователей'
-            db.commit()
+        logger.info(f"Received response from OpenRouter for run {run_id}")
 
-            logger.info(f"[Stage 1] Searching for real pains via Tavily...")
+        # STAGE 4: Save ideas
+        await asyncio.to_thread(set_stage, db, run, 'Сохранение результатов')
+        with tracing.span('persistence', 'stage'):
+            await asyncio.to_thread(save_ideas, db, run, ideas_data)
+
+    except RunPreempted:
+        logger.info(f"Run {run_id} pre-empted by an interactive run")
+        await asyncio.to_thread(preempt_run, db, run)
+
+    except RunCancelled:
+        logger.info(f"Run {run_id} cancelled at a stage boundary")
+        await asyncio.to_thread(cancel_run, db, run)
+
+    except asyncio.CancelledError:
+        # Cancelled by the user, or by the job timeout / worker shutdown.
+        # The task is cancelled once, so the bookkeeping can still be awaited
+        reason = await asyncio.to_thread(cancellation.cancel_reason, run_id)
+        if reason:
+            logger.info(f"Generation pipeline for run {run_id} cancelled ({reason})")
+            await asyncio.to_thread(cancel_run, db, run, reason)
+        else:
+            logger.error(f"Generation pipeline for run {run_id} was cancelled")
+            await asyncio.to_thread(fail_run, db, run, "Ошибка генерации: превышено время выполнения")
+        raise
 
-            try:
-                tavily_scraper = TavilyScraper()
-                search_results = loop.run_until_complete(
-                    tavily_scraper.search_pains(selected_direction, max_results=10)
-                )
-                logger.info(f"[Stage 1] Found {len(search_results)} search results from Tavily")
-            except Exception as e:
-                logger.warning(f"[Stage 1] Tavily search failed: {e}. Falling back to LLM-only generation")
-                search_results = []
-
-            # STAGE 2: Analyze and extract structured pains
-            real_pains = []
-            if search_results:
-                run.current_stage = 'Анализ найденных болей'
-                db.commit()
-
-                logger.info(f"[Stage 2] Analyzing search results to extract pains...")
-
-                try:
-                    pain_analyzer = PainAnalyzer(llm_client)
-                    real_pains = loop.run_until_complete(
-                        pain_analyzer.extract_pains(search_results, selected_direction)
-                    )
-                    logger.info(f"[Stage 2] Extracted {len(real_pains)} structured pains")
-                except Exception as e:
-                    logger.error(f"[Stage 2] Pain analysis failed: {e}")
-                    real_pains = []
-
-            # STAGE 3: Generate ideas
-            run.current_stage = 'Генерация бизнес-идей'
-            db.commit()
-
-            logger.info(f"[Stage 3] Generating ideas...")
-
-            # Choose prompt based on whether we have real pains
-            if real_pains and len(real_pains) >= 3:
-                logger.info(f"[Stage 3] Using REAL PAINS mode with {len(real_pains)} pains")
-                prompt = get_generate_ideas_from_real_pains_prompt(selected_direction, real_pains)
-            else:
-                logger.info(f"[Stage 3] Falling back to LLM-only mode (not enough real pains)")
-                prompt, _ = get_generate_ideas_prompt(selected_direction)
-
-            response_text = loop.run_until_complete(
-                llm_client.generate(
-                    prompt=prompt,
-                    system_prompt=SYSTEM_PROMPT,
-                    temperature=0.7,
-                    max_tokens=8000
-                )
+    except Exception as e:
+        logger.error(f"Error in generation pipeline for run {run_id}: {e}")
+        await asyncio.to_thread(fail_run, db, run, f"Ошибка генерации: {str(e)}")
+        raise
+
+    finally:
+        if batch_token is not None:
+            batch_cache.unbind_batch(batch_token)
+        if deadline_token is not None:
+            deadline.finish_deadline(deadline_token)
+        if usage_token is not None:
+            usage.finish_usage(usage_token)
+        await tracing.finish_trace(trace_token)
+        run_events.unbind_run(events_token)
+        await asyncio.to_thread(db.close)
+
+
+def start_run(db: Session, run: Run) -> str:
+    """Mark run as running and pick its direction (random if not given)"""
+    run.status = 'running'
+    run.started_at = datetime.utcnow()
+    db.commit()
+
+    # Determine direction
+    _, selected_direction = get_generate_ideas_prompt(run.optional_direction or "")
+    run.selected_direction = selected_direction
+    db.commit()
+
+    logger.info(f"Selected direction for run {run.id}: {selected_direction}")
+    run_events.emit(
+        'run_started',
+        f"Starting generation for run {run.id}: {selected_direction}",
+        run_id=run.id,
+        direction=selected_direction,
+        percent=5
+    )
+    progress_bus.publish(run)
+    scheduler.run_started(run.id)
+    return selected_direction
+
+
+def set_stage(db: Session, run: Run, stage: str):
+    """
+    Update the human-readable stage shown on the status page
+
+    Stage boundaries are also where a bulk run yields to interactive ones
+    and where runs executed without run_cancellable() notice cancellation.
+
+    Raises:
+        RunPreempted: when the scheduler asked this run to yield
+        RunCancelled: when the run was cancelled
+    """
+    scheduler.check_preempted(run.id)
+    cancellation.check_cancelled(run.id)
+    run.current_stage = stage
+    db.commit()
+    run_events.emit('stage_start', f"Stage: {stage}", run_id=run.id, stage=stage, percent=STAGE_PERCENT.get(stage))
+    progress_bus.publish(run)
+
+
+def fail_run(db: Session, run: Run, error_message: str):
+    """Mark run as failed, discarding any uncommitted partial results"""
+    if run is None:
+        return
+
+    db.rollback()
+    run.status = 'failed'
+    run.error_message = error_message
+    usage.apply_to_run(run)
+    deadline.apply_to_run(run)
+    db.commit()
+    run_events.emit('run_failed', f"ERROR: {error_message}", level='error', run_id=run.id)
+    progress_bus.publish(run)
+
+    scheduler.run_finished(run.id)
+
+
+def cancel_run(db: Session, run: Run, reason: str = None):
+    """Mark a run cancelled, discarding uncommitted partial results, and free its slot"""
+    if run is None:
+        return
+
+    db.rollback()
+    usage.apply_to_run(run)
+    deadline.apply_to_run(run)
+    cancellation.mark_cancelled(db, run, reason or cancellation.cancel_reason(run.id) or 'user')
+
+    scheduler.run_finished(run.id)
+
+
+def preempt_run(db: Session, run: Run):
+    """Return a pre-empted run to the pending state and re-schedule it"""
+    db.rollback()
+    run.status = 'pending'
+    run.current_stage = None
+    run.started_at = None
+    usage.apply_to_run(run)
+    deadline.apply_to_run(run)
+    db.commit()
+    run_events.emit('run_preempted', "Paused for a higher-priority run, waiting in the queue again",
+                    level='warning', run_id=run.id)
+    progress_bus.publish(run)
+
+    scheduler.requeue_preempted(run.id)
+
+
+async def search_pains(selected_direction: str) -> List[Dict]:
+    """Stage 1: search for real user pains via Tavily (empty list on failure)"""
+    logger.info(f"[Stage 1] Searching for real pains via Tavily...")
+    started = time.monotonic()
+
+    max_queries = deadline.allowed_steps(SEARCH_QUERIES, deadline.EST_TAVILY_QUERY_SECONDS)
+    if max_queries == 0:
+        deadline.record_degradation('deadline_skip_search', "Deadline close: skipped search, using LLM-only generation")
+        _stage_end('search', "Search skipped", started, results=0)
+        return []
+    if max_queries < SEARCH_QUERIES:
+        deadline.record_degradation(
+            'deadline_fewer_queries',
+            f"Deadline close: running {max_queries} of {SEARCH_QUERIES} search queries",
+            queries=max_queries
+        )
+
+    try:
+        with tracing.span('search', 'stage') as stage_span:
+            tavily_scraper = TavilyScraper()
+            search_results = await tavily_scraper.search_pains(
+                selected_direction,
+                max_results=10,
+                max_queries=max_queries,
+                timeout=deadline.call_timeout(30.0, reserve_seconds=deadline.GENERATION_RESERVE_SECONDS)
             )
+            stage_span.attributes['results'] = len(search_results)
+        logger.info(f"[Stage 1] Found {len(search_results)} search results from Tavily")
+    except Exception as e:
+        logger.warning(f"[Stage 1] Tavily search failed: {e}. Falling back to LLM-only generation")
+        run_events.emit('search_error', f"Tavily search failed: {e}. Falling back to LLM-only generation", level='warning')
+        search_results = []
+
+    _stage_end('search', f"Found {len(search_results)} search results", started, results=len(search_results))
+    return search_results
+
+
+async def analyze_pains(search_results: List[Dict], selected_direction: str) -> List[Dict]:
+    """Stage 2: extract structured pains from search results (empty list on failure)"""
+    logger.info(f"[Stage 2] Analyzing search results to extract pains...")
+    started = time.monotonic()
+
+    exhausted = usage.budget_exceeded()
+    if exhausted:
+        deadline.record_degradation(
+            'budget_skip_analysis',
+            f"Cost budget ({exhausted}) exhausted: skipped pain analysis, using LLM-only generation",
+            budget=exhausted
+        )
+        _stage_end('analysis', "Pain analysis skipped", started, pains=0)
+        return []
+
+    batches = math.ceil(len(search_results) / PainAnalyzer.BATCH_SIZE)
+    max_batches = deadline.allowed_steps(batches, deadline.EST_ANALYSIS_BATCH_SECONDS)
+    if max_batches == 0:
+        deadline.record_degradation('deadline_skip_analysis', "Deadline close: skipped pain analysis, using LLM-only generation")
+        _stage_end('analysis', "Pain analysis skipped", started, pains=0)
+        return []
+    if max_batches < batches:
+        deadline.record_degradation(
+            'deadline_fewer_batches',
+            f"Deadline close: analyzing {max_batches} of {batches} pain batches",
+            batches=max_batches
+        )
 
-        finally:
-            loop.close()
+    try:
+        with tracing.span('analysis', 'stage') as stage_span:
+            pain_analyzer = PainAnalyzer(llm_client)
+            real_pains = await pain_analyzer.extract_pains(search_results, selected_direction, max_batches=max_batches)
+            stage_span.attributes['pains'] = len(real_pains)
+        logger.info(f"[Stage 2] Extracted {len(real_pains)} structured pains")
+    except Exception as e:
+        logger.error(f"[Stage 2] Pain analysis failed: {e}")
+        run_events.emit('analysis_error', f"Pain analysis failed: {e}", level='error')
+        real_pains = []
 
-        logger.info(f"Received response from OpenRouter for run {run_id}")
+    _stage_end('analysis', f"Extracted {len(real_pains)} structured pains", started, pains=len(real_pains))
+    return real_pains
+
+
+async def generate_raw_ideas(selected_direction: str, real_pains: List[Dict]) -> List[Dict[str, Any]]:
+    """Stage 3: ask the LLM for ideas and parse its JSON answer"""
+    logger.info(f"[Stage 3] Generating ideas...")
+    started = time.monotonic()
+
+    # Choose prompt based on whether we have real pains
+    if real_pains and len(real_pains) >= 3:
+        logger.info(f"[Stage 3] Using REAL PAINS mode with {len(real_pains)} pains")
+        prompt = get_generate_ideas_from_real_pains_prompt(selected_direction, real_pains)
+    else:
+        logger.info(f"[Stage 3] Falling back to LLM-only mode (not enough real pains)")
+        prompt, _ = get_generate_ideas_prompt(selected_direction)
+
+    with tracing.span('generation', 'stage') as stage_span:
+        response_text = await llm_client.generate(
+            prompt=prompt,
+            system_prompt=SYSTEM_PROMPT,
+            temperature=0.7,
+            max_tokens=8000,
+            timeout=deadline.call_timeout(120.0, reserve_seconds=deadline.EST_PERSISTENCE_SECONDS)
+        )
+
+        ideas_data = parse_ideas_response(response_text)
+        stage_span.attributes['ideas'] = len(ideas_data)
+    _stage_end('generation', f"Generated {len(ideas_data)} raw ideas", started, ideas=len(ideas_data))
+    return ideas_data
 
-        # Parse JSON response
+
+def _stage_end(stage: str, message: str, started: float, **fields):
+    run_events.emit('stage_end', message, stage=stage, duration_ms=round((time.monotonic() - started) * 1000), **fields)
+
+
+def parse_ideas_response(response_text: str) -> List[Dict[str, Any]]:
+    """Parse LLM JSON answer into a list of raw idea dicts"""
+    try:
+        # Extract JSON from response (handle markdown code blocks)
+        response_text = response_text.strip()
+        if response_text.startswith('```'):
+            # Remove markdown code block markers
+            lines = response_text.split('\n')
+            response_text = '\n'.join(lines[1:-1])
+
+        ideas_data = json.loads(response_text)
+
+        if not isinstance(ideas_data, list):
+            # Handle {"ideas": [...]} format
+            ideas_data = ideas_data.get('ideas', [])
+
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON response: {e}")
+        logger.error(f"Response text: {response_text[:500]}")
+        raise Exception(f"Ошибка парсинга ответа LLM: {str(e)}")
+
+    return ideas_data
+
+
+# Generated ideas kept per run and analogues kept per idea
+MAX_IDEAS = 15
+MAX_ANALOGUES = 3
+
+REQUIRED_IDEA_FIELDS = ('title', 'pain_description', 'segment', 'confidence_level')
+
+
+def _plan_text(plan: Any) -> str:
+    """Plans come back as a list of steps or as ready text"""
+    if isinstance(plan, list):
+        return '\n'.join(f"- {step}" for step in plan)
+    return plan
+
+
+def _idea_row(run_id: str, idx: int, idea_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Column values of one generated idea
+
+    Raises:
+        ValueError: when the idea cannot be stored
+    """
+    missing = [field for field in REQUIRED_IDEA_FIELDS if field not in idea_data]
+    if missing:
+        raise ValueError(f"missing required fields: {', '.join(missing)}")
+
+    return {
+        'run_id': run_id,
+        'title': str(idea_data['title'])[:200],  # Truncate to 200 chars
+        'pain_description': str(idea_data['pain_description']),
+        'segment': str(idea_data['segment'])[:200],
+        'confidence_level': str(idea_data['confidence_level']).lower(),
+        'brief_evidence': idea_data.get('brief_evidence') or 'Доказательства анализируются...',
+        'plan_7days': _plan_text(idea_data.get('plan_7days') or 'План генерируется...'),
+        'plan_30days': _plan_text(idea_data.get('plan_30days') or 'План генерируется...'),
+        'order_index': idx
+    }
+
+
+def _analogue_row(aidx: int, analogue_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'name': str(analogue_data.get('name') or 'Аналог')[:200],
+        'description': str(analogue_data.get('description') or 'Описание недоступно'),
+        'url': str(analogue_data.get('url') or 'https://example.com')[:500],
+        'order_index': aidx
+    }
+
+
+def _evidence_row(evidence_data: Dict[str, Any]) -> Dict[str, Any]:
+    source_url = evidence_data.get('source_url')
+    return {
+        'pattern_description': str(evidence_data['pattern_description']),
+        'source_type': str(evidence_data.get('source_type') or 'llm')[:50],
+        'source_url': str(source_url)[:500] if source_url else None,
+        'example_quote': evidence_data.get('example_quote')
+    }
+
+
+def _child_rows(idx: int, idea_data: Dict[str, Any]):
+    """Analogue and evidence rows of an idea, skipping the malformed ones"""
+    analogues, evidences = [], []
+
+    for aidx, analogue_data in enumerate((idea_data.get('analogues') or [])[:MAX_ANALOGUES]):
         try:
-            # Extract JSON from response (handle markdown code blocks)
-            response_text = response_text.strip()
-            if response_text.startswith('```'):
-                # Remove markdown code block markers
-                lines = response_text.split('\n')
-                response_text = '\n'.join(lines[1:-1])
-
-            ideas_data = json.loads(response_text)
-
-            if not isinstance(ideas_data, list):
-                # Handle {"ideas": [...]} format
-                ideas_data = ideas_data.get('ideas', [])
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON response: {e}")
-            logger.error(f"Response text: {response_text[:500]}")
-            raise Exception(f"Ошибка парсинга ответа LLM: {str(e)}")
-
-        # Update stage
-        run.current_stage = 'Сохранение результатов'
-        db.commit()
-
-        # Save ideas to database
-        saved_count = 0
-        for idx, idea_data in enumerate(ideas_data[:15]):  # Limit to 15 ideas
-            try:
-                # Validate required fields
-                required_fields = ['title', 'pain_description', 'segment', 'confidence_level']
-                if not all(field in idea_data for field in required_fields):
-                    logger.warning(f"Skipping idea {idx}: missing required fields")
-                    continue
-
-                # Convert plans from list to string if needed
-                plan_7days = idea_data.get('plan_7days', 'План генерируется...')
-                if isinstance(plan_7days, list):
-                    plan_7days = '\n'.join(f"- {step}" for step in plan_7days)
-
-                plan_30days = idea_data.get('plan_30days', 'План генерируется...')
-                if isinstance(plan_30days, list):
-                    plan_30days = '\n'.join(f"- {step}" for step in plan_30days)
-
-                # Create idea
-                idea = Idea(
-                    run_id=run_id,
-                    title=idea_data['title'][:200],  # Truncate to 200 chars
-                    pain_description=idea_data['pain_description'],
-                    segment=idea_data['segment'][:200],
-                    confidence_level=idea_data.get('confidence_level', 'medium').lower(),
-                    brief_evidence=idea_data.get('brief_evidence', 'Доказательства анализируются...'),
-                    plan_7days=plan_7days,
-                    plan_30days=plan_30days,
-                    order_index=idx
-                )
-
-                db.add(idea)
-                db.flush()  # Get idea.id
-
-                # Add analogues
-                analogues_data = idea_data.get('analogues', [])
-                for aidx, analogue_data in enumerate(analogues_data[:3]):  # Max 3 analogues
-                    try:
-                        analogue = Analogue(
-                            idea_id=idea.id,
-                            name=analogue_data.get('name', 'Аналог')[:200],
-                            description=analogue_data.get('description', 'Описание недоступно'),
-                            url=analogue_data.get('url', 'https://example.com')[:500],
-                            order_index=aidx
-                        )
-                        db.add(analogue)
-                    except Exception as e:
-                        logger.warning(f"Failed to add analogue {aidx} for idea {idea.id}: {e}")
-
-                saved_count += 1
+            analogues.append(_analogue_row(aidx, analogue_data))
+        except Exception as e:
+            logger.warning(f"Skipping analogue {aidx} of idea {idx}: {e}")
 
-            except Exception as e:
-                logger.error(f"Failed to save idea {idx}: {e}")
-                continue
+    for eidx, evidence_data in enumerate(idea_data.get('evidence') or []):
+        try:
+            evidences.append(_evidence_row(evidence_data))
+        except Exception as e:
+            logger.warning(f"Skipping evidence {eidx} of idea {idx}: {e}")
 
-        # Validate we have enough ideas
-        if saved_count < 3:
-            raise Exception(f"Недостаточно идей сгенерировано: {saved_count} (требуется минимум 3)")
+    return analogues, evidences
 
-        # Mark run as completed
-        run.status = 'completed'
-        run.completed_at = datetime.utcnow()
-        run.ideas_count = saved_count
-        run.current_stage = 'Завершено'
-        db.commit()
 
-        logger.info(f"Successfully completed run {run_id} with {saved_count} ideas")
+def save_ideas(db: Session, run: Run, ideas_data: List[Dict[str, Any]]) -> int:
+    """
+    Stage 4: save ideas with analogues and mark the run as completed
 
-    except Exception as e:
-        logger.error(f"Error in generation pipeline for run {run_id}: {e}")
+    Every row is validated up front, so a malformed idea or analogue is
+    skipped on its own. The rest is written with one INSERT .. RETURNING
+    for the ideas and one batch per child table, and committed together
+    with the run's final status: a constant number of round trips however
+    many ideas there are.
+    """
+    run_id = run.id
+    started = time.monotonic()
 
-        # Mark run as failed
-        run.status = 'failed'
-        run.error_message = f"Ошибка генерации: {str(e)}"
-        db.commit()
+    with tracing.span('save_ideas', 'db') as db_span:
+        idea_rows, children = [], []
+        for idx, idea_data in enumerate(ideas_data[:MAX_IDEAS]):
+            try:
+                idea_rows.append(_idea_row(run_id, idx, idea_data))
+                children.append(_child_rows(idx, idea_data))
+            except Exception as e:
+                logger.warning(f"Skipping idea {idx}: {e}")
 
-        raise
+        saved_count = len(idea_rows)
+        db_span.attributes['ideas'] = saved_count
 
-    finally:
-        db.close()
+        # Validate we have enough ideas
+        if saved_count < 3:
+            raise Exception(f"Недостаточно идей сгенерировано: {saved_count} (требуется минимум 3)")
+
+        # RETURNING order is not guaranteed in a multi-row insert; order_index
+        # is unique within the run and maps the ids back to their rows
+        inserted = db.execute(insert(Idea).returning(Idea.id, Idea.order_index), idea_rows)
+        idea_ids = {order_index: idea_id for idea_id, order_index in inserted}
+
+        analogue_rows, evidence_rows = [], []
+        for idea_row, (analogues, evidences) in zip(idea_rows, children):
+            idea_id = idea_ids[idea_row['order_index']]
+            analogue_rows.extend({**row, 'idea_id': idea_id} for row in analogues)
+            evidence_rows.extend({**row, 'idea_id': idea_id} for row in evidences)
+
+        if analogue_rows:
+            db.execute(insert(Analogue), analogue_rows)
+        if evidence_rows:
+            db.execute(insert(Evidence), evidence_rows)
+
+        db_span.attributes['analogues'] = len(analogue_rows)
+
+    # Mark run as completed
+    run.status = 'completed'
+    run.completed_at = datetime.utcnow()
+    run.ideas_count = saved_count
+    run.current_stage = 'Завершено'
+    usage.apply_to_run(run)
+    deadline.apply_to_run(run)
+    db.commit()
+    _stage_end('persistence', f"Saved {saved_count} ideas", started, ideas=saved_count)
+    run_events.emit(
+        'run_usage',
+        f"Used {run.prompt_tokens + run.completion_tokens} tokens (~${run.cost_usd:.4f})",
+        run_id=run_id,
+        prompt_tokens=run.prompt_tokens,
+        completion_tokens=run.completion_tokens,
+        cost_usd=round(run.cost_usd, 6),
+        by_stage=usage.current_stage_usage()
+    )
+    run_events.emit(
+        'run_completed',
+        f"✓ Successfully generated {saved_count} ideas!",
+        level='success',
+        run_id=run_id,
+        ideas_count=saved_count,
+        percent=100
+    )
+    progress_bus.publish(run)
+
+    if run.started_at:
+        record_run_latency((run.completed_at - run.started_at).total_seconds())
+    scheduler.run_finished(run_id)
+
+    logger.info(f"Successfully completed run {run_id} with {saved_count} ideas")
+    return saved_count
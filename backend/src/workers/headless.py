@@ -0,0 +1,196 @@
+"""
+Headless batch runner: generation pipelines in-process, without Redis/RQ
+
+Reads one direction per line from a file or stdin, runs the generation
+pipeline for each of them in this process (up to --concurrency at once
+on one event loop, like the async worker) and writes one JSON line per
+finished run with its ideas. Nothing but Tavily/OpenRouter is needed:
+scheduling, progress and cancellation hooks that live in Redis are
+switched off.
+
+Runs are stored in a throwaway SQLite file unless --persist is given,
+which writes them to DATABASE_URL (migrated beforehand) so they show up
+in the app's history. A throughput summary goes to stderr at the end.
+
+Run with: python -m src.workers.headless directions.txt [--concurrency 4]
+          [--output ideas.jsonl] [--persist] [--deadline-seconds 300]
+          (directions from stdin when the file is "-" or omitted)
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional, TextIO
+
+from sqlalchemy.orm import selectinload
+
+from ..config import settings, logger
+from ..models import SessionLocal, Run, Idea
+from ..migrations import upgrade
+from ..models.profiles import create_sync_engine
+from ..services.redis_client import disable_redis
+from .generation_pipeline import generate_ideas_async
+
+
+class Summary:
+    """Outcome counters of a headless batch"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.started_at = time.monotonic()
+        self.statuses: Dict[str, int] = {}
+        self.durations: List[float] = []
+        self.ideas = 0
+        self.tokens = 0
+        self.cost_usd = 0.0
+
+    def add(self, result: Dict):
+        self.statuses[result['status']] = self.statuses.get(result['status'], 0) + 1
+        self.durations.append(result['duration_seconds'])
+        self.ideas += result['ideas_count']
+        self.tokens += result['prompt_tokens'] + result['completion_tokens']
+        self.cost_usd += result['cost_usd']
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started_at
+        runs = len(self.durations)
+        durations = sorted(self.durations) or [0.0]
+        statuses = ', '.join(f"{status} {count}" for status, count in sorted(self.statuses.items()))
+        return (
+            f"Runs: {runs} ({statuses or 'none'}) in {elapsed:.1f}s with concurrency {self.concurrency}\n"
+            f"Throughput: {runs / elapsed * 60:.2f} runs/min, {self.ideas / elapsed:.2f} ideas/s\n"
+            f"Run time: p50 {durations[len(durations) // 2]:.1f}s, "
+            f"p95 {durations[min(len(durations) - 1, int(len(durations) * 0.95))]:.1f}s\n"
+            f"Tokens: {self.tokens} (~${self.cost_usd:.4f})"
+        )
+
+
+def read_directions(source: TextIO) -> List[str]:
+    """Non-empty lines of the input; lines starting with # are comments"""
+    directions = []
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            directions.append(line[:500])
+    return directions
+
+
+def _result(run_id: str, index: int, direction: str, duration: float) -> Dict:
+    """The finished run with its ideas, as written to the output"""
+    db = SessionLocal()
+    try:
+        run = db.query(Run).filter(Run.id == run_id).first()
+        ideas = (
+            db.query(Idea)
+            .options(selectinload(Idea.analogues))
+            .filter(Idea.run_id == run_id)
+            .order_by(Idea.order_index)
+            .all()
+        )
+        return {
+            'index': index,
+            'direction': direction,
+            **run.to_dict(),
+            'duration_seconds': round(duration, 3),
+            'ideas': [idea.to_dict_full() for idea in ideas],
+        }
+    finally:
+        db.close()
+
+
+async def run_direction(index: int, direction: str, deadline_seconds: Optional[int]) -> Dict:
+    """Create a run for one direction and execute its pipeline here"""
+    db = SessionLocal()
+    try:
+        run = Run(id=str(uuid.uuid4()), optional_direction=direction, status='pending', deadline_seconds=deadline_seconds)
+        db.add(run)
+        db.commit()
+        run_id = run.id
+    finally:
+        db.close()
+
+    started = time.monotonic()
+    try:
+        # The job timeout RQ would enforce; the pipeline marks the run failed
+        await asyncio.wait_for(generate_ideas_async(run_id), settings.generation_timeout_seconds)
+    except Exception as e:
+        # Already recorded on the run by the pipeline
+        logger.warning(f"[Headless] Run {run_id} for '{direction}' failed: {e!r}")
+
+    return _result(run_id, index, direction, time.monotonic() - started)
+
+
+async def run_batch(directions: List[str], summary: Summary, output: TextIO,
+                    deadline_seconds: Optional[int] = None):
+    """Run every direction, at most summary.concurrency at once, writing results as they finish"""
+    semaphore = asyncio.Semaphore(summary.concurrency)
+
+    async def one(index: int, direction: str) -> Dict:
+        async with semaphore:
+            return await run_direction(index, direction, deadline_seconds)
+
+    tasks = [asyncio.create_task(one(index, direction)) for index, direction in enumerate(directions)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output.flush()
+            summary.add(result)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def use_scratch_database() -> str:
+    """Point the pipeline's sessions at a new SQLite file; returns its directory"""
+    tmpdir = tempfile.mkdtemp(prefix='pain_to_idea_headless_')
+    engine = create_sync_engine(f"sqlite:///{os.path.join(tmpdir, 'runs.db')}")
+    upgrade(engine)
+    SessionLocal.configure(bind=engine)
+    return tmpdir
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('directions', nargs='?', default='-', help='file with one direction per line, "-" for stdin')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--output', default='-', help='JSONL file, "-" for stdout')
+    parser.add_argument('--persist', action='store_true', help='store runs and ideas in DATABASE_URL')
+    parser.add_argument('--deadline-seconds', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.directions == '-':
+        directions = read_directions(sys.stdin)
+    else:
+        with open(args.directions, encoding='utf-8') as source:
+            directions = read_directions(source)
+    if not directions:
+        print("No directions given", file=sys.stderr)
+        return 1
+
+    disable_redis()
+    tmpdir = None if args.persist else use_scratch_database()
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    summary = Summary(max(1, args.concurrency))
+    try:
+        asyncio.run(run_batch(directions, summary, output, args.deadline_seconds))
+    except KeyboardInterrupt:
+        print(f"Interrupted\n{summary.report()}", file=sys.stderr)
+        return 130
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print(summary.report(), file=sys.stderr)
+    return 0 if summary.statuses.get('completed') == len(directions) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
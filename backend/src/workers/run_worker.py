@@ -1,24 +1,31 @@
 """
 RQ Worker runner
 
-Run with: python -m src.workers.run_worker
+Run with: python -m src.workers.run_worker [queue ...]
+(all pipeline queues and 'default' when no queue is given)
 """
+import sys
+
 from redis import Redis
 from rq import SimpleWorker, Queue
 
 from ..config import settings, logger
+from ..services.metrics import serve_metrics
+from .stage_jobs import worker_queue_names
 
 
 def main():
-    """Start RQ worker (Windows-compatible)"""
+    """Start RQ worker (Windows-compatible), optionally restricted to the queues given as arguments"""
     logger.info("Starting RQ worker...")
 
     # Connect to Redis
     redis_conn = Redis.from_url(settings.redis_url, decode_responses=False)
 
     # Create worker (SimpleWorker for Windows compatibility - no forking)
-    worker = SimpleWorker(['default'], connection=redis_conn)
-    logger.info("Worker started and listening to 'default' queue")
+    queue_names = sys.argv[1:] or worker_queue_names()
+    worker = SimpleWorker(queue_names, connection=redis_conn)
+    logger.info(f"Worker started and listening to queues: {', '.join(queue_names)}")
+    serve_metrics(settings.worker_metrics_port, attempts=settings.supervisor_max_workers + 1)
     worker.work()
 
 
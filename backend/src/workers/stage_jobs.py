@@ -0,0 +1,314 @@
+"""
+Stage-decomposed generation pipeline
+
+Each run is split into four RQ jobs chained with depends_on, one per
+stage, each on its own queue:
+
+    pipeline_search -> pipeline_analysis -> pipeline_generation -> pipeline_persistence
+
+A slow LLM call then only occupies a generation slot, while search slots
+keep serving other runs, and every stage can be scaled on its own by
+starting workers for its queue. Intermediate results are handed over in
+a per-run Redis hash.
+
+Enabled with PIPELINE_MODE=staged.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List
+
+from rq import Queue
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+from sqlalchemy.orm import Session
+
+from ..models import SessionLocal, Run
+from ..services.redis_client import redis_conn
+from ..config import logger, settings
+from ..services.scheduler import RunPreempted
+from ..services.cancellation import RunCancelled, run_cancellable, cancel_reason
+from ..services import run_events, tracing, usage, deadline, batch_cache
+from .generation_pipeline import (
+    start_run,
+    set_stage,
+    fail_run,
+    cancel_run,
+    preempt_run,
+    search_pains,
+    analyze_pains,
+    generate_raw_ideas,
+    save_ideas
+)
+
+STAGE_ORDER = ['search', 'analysis', 'generation', 'persistence']
+
+STAGE_QUEUES = {
+    'search': 'pipeline_search',
+    'analysis': 'pipeline_analysis',
+    'generation': 'pipeline_generation',
+    'persistence': 'pipeline_persistence',
+}
+
+# Intermediate stage results live this long (covers queueing + all stages)
+STATE_TTL_SECONDS = settings.generation_timeout_seconds * 4
+
+
+def worker_queue_names() -> List[str]:
+    """
+    Queues a general-purpose worker listens on, in priority order
+
+    Later stages go first so runs already in flight finish before new
+    ones start; the monolithic 'default' queue comes last.
+    """
+    return [STAGE_QUEUES[stage] for stage in reversed(STAGE_ORDER)] + ['default']
+
+
+def stage_queue_limits() -> Dict[str, int]:
+    """Per-queue concurrency limits for one async worker process"""
+    return {
+        STAGE_QUEUES['search']: settings.stage_search_concurrency,
+        STAGE_QUEUES['analysis']: settings.stage_analysis_concurrency,
+        STAGE_QUEUES['generation']: settings.stage_generation_concurrency,
+        STAGE_QUEUES['persistence']: settings.stage_persistence_concurrency,
+    }
+
+
+def stage_job_id(run_id: str, stage: str, attempt: int = 1) -> str:
+    """RQ job id of one stage (re-dispatched runs get a fresh set of ids)"""
+    job_id = f"{run_id}_{stage}"
+    return job_id if attempt == 1 else f"{job_id}_{attempt}"
+
+
+def _state_key(run_id: str) -> str:
+    return f"pain_to_idea:run:{run_id}:stages"
+
+
+def _save_state(run_id: str, field: str, value: Any):
+    key = _state_key(run_id)
+    pipe = redis_conn.pipeline()
+    pipe.hset(key, field, json.dumps(value, ensure_ascii=False))
+    pipe.expire(key, STATE_TTL_SECONDS)
+    pipe.execute()
+
+
+def _load_state(run_id: str, field: str, default: Any = None) -> Any:
+    raw = redis_conn.hget(_state_key(run_id), field)
+    return json.loads(raw) if raw is not None else default
+
+
+def enqueue_staged_run(run_id: str, attempt: int = 1) -> Job:
+    """
+    Enqueue the job graph for one run
+
+    Args:
+        run_id: Run to execute
+        attempt: Dispatch attempt (> 1 after the run was pre-empted)
+
+    Returns:
+        The first (search) job; the others are deferred until their
+        dependency finishes
+    """
+    first_job = None
+    previous_job = None
+    _save_state(run_id, 'attempt', attempt)
+
+    for stage in STAGE_ORDER:
+        queue = Queue(STAGE_QUEUES[stage], connection=redis_conn)
+        job = queue.enqueue(
+            STAGE_JOBS[stage],
+            run_id,
+            job_id=stage_job_id(run_id, stage, attempt),
+            depends_on=previous_job,
+            job_timeout=settings.generation_timeout_seconds
+        )
+        first_job = first_job or job
+        previous_job = job
+
+    return first_job
+
+
+def _abort_downstream(run_id: str, failed_stage: str):
+    """Cancel deferred jobs of the stages after a failed one"""
+    attempt = _load_state(run_id, 'attempt', 1)
+
+    for stage in STAGE_ORDER[STAGE_ORDER.index(failed_stage) + 1:]:
+        try:
+            Job.fetch(stage_job_id(run_id, stage, attempt), connection=redis_conn).cancel()
+        except NoSuchJobError:
+            continue
+        except Exception as e:
+            logger.warning(f"[Stages] Could not cancel {stage} job of run {run_id}: {e}")
+
+    redis_conn.delete(_state_key(run_id))
+
+
+async def _run_stage(run_id: str, stage: str, body: Callable[[Session, Run, str], Awaitable[None]]):
+    """Load the run, execute one stage body and handle its failure"""
+    db = SessionLocal()
+    run = None
+    events_token = run_events.bind_run(run_id)
+    trace_token = await tracing.start_trace(run_id)
+    usage_token = None
+    deadline_token = None
+    batch_token = None
+
+    try:
+        run = await asyncio.to_thread(db.get, Run, run_id)
+        if not run:
+            logger.error(f"Run {run_id} not found")
+            return
+
+        if run.status == 'cancelled' or (stage != STAGE_ORDER[0] and run.status != 'running'):
+            logger.info(f"[Stages] Skipping {stage} for run {run_id}: status is {run.status}")
+            return
+
+        logger.info(f"[Stages] Run {run_id}: starting {stage} stage")
+        usage_token = usage.start_usage(run)
+        deadline_token = deadline.start_deadline(run)
+        batch_token = batch_cache.bind_batch(run.batch_id)
+        await body(db, run, run_id)
+
+        await asyncio.to_thread(_save_totals, db, run)
+
+    except RunPreempted:
+        logger.info(f"[Stages] Run {run_id}: pre-empted before {stage} stage")
+        await asyncio.to_thread(_abort_downstream, run_id, stage)
+        await asyncio.to_thread(preempt_run, db, run)
+
+    except RunCancelled:
+        logger.info(f"[Stages] Run {run_id}: cancelled before {stage} stage")
+        await asyncio.to_thread(_abort_downstream, run_id, stage)
+        await asyncio.to_thread(cancel_run, db, run)
+
+    except asyncio.CancelledError:
+        reason = await asyncio.to_thread(cancel_reason, run_id)
+        if reason:
+            logger.info(f"[Stages] Run {run_id}: {stage} stage cancelled ({reason})")
+            await asyncio.to_thread(cancel_run, db, run, reason)
+        else:
+            logger.error(f"[Stages] Run {run_id}: {stage} stage was cancelled")
+            await asyncio.to_thread(fail_run, db, run, "Ошибка генерации: превышено время выполнения")
+        await asyncio.to_thread(_abort_downstream, run_id, stage)
+        raise
+
+    except Exception as e:
+        logger.error(f"[Stages] Run {run_id}: {stage} stage failed: {e}")
+        await asyncio.to_thread(fail_run, db, run, f"Ошибка генерации: {str(e)}")
+        await asyncio.to_thread(_abort_downstream, run_id, stage)
+        raise
+
+    finally:
+        if batch_token is not None:
+            batch_cache.unbind_batch(batch_token)
+        if deadline_token is not None:
+            deadline.finish_deadline(deadline_token)
+        if usage_token is not None:
+            usage.finish_usage(usage_token)
+        await tracing.finish_trace(trace_token)
+        run_events.unbind_run(events_token)
+        await asyncio.to_thread(db.close)
+
+
+def _save_totals(db: Session, run: Run):
+    """Later stage jobs continue from the saved totals"""
+    usage.apply_to_run(run)
+    deadline.apply_to_run(run)
+    db.commit()
+
+
+def _enter_stage(db: Session, run: Run, stage: str) -> str:
+    """set_stage(), returning the run's direction while the session is at hand"""
+    set_stage(db, run, stage)
+    return run.selected_direction
+
+
+# Stage bodies run on the event loop: the session, the run's attributes
+# (expired by every commit) and the Redis state are only touched in
+# worker threads
+
+async def _search(db: Session, run: Run, run_id: str):
+    selected_direction = await asyncio.to_thread(start_run, db, run)
+    await asyncio.to_thread(set_stage, db, run, 'Поиск реальных болей пользователей')
+    search_results = await search_pains(selected_direction)
+    await asyncio.to_thread(_save_state, run_id, 'search_results', search_results)
+
+
+async def _analysis(db: Session, run: Run, run_id: str):
+    search_results = await asyncio.to_thread(_load_state, run_id, 'search_results', [])
+    real_pains = []
+    if search_results:
+        selected_direction = await asyncio.to_thread(_enter_stage, db, run, 'Анализ найденных болей')
+        real_pains = await analyze_pains(search_results, selected_direction)
+    await asyncio.to_thread(_save_state, run_id, 'real_pains', real_pains)
+
+
+async def _generation(db: Session, run: Run, run_id: str):
+    selected_direction = await asyncio.to_thread(_enter_stage, db, run, 'Генерация бизнес-идей')
+    real_pains = await asyncio.to_thread(_load_state, run_id, 'real_pains', [])
+    ideas_data = await generate_raw_ideas(selected_direction, real_pains)
+    await asyncio.to_thread(_save_state, run_id, 'ideas_data', ideas_data)
+
+
+async def _persistence(db: Session, run: Run, run_id: str):
+    await asyncio.to_thread(set_stage, db, run, 'Сохранение результатов')
+    ideas_data = await asyncio.to_thread(_load_state, run_id, 'ideas_data', [])
+    with tracing.span('persistence', 'stage'):
+        await asyncio.to_thread(save_ideas, db, run, ideas_data)
+    await asyncio.to_thread(redis_conn.delete, _state_key(run_id))
+
+
+async def search_stage_async(run_id: str):
+    await _run_stage(run_id, 'search', _search)
+
+
+async def analysis_stage_async(run_id: str):
+    await _run_stage(run_id, 'analysis', _analysis)
+
+
+async def generation_stage_async(run_id: str):
+    await _run_stage(run_id, 'generation', _generation)
+
+
+async def persistence_stage_async(run_id: str):
+    await _run_stage(run_id, 'persistence', _persistence)
+
+
+# Synchronous entry points for the plain RQ worker
+
+def _run_sync(run_id: str, stage_coroutine):
+    try:
+        asyncio.run(run_cancellable(run_id, stage_coroutine))
+    except RunCancelled:
+        logger.info(f"[Stages] Run {run_id} cancelled")
+
+
+def search_stage(run_id: str):
+    _run_sync(run_id, search_stage_async(run_id))
+
+
+def analysis_stage(run_id: str):
+    _run_sync(run_id, analysis_stage_async(run_id))
+
+
+def generation_stage(run_id: str):
+    _run_sync(run_id, generation_stage_async(run_id))
+
+
+def persistence_stage(run_id: str):
+    _run_sync(run_id, persistence_stage_async(run_id))
+
+
+STAGE_JOBS = {
+    'search': search_stage,
+    'analysis': analysis_stage,
+    'generation': generation_stage,
+    'persistence': persistence_stage,
+}
+
+# Coroutine implementations picked up by the async worker
+STAGE_ASYNC_JOBS = {
+    f"{__name__}.{search_stage.__name__}": search_stage_async,
+    f"{__name__}.{analysis_stage.__name__}": analysis_stage_async,
+    f"{__name__}.{generation_stage.__name__}": generation_stage_async,
+    f"{__name__}.{persistence_stage.__name__}": persistence_stage_async,
+}
@@ -0,0 +1,325 @@
+"""
+Worker supervisor with queue-depth autoscaling (Linux only)
+
+Manages a pool of forked async worker processes. The pool is scaled
+between SUPERVISOR_MIN_WORKERS and SUPERVISOR_MAX_WORKERS based on the
+queue depth (RQ plus the runs held by the scheduler) and the age of the
+oldest queued job; crashed children are restarted automatically.
+
+Run with: python -m src.workers.supervisor
+"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from redis import Redis
+from rq import Queue
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+
+from ..config import settings, logger
+from ..services import scheduler
+from .async_worker import AsyncWorker, WORKER_KEY_PREFIX
+from .stage_jobs import worker_queue_names
+
+# Redis key where the supervisor publishes the pool state
+SUPERVISOR_KEY_PREFIX = "pain_to_idea:supervisor:"
+
+# A child that dies this soon after start counts as a crash loop
+CRASH_LOOP_SECONDS = 10
+
+# Upper bound for the restart back-off of a crash-looping child
+MAX_RESTART_BACKOFF_SECONDS = 60
+
+
+def _worker_main(queue_names: List[str], concurrency: int):
+    """Entry point of a forked child process"""
+    # Drop the supervisor's handlers inherited through fork();
+    # AsyncWorker installs its own drain-on-SIGTERM handler
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    worker = AsyncWorker(queue_names=queue_names, concurrency=concurrency)
+    asyncio.run(worker.run())
+
+
+class WorkerProcess:
+    """Bookkeeping for one child process"""
+
+    def __init__(self, process: multiprocessing.Process):
+        self.process = process
+        self.started_at = time.time()
+        self.retiring = False
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    @property
+    def name(self) -> str:
+        return f"{socket.gethostname()}.{self.pid}"
+
+
+class Supervisor:
+    """
+    Keeps the right number of async workers alive
+
+    Args:
+        queue_names: Queues the children listen on, in priority order
+        min_workers: Pool size when the queue is idle
+        max_workers: Hard upper bound for the pool
+        concurrency: Concurrent jobs per child process
+    """
+
+    def __init__(
+        self,
+        queue_names: Optional[List[str]] = None,
+        min_workers: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        concurrency: Optional[int] = None
+    ):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Worker supervisor requires fork() (Linux/macOS)")
+
+        self.queue_names = queue_names or worker_queue_names()
+        self.min_workers = min_workers if min_workers is not None else settings.supervisor_min_workers
+        self.max_workers = max(max_workers or settings.supervisor_max_workers, self.min_workers)
+        self.concurrency = concurrency or settings.async_worker_concurrency
+
+        self.connection = Redis.from_url(settings.redis_url, decode_responses=False)
+        self.queues = [Queue(name, connection=self.connection) for name in self.queue_names]
+        self.context = multiprocessing.get_context('fork')
+
+        self.workers: Dict[int, WorkerProcess] = {}
+        self.restart_backoff = 0.0
+        self.next_restart_at = 0.0
+        self.idle_since: Optional[float] = None
+        self.stopping = False
+
+    @property
+    def status_key(self) -> str:
+        return f"{SUPERVISOR_KEY_PREFIX}{socket.gethostname()}"
+
+    # Process management
+
+    def _spawn(self) -> WorkerProcess:
+        process = self.context.Process(
+            target=_worker_main,
+            args=(self.queue_names, self.concurrency),
+            daemon=False
+        )
+        process.start()
+        worker = WorkerProcess(process)
+        self.workers[process.pid] = worker
+        logger.info(f"[Supervisor] Started worker pid={process.pid} ({self._active_count()} active)")
+        return worker
+
+    def _retire_one(self):
+        """Gracefully stop the youngest worker (SIGTERM lets it drain)"""
+        candidates = [w for w in self.workers.values() if not w.retiring]
+        if len(candidates) <= self.min_workers:
+            return
+
+        worker = max(candidates, key=lambda w: w.started_at)
+        worker.retiring = True
+        os.kill(worker.pid, signal.SIGTERM)
+        logger.info(f"[Supervisor] Retiring worker pid={worker.pid} ({self._active_count()} active)")
+
+    def _active_count(self) -> int:
+        return sum(1 for w in self.workers.values() if not w.retiring)
+
+    def _reap(self):
+        """Collect exited children and restart the ones that crashed"""
+        for pid, worker in list(self.workers.items()):
+            if worker.process.is_alive():
+                continue
+
+            worker.process.join()
+            del self.workers[pid]
+            exitcode = worker.process.exitcode
+
+            if worker.retiring or self.stopping:
+                logger.info(f"[Supervisor] Worker pid={pid} exited (code {exitcode})")
+                continue
+
+            lifetime = time.time() - worker.started_at
+            logger.error(f"[Supervisor] Worker pid={pid} crashed with code {exitcode} after {lifetime:.0f}s")
+
+            # Back off when children keep dying right after start
+            if lifetime < CRASH_LOOP_SECONDS:
+                self.restart_backoff = min(max(self.restart_backoff * 2, 1.0), MAX_RESTART_BACKOFF_SECONDS)
+            else:
+                self.restart_backoff = 0.0
+            self.next_restart_at = time.time() + self.restart_backoff
+
+    # Scaling
+
+    def queue_stats(self) -> Dict[str, float]:
+        """
+        Queued job count and age of the oldest queued job in seconds
+
+        Runs held by the fair scheduler count as queued: it keeps at most
+        SCHEDULER_DISPATCH_WINDOW of them in RQ, so a burst waits there.
+        """
+        depth = scheduler.pending_count()
+        oldest_age = scheduler.oldest_pending_age()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+        for queue in self.queues:
+            depth += queue.count
+            job_ids = queue.get_job_ids(0, 1)
+            if not job_ids:
+                continue
+            try:
+                job = Job.fetch(job_ids[0], connection=self.connection)
+            except NoSuchJobError:
+                continue
+            if job.enqueued_at:
+                oldest_age = max(oldest_age, (now - job.enqueued_at.replace(tzinfo=None)).total_seconds())
+
+        return {'depth': depth, 'oldest_age': oldest_age}
+
+    def worker_stats(self) -> Dict[int, Dict[str, str]]:
+        """Heartbeat metrics published by each child"""
+        stats = {}
+        for pid, worker in self.workers.items():
+            raw = self.connection.hgetall(f"{WORKER_KEY_PREFIX}{worker.name}")
+            stats[pid] = {k.decode(): v.decode() for k, v in raw.items()}
+        return stats
+
+    def desired_workers(self, depth: int, oldest_age: float, in_flight: int) -> int:
+        """Pool size needed to start every queued job within the age target"""
+        active = self._active_count()
+        needed = math.ceil((depth + in_flight) / self.concurrency)
+
+        # Jobs waiting too long means the current pool is not keeping up
+        if depth and oldest_age > settings.supervisor_max_job_age_seconds:
+            needed = max(needed, active + 1)
+
+        if needed < active:
+            # Scale down only after the queue has been quiet for a while
+            now = time.time()
+            if depth:
+                self.idle_since = None
+                needed = active
+            elif self.idle_since is None:
+                self.idle_since = now
+                needed = active
+            elif now - self.idle_since < settings.supervisor_scale_down_idle_seconds:
+                needed = active
+            else:
+                self.idle_since = now
+                needed = active - 1
+        else:
+            self.idle_since = None
+
+        return max(self.min_workers, min(self.max_workers, needed))
+
+    def scale(self):
+        """Run one supervision step: reap, measure, scale, publish"""
+        self._reap()
+
+        queue = self.queue_stats()
+        workers = self.worker_stats()
+        in_flight = sum(int(w.get('in_flight', 0)) for w in workers.values())
+        target = self.desired_workers(queue['depth'], queue['oldest_age'], in_flight)
+
+        while self._active_count() < target and time.time() >= self.next_restart_at:
+            self._spawn()
+        while self._active_count() > target:
+            self._retire_one()
+
+        self._publish(queue, workers, target)
+
+    def _publish(self, queue: Dict[str, float], workers: Dict[int, Dict[str, str]], target: int):
+        status = {
+            'pid': os.getpid(),
+            'target_workers': target,
+            'active_workers': self._active_count(),
+            'queue_depth': queue['depth'],
+            'oldest_job_age_seconds': round(queue['oldest_age'], 1),
+            'workers': [
+                {
+                    'pid': pid,
+                    'retiring': self.workers[pid].retiring,
+                    'in_flight': int(stats.get('in_flight', 0)),
+                    'concurrency': int(stats.get('concurrency', self.concurrency)),
+                    'utilisation': float(stats.get('utilisation', 0.0)),
+                }
+                for pid, stats in workers.items()
+                if pid in self.workers
+            ]
+        }
+        logger.info(
+            f"[Supervisor] depth={status['queue_depth']} oldest={status['oldest_job_age_seconds']}s "
+            f"workers={status['active_workers']}/{target} "
+            f"utilisation={[w['utilisation'] for w in status['workers']]}"
+        )
+        self.connection.set(
+            self.status_key,
+            json.dumps(status),
+            ex=settings.supervisor_scale_interval_seconds * 3
+        )
+
+    # Lifecycle
+
+    def request_stop(self, *args):
+        if not self.stopping:
+            logger.info("[Supervisor] Shutdown requested, stopping workers")
+            self.stopping = True
+
+    def run(self):
+        """Supervise until SIGTERM/SIGINT, then drain all children"""
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        logger.info(
+            f"[Supervisor] Managing {self.min_workers}-{self.max_workers} workers "
+            f"x {self.concurrency} slots on [{', '.join(self.queue_names)}]"
+        )
+
+        for _ in range(self.min_workers):
+            self._spawn()
+
+        while not self.stopping:
+            try:
+                self.scale()
+            except Exception as e:
+                logger.error(f"[Supervisor] Supervision step failed: {e}")
+            time.sleep(settings.supervisor_scale_interval_seconds)
+
+        self._shutdown()
+
+    def _shutdown(self):
+        for worker in self.workers.values():
+            if worker.process.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+        deadline = time.time() + settings.async_worker_drain_seconds + 10
+        for worker in self.workers.values():
+            worker.process.join(timeout=max(deadline - time.time(), 0))
+            if worker.process.is_alive():
+                logger.warning(f"[Supervisor] Killing worker pid={worker.pid} after drain timeout")
+                worker.process.kill()
+                worker.process.join()
+
+        self.connection.delete(self.status_key)
+        logger.info("[Supervisor] All workers stopped")
+
+
+def main():
+    """Start the worker supervisor (optionally for the queues given as arguments)"""
+    logger.info("Starting worker supervisor...")
+    Supervisor(queue_names=sys.argv[1:] or None).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Shared fixtures
+
+The suite runs against a throwaway SQLite file and an in-memory Redis
+(fakeredis), so neither a database server nor Redis is needed:
+
+    cd backend && pip install -r requirements-dev.txt && python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+# Settings and engines are created on import of src: point them at
+# throwaway resources first
+_tmpdir = tempfile.mkdtemp(prefix='pain_to_idea_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmpdir, 'app.db')}"
+os.makedirs('logs', exist_ok=True)
+
+import fakeredis
+import pytest
+
+from src.services import redis_client
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """In-memory Redis in place of redis_conn in every module that imported it"""
+    fake = fakeredis.FakeRedis()
+    original = redis_client.redis_conn
+    for name, module in list(sys.modules.items()):
+        if name.startswith('src.') and getattr(module, 'redis_conn', None) is original:
+            monkeypatch.setattr(module, 'redis_conn', fake)
+    return fake
+
+
+@pytest.fixture
+def db():
+    """Session on the test database with an empty schema"""
+    from src.models import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
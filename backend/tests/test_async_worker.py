@@ -0,0 +1,53 @@
+import time
+
+from rq import Queue
+from rq.job import JobStatus
+
+from src.models import Run
+from src.workers.async_worker import (
+    IN_FLIGHT_JOBS_KEY, ORPHANED_RUN_ERROR, AsyncWorker, reap_orphaned_jobs
+)
+from src.workers.generation_pipeline import generate_ideas
+
+
+def _in_flight_job(fake_redis, db, lease_expires_at: float):
+    run = Run(status='running')
+    db.add(run)
+    db.commit()
+    job = Queue('default', connection=fake_redis).enqueue(generate_ideas, run.id)
+    fake_redis.lpop(Queue('default', connection=fake_redis).key)
+    fake_redis.zadd(IN_FLIGHT_JOBS_KEY, {job.id: lease_expires_at})
+    return run, job
+
+
+def test_job_with_expired_lease_fails_with_its_run(fake_redis, db):
+    run, job = _in_flight_job(fake_redis, db, time.time() - 1)
+
+    assert reap_orphaned_jobs(fake_redis) == 1
+
+    db.refresh(run)
+    assert run.status == 'failed'
+    assert run.error_message == ORPHANED_RUN_ERROR
+    job.refresh()
+    assert job.get_status() == JobStatus.FAILED
+    assert reap_orphaned_jobs(fake_redis) == 0
+
+
+def test_job_with_live_lease_is_left_alone(fake_redis, db):
+    run, _ = _in_flight_job(fake_redis, db, time.time() + 60)
+
+    assert reap_orphaned_jobs(fake_redis) == 0
+
+    db.refresh(run)
+    assert run.status == 'running'
+
+
+def test_dequeued_job_takes_a_lease(fake_redis, db):
+    queue = Queue('default', connection=fake_redis)
+    job = queue.enqueue(generate_ideas, 'run-1')
+    worker = AsyncWorker(queue_names=['default'], connection=fake_redis, queue_limits={})
+
+    dequeued, _ = worker._dequeue(worker.queues)
+
+    assert dequeued.id == job.id
+    assert fake_redis.zscore(IN_FLIGHT_JOBS_KEY, job.id) > time.time()
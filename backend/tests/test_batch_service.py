@@ -0,0 +1,34 @@
+import subprocess
+import sys
+from types import SimpleNamespace
+
+from src.services.batch_service import batch_summary
+from src.services.run_service import STAGE_PERCENT
+
+
+def test_batch_api_does_not_load_the_pipeline():
+    # A fresh interpreter: other tests import the pipeline into this one
+    loaded = subprocess.run(
+        [sys.executable, '-c', (
+            "import sys, src.api.batches; "
+            "print(any(name.startswith(('src.workers', 'src.llm', 'src.scrapers')) for name in sys.modules))"
+        )],
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+    assert loaded == 'False'
+
+
+def test_batch_progress_uses_the_stage_percent():
+    stage = 'Генерация бизнес-идей'
+    runs = [
+        SimpleNamespace(id='a', status='running', current_stage=stage, optional_direction=None,
+                        ideas_count=0, error_message=None),
+        SimpleNamespace(id='b', status='completed', current_stage=None, optional_direction=None,
+                        ideas_count=3, error_message=None),
+    ]
+    batch = SimpleNamespace(id='batch', created_at=None, priority='bulk', concurrency=1)
+
+    summary = batch_summary(batch, runs)
+
+    assert summary['progress_percent'] == round((STAGE_PERCENT[stage] + 100) / 2)
+    assert summary['status'] == 'running'
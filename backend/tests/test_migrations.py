@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+
+from src.migrations import MIGRATIONS, applied_versions, pending_migrations, upgrade, m0001_baseline
+from src.models import Base, IdeaPurchaseTotal, PurchaseBucket
+from src.models.profiles import create_sync_engine
+from src.services.purchase_service import record_rollups
+
+# Created by migrations but not mapped by the models
+UNMAPPED_TABLES = {'schema_migrations', 'ideas_fts'}
+
+
+def _engine(tmp_path):
+    return create_sync_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+
+
+def test_upgrade_applies_every_migration_once(tmp_path):
+    engine = _engine(tmp_path)
+
+    assert upgrade(engine) == [migration.VERSION for migration in MIGRATIONS]
+    assert applied_versions(engine) == [migration.VERSION for migration in MIGRATIONS]
+    assert pending_migrations(engine) == []
+    assert upgrade(engine) == []
+
+
+def test_migrated_schema_matches_the_models(tmp_path):
+    engine = _engine(tmp_path)
+    upgrade(engine)
+
+    inspector = inspect(engine)
+    tables = {name for name in inspector.get_table_names() if not name.startswith('ideas_fts')}
+    assert tables - UNMAPPED_TABLES == set(Base.metadata.tables)
+
+    for table in Base.metadata.sorted_tables:
+        columns = {info['name'] for info in inspector.get_columns(table.name)}
+        assert columns == {column.name for column in table.columns}, table.name
+
+        indexes = {info['name'] for info in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+def test_upgrade_brings_a_legacy_database_up_to_date(tmp_path):
+    engine = _engine(tmp_path)
+    # runs as created before the migrate_add_*.py scripts, with one run in it
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE runs (id VARCHAR PRIMARY KEY, created_at TIMESTAMP NOT NULL, "
+            "completed_at TIMESTAMP, status VARCHAR NOT NULL, current_stage VARCHAR(100), "
+            "optional_direction VARCHAR(500), ideas_count INTEGER NOT NULL, error_message TEXT)"
+        ))
+        connection.execute(text(
+            "INSERT INTO runs (id, created_at, status, ideas_count) VALUES ('old', '2025-01-01', 'completed', 3)"
+        ))
+
+    upgrade(engine)
+
+    columns = {info['name'] for info in inspect(engine).get_columns('runs')}
+    assert columns == {column.name for column in Base.metadata.tables['runs'].columns}
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT status, prompt_tokens, batch_id FROM runs WHERE id = 'old'")).one()
+    assert tuple(row) == ('completed', 0, None)
+
+
+def test_purchase_rollups_are_backfilled_in_the_write_path_format(tmp_path):
+    engine = _engine(tmp_path)
+    # purchases recorded before 0003, in two hours
+    with engine.begin() as connection:
+        m0001_baseline.upgrade(connection)
+        connection.execute(text(
+            "INSERT INTO runs (id, created_at, status, ideas_count, prompt_tokens, completion_tokens, cost_usd) "
+            "VALUES ('r1', '2025-01-01', 'completed', 3, 0, 0, 0)"
+        ))
+        connection.execute(text(
+            "INSERT INTO ideas (id, run_id, title, pain_description, segment, confidence_level, brief_evidence, "
+            "plan_7days, plan_30days, order_index, created_at) "
+            "VALUES (1, 'r1', 't', 'p', 's', 'high', 'e', 'p', 'p', 0, '2025-01-01')"
+        ))
+        for created_at in ('2025-01-01 10:05:00.000000', '2025-01-01 10:55:00.000000', '2025-01-01 11:00:00.000000'):
+            connection.execute(text(
+                "INSERT INTO purchases (idea_id, run_id, created_at) VALUES (1, 'r1', :created_at)"
+            ), {'created_at': created_at})
+
+    upgrade(engine)
+
+    with Session(engine) as db:
+        total = db.get(IdeaPurchaseTotal, 1)
+        assert (total.run_id, total.purchase_count, total.last_purchase_at) == ('r1', 3, datetime(2025, 1, 1, 11))
+
+        # A later click in a backfilled hour lands in the same bucket
+        record_rollups(db, [(1, 'r1', datetime(2025, 1, 1, 10, 30))])
+        db.commit()
+        buckets = db.execute(
+            select(PurchaseBucket.bucket_start, PurchaseBucket.purchase_count).order_by(PurchaseBucket.bucket_start)
+        ).all()
+    assert buckets == [(datetime(2025, 1, 1, 10), 3), (datetime(2025, 1, 1, 11), 1)]
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from src.models import Run, engine
+from src.services import run_events
+from src.services.redis_client import write_behind
+from src.workers import generation_pipeline
+from src.workers.generation_pipeline import generate_ideas_async
+
+
+def _idea(index: int):
+    return {
+        'title': f"Idea {index}",
+        'pain_description': "Pain",
+        'segment': "Segment",
+        'confidence_level': "high",
+    }
+
+
+def test_pipeline_keeps_database_and_redis_off_the_event_loop(fake_redis, db, monkeypatch):
+    run = Run(status='pending', optional_direction='Логистика')
+    db.add(run)
+    db.commit()
+    run_id = run.id
+
+    async def search_pains(direction):
+        return [{'url': 'https://example.com', 'content': 'pain'}]
+
+    async def analyze_pains(search_results, direction):
+        return []
+
+    async def generate_raw_ideas(direction, real_pains):
+        return [_idea(index) for index in range(3)]
+
+    monkeypatch.setattr(generation_pipeline, 'search_pains', search_pains)
+    monkeypatch.setattr(generation_pipeline, 'analyze_pains', analyze_pains)
+    monkeypatch.setattr(generation_pipeline, 'generate_raw_ideas', generate_raw_ideas)
+
+    loop_threads = []
+    io_threads = []
+
+    def on_statement(*args):
+        io_threads.append(threading.get_ident())
+
+    get_connection = fake_redis.connection_pool.get_connection
+
+    def tracked_connection(*args, **kwargs):
+        io_threads.append(threading.get_ident())
+        return get_connection(*args, **kwargs)
+
+    monkeypatch.setattr(fake_redis.connection_pool, 'get_connection', tracked_connection)
+    event.listen(engine, 'before_cursor_execute', on_statement)
+    try:
+        async def main():
+            loop_threads.append(threading.get_ident())
+            await generate_ideas_async(run_id)
+            # Let queued event writes land
+            await asyncio.to_thread(write_behind, lambda: None)
+
+        asyncio.run(main())
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_statement)
+
+    db.refresh(run)
+    assert run.status == 'completed'
+    assert run.ideas_count == 3
+    assert io_threads
+    assert loop_threads[0] not in io_threads
+
+    kinds = [event['kind'] for _, event in run_events.read_events(run_id)]
+    assert kinds[0] == 'run_started'
+    assert kinds[-1] == 'run_completed'
+
+
+def test_write_behind_keeps_the_order_of_writes():
+    written = []
+
+    async def main():
+        for index in range(50):
+            write_behind(written.append, index)
+        await asyncio.to_thread(write_behind, written.append, 'last')
+
+    asyncio.run(main())
+
+    assert written == list(range(50)) + ['last']
+
+
+def test_ideas_only_need_the_required_keys_present():
+    # As before bulk saving: an empty value is stored, a missing key skips the idea
+    row = generation_pipeline._idea_row('run', 0, {**_idea(0), 'segment': ''})
+    assert row['segment'] == ''
+
+    idea = _idea(0)
+    del idea['segment']
+    with pytest.raises(ValueError, match='segment'):
+        generation_pipeline._idea_row('run', 0, idea)
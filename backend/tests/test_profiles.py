@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from src.models.profiles import async_database_url, has_async_driver
+
+
+def test_async_url_uses_the_asyncio_driver_of_the_backend():
+    assert async_database_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert async_database_url("postgresql://user:secret@db/app") == "postgresql+asyncpg://user:secret@db/app"
+
+
+def test_backends_without_async_driver_are_detected():
+    assert has_async_driver("postgresql+psycopg2://db/app")
+    assert not has_async_driver("mysql+pymysql://db/app")
+
+
+def test_api_refuses_to_start_without_async_engine(monkeypatch):
+    from src import main
+
+    monkeypatch.setattr(main, 'async_engine', None)
+    with pytest.raises(RuntimeError, match="asyncio driver"):
+        asyncio.run(main.startup_event())
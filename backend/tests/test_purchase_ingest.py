@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import fakeredis
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import async_engine, Run, Idea, Purchase, IdeaPurchaseTotal, PurchaseBucket
+from src.services import redis_client
+from src.services.purchase_ingest import BUFFER_KEY, FLUSH_LOCK_KEY, buffer_purchase, flush_once
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(redis_client, '_async_redis_conn', fake)
+    return fake
+
+
+@pytest.fixture
+def idea_id(db):
+    run = Run(id=os.urandom(8).hex(), status='completed')
+    idea = Idea(
+        run_id=run.id, title="Idea", pain_description="pain", segment="segment",
+        confidence_level="high", brief_evidence="evidence", plan_7days="plan", plan_30days="plan"
+    )
+    db.add_all([run, idea])
+    db.commit()
+    return idea.id
+
+
+def _event(idea_id: int, key: str) -> dict:
+    return {
+        'idea_id': idea_id, 'run_id': None, 'created_at': datetime(2025, 1, 1, 10).isoformat(),
+        'user_ip': None, 'user_agent': "test", 'idempotency_key': key
+    }
+
+
+def _counts(db) -> tuple:
+    db.expire_all()
+    return (
+        db.scalar(select(func.count(Purchase.id))),
+        db.scalar(select(func.sum(IdeaPurchaseTotal.purchase_count))),
+        db.scalar(select(func.sum(PurchaseBucket.purchase_count))),
+    )
+
+
+def _run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            # Pooled connections belong to this event loop
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+def test_duplicates_within_a_batch_and_malformed_events_are_skipped(db, redis, idea_id):
+    async def scenario():
+        await buffer_purchase(_event(idea_id, 'a'))
+        await buffer_purchase(_event(idea_id, 'a'))
+        await buffer_purchase(_event(idea_id, 'b'))
+        await redis.rpush(BUFFER_KEY, b"not json", json.dumps({'idea_id': idea_id}))
+        return await flush_once(), await redis.llen(BUFFER_KEY)
+
+    assert _run(scenario()) == (5, 0)
+    assert _counts(db) == (2, 2, 2)
+
+
+def test_replayed_batch_is_not_counted_twice(db, redis, idea_id):
+    events = [_event(idea_id, key) for key in ('a', 'b', 'c')]
+
+    async def scenario():
+        for event in events:
+            await buffer_purchase(event)
+        await flush_once()
+        # A crash between commit and trim leaves the batch in the buffer
+        for event in events:
+            await buffer_purchase(event)
+        return await flush_once(), await redis.llen(BUFFER_KEY)
+
+    assert _run(scenario()) == (3, 0)
+    assert _counts(db) == (3, 3, 3)
+
+
+def test_failed_commit_leaves_the_buffer_untouched(db, redis, idea_id, monkeypatch):
+    async def failing_commit(self):
+        raise RuntimeError("database is gone")
+
+    monkeypatch.setattr(AsyncSession, 'commit', failing_commit)
+
+    async def scenario():
+        await buffer_purchase(_event(idea_id, 'a'))
+        await buffer_purchase(_event(idea_id, 'b'))
+        with pytest.raises(RuntimeError):
+            await flush_once()
+        return await redis.llen(BUFFER_KEY), await redis.exists(FLUSH_LOCK_KEY)
+
+    assert _run(scenario()) == (2, 0)
+    assert _counts(db) == (0, None, None)
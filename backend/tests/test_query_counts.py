@@ -0,0 +1,77 @@
+"""
+The idea detail and admin purchases endpoints issue a fixed number of
+queries however many rows they return, i.e. no read path falls back to a
+lazy load per row
+"""
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import ideas, purchases
+from src.config import settings
+from src.models import async_engine, Run, Idea, Analogue, Purchase
+from src.models.query_count import assert_query_count
+from src.services.purchase_service import record_rollups
+from src.services.response_cache import response_cache
+
+SIZES = {
+    'small': (1, 1),
+    'large': (3, 200),
+}
+
+
+@pytest.fixture
+def client(fake_redis, db):
+    # Ids restart with the fresh schema: drop responses of earlier tests
+    response_cache.clear()
+    app = FastAPI()
+    app.include_router(ideas.router, prefix="/api")
+    app.include_router(purchases.router, prefix="/api")
+    with TestClient(app) as client:
+        yield client
+    # Pooled connections belong to the client's event loop
+    asyncio.run(async_engine.dispose())
+
+
+def _seed(db, analogues: int, purchase_count: int) -> int:
+    run = Run(status='completed')
+    run.id = os.urandom(8).hex()
+    db.add(run)
+    idea = Idea(
+        run_id=run.id, title="Idea", pain_description="pain", segment="segment",
+        confidence_level="high", brief_evidence="evidence", plan_7days="plan", plan_30days="plan"
+    )
+    idea.analogues = [
+        Analogue(name=f"Analogue {i}", description="description", url="https://example.com", order_index=i)
+        for i in range(analogues)
+    ]
+    db.add(idea)
+    db.flush()
+    now = datetime.utcnow()
+    db.add_all(Purchase(idea_id=idea.id, run_id=run.id, created_at=now) for _ in range(purchase_count))
+    record_rollups(db, [(idea.id, run.id, now)] * purchase_count)
+    db.commit()
+    return idea.id
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_idea_detail_is_one_query(client, db, size):
+    idea_id = _seed(db, *SIZES[size])
+
+    with assert_query_count(async_engine, 1):
+        response = client.get(f"/api/ideas/{idea_id}")
+    response.raise_for_status()
+    assert len(response.json()['analogues']) == SIZES[size][0]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_admin_purchases_is_three_queries(client, db, size):
+    _seed(db, *SIZES[size])
+
+    with assert_query_count(async_engine, 3):
+        response = client.get("/api/admin/purchases", headers={'X-API-Key': settings.admin_api_key})
+    response.raise_for_status()
@@ -0,0 +1,44 @@
+from starlette.requests import Request
+
+from src.services import response_cache as cache_module
+from src.services.response_cache import ResponseCache, cached_response, etag_of, serialize
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: now[0])
+    cache = ResponseCache(max_bytes=1024, ttl_seconds=300)
+
+    body, etag = cache.put('idea:1', {'id': 1})
+    assert cache.get('idea:1') == (body, etag) == (serialize({'id': 1}), etag_of(serialize({'id': 1})))
+
+    now[0] += 300
+    assert cache.get('idea:1') is None
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    body = serialize({'id': 0, 'text': 'x' * 40})
+    cache = ResponseCache(max_bytes=len(body) * 2, ttl_seconds=300)
+
+    cache.put('idea:0', {'id': 0, 'text': 'x' * 40})
+    cache.put('idea:1', {'id': 1, 'text': 'x' * 40})
+    cache.get('idea:0')
+    cache.put('idea:2', {'id': 2, 'text': 'x' * 40})
+
+    assert cache.get('idea:1') is None
+    assert cache.get('idea:0') is not None
+    assert cache.get('idea:2') is not None
+
+
+def test_browsers_keep_responses_longer_than_the_process(monkeypatch):
+    monkeypatch.setattr(cache_module.settings, 'response_cache_ttl_seconds', 300)
+    monkeypatch.setattr(cache_module.settings, 'response_cache_max_age_seconds', 86400)
+    body = serialize({'id': 1})
+    request = Request({'type': 'http', 'headers': [(b'if-none-match', etag_of(body).encode())]})
+
+    response = cached_response(request, (body, etag_of(body)))
+
+    assert response.status_code == 304
+    assert response.headers['cache-control'] == "public, max-age=86400, immutable"
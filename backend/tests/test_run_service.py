@@ -0,0 +1,26 @@
+import asyncio
+
+from src.models import AsyncSessionLocal, async_engine
+from src.services import admission, scheduler
+from src.services.run_service import cancel_run_async, create_run_async
+
+
+def test_run_created_and_cancelled_through_the_api_path(fake_redis, db, monkeypatch):
+    monkeypatch.setitem(admission._fleet_cache, 'expires_at', 0.0)
+    monkeypatch.setattr(scheduler.settings, 'pipeline_mode', 'monolithic')
+
+    async def main():
+        try:
+            async with AsyncSessionLocal() as session:
+                run = await create_run_async(session, 'Логистика', client_key='ip:1')
+                waiting = await asyncio.to_thread(admission.waiting_runs)
+                cancelled = await cancel_run_async(session, run.id)
+                return waiting, cancelled.status
+        finally:
+            await async_engine.dispose()
+
+    waiting, status = asyncio.run(main())
+
+    assert waiting == 1
+    assert status == 'cancelled'
+    assert admission.waiting_runs() == 0
@@ -0,0 +1,25 @@
+from starlette.requests import Request
+
+from src.api.runs import CreateRunRequest, granted_priority
+
+
+def _request(**headers) -> Request:
+    return Request({
+        'type': 'http',
+        'headers': [(name.replace('_', '-').lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_runs_default_to_the_default_class():
+    assert CreateRunRequest().priority == 'default'
+    assert granted_priority(_request(), CreateRunRequest().priority) == 'default'
+
+
+def test_interactive_is_only_granted_to_browsers():
+    assert granted_priority(_request(), 'interactive') == 'default'
+    assert granted_priority(_request(Sec_Fetch_Mode='cors'), 'interactive') == 'interactive'
+
+
+def test_api_key_callers_run_as_bulk():
+    assert granted_priority(_request(X_API_Key='secret', Sec_Fetch_Mode='cors'), 'interactive') == 'bulk'
+    assert granted_priority(_request(X_API_Key='secret'), 'default') == 'bulk'
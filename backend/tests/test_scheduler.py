@@ -0,0 +1,62 @@
+import pytest
+
+from src.services import admission, scheduler
+from src.workers.async_worker import WORKER_KEY_PREFIX
+
+
+@pytest.fixture(autouse=True)
+def fresh_fleet(fake_redis, monkeypatch):
+    monkeypatch.setitem(admission._fleet_cache, 'expires_at', 0.0)
+    monkeypatch.setattr(scheduler.settings, 'scheduler_dispatch_window', 2)
+    monkeypatch.setattr(scheduler.settings, 'pipeline_mode', 'monolithic')
+
+
+def _worker(fake_redis, concurrency: int, in_flight: int):
+    fake_redis.hset(f"{WORKER_KEY_PREFIX}test", mapping={'concurrency': concurrency, 'in_flight': in_flight})
+
+
+def _submit(run_id: str, priority: str):
+    scheduler.submit(run_id, 'ip:1', priority)
+    scheduler.dispatch()
+
+
+def test_interactive_run_on_idle_fleet_does_not_preempt(fake_redis):
+    _worker(fake_redis, concurrency=4, in_flight=1)
+    fake_redis.zadd(scheduler.RUNNING_BULK_KEY, {'bulk1': 1})
+
+    _submit('int1', 'interactive')
+
+    assert not fake_redis.exists(scheduler._preempt_key('bulk1'))
+    assert scheduler.pending_count() == 0
+
+
+def test_interactive_run_with_free_slot_but_full_window_does_not_preempt(fake_redis):
+    _worker(fake_redis, concurrency=4, in_flight=1)
+    fake_redis.zadd(scheduler.RUNNING_BULK_KEY, {'bulk1': 1})
+    _submit('bulk2', 'bulk')
+    _submit('bulk3', 'bulk')
+
+    _submit('int1', 'interactive')
+
+    assert scheduler.pending_position('int1') == 0
+    assert not fake_redis.exists(scheduler._preempt_key('bulk1'))
+
+
+def test_interactive_run_on_busy_fleet_preempts_newest_bulk_run(fake_redis):
+    _worker(fake_redis, concurrency=2, in_flight=2)
+    fake_redis.zadd(scheduler.RUNNING_BULK_KEY, {'bulk1': 1, 'bulk2': 2})
+    _submit('bulk3', 'bulk')
+    _submit('bulk4', 'bulk')
+
+    _submit('int1', 'interactive')
+
+    assert fake_redis.exists(scheduler._preempt_key('bulk2'))
+    assert not fake_redis.exists(scheduler._preempt_key('bulk1'))
+
+
+def test_check_preempted_raises_once(fake_redis):
+    fake_redis.set(scheduler._preempt_key('bulk1'), 1)
+
+    with pytest.raises(scheduler.RunPreempted):
+        scheduler.check_preempted('bulk1')
+    scheduler.check_preempted('bulk1')
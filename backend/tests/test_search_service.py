@@ -0,0 +1,104 @@
+"""Idea search against a migrated SQLite database (FTS5 index of migration 0006)"""
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.migrations import upgrade
+from src.models import Run, Idea, Analogue
+from src.models.profiles import create_async_engine_for, create_sync_engine
+from src.services.search_service import search_ideas_async, sqlite_match_query
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'search.db'}"
+    upgrade(create_sync_engine(url))
+    return url
+
+
+def _seed(database_url: str, *ideas) -> list:
+    """ideas: (title, pain_description, analogue names)"""
+    with Session(create_sync_engine(database_url)) as db:
+        run = Run(id=os.urandom(8).hex(), status='completed')
+        db.add(run)
+        rows = []
+        for title, pain, analogues in ideas:
+            idea = Idea(
+                run_id=run.id, title=title, pain_description=pain, segment="segment",
+                confidence_level="high", brief_evidence="evidence", plan_7days="plan", plan_30days="plan"
+            )
+            idea.analogues = [
+                Analogue(name=name, description="description", url="https://example.com", order_index=i)
+                for i, name in enumerate(analogues)
+            ]
+            rows.append(idea)
+        db.add_all(rows)
+        db.commit()
+        return [idea.id for idea in rows]
+
+
+def _search(database_url: str, q: str, cursor=None, limit: int = 20) -> dict:
+    async def main():
+        engine = create_async_engine_for(database_url)
+        try:
+            async with AsyncSession(engine) as db:
+                return await search_ideas_async(db, q, cursor, limit)
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+def _ids(result: dict) -> list:
+    return [item['id'] for item in result['items']]
+
+
+def test_fts_operators_in_the_query_are_plain_words(database_url):
+    budget, = _seed(database_url, ("Budget and planning", "pain", []))
+
+    assert sqlite_match_query('budget AND (x* NEAR "y"') == '"budget" "AND" "x"* "NEAR" "y"'
+    assert sqlite_match_query('( " *') is None
+    assert _ids(_search(database_url, 'budget AND')) == [budget]
+    assert _ids(_search(database_url, 'budget NOT')) == []
+    assert _ids(_search(database_url, '( " *')) == []
+
+
+def test_only_words_ending_with_a_star_match_as_prefixes(database_url):
+    planning, = _seed(database_url, ("Planning tool", "pain", []))
+
+    assert _ids(_search(database_url, 'plan')) == []
+    result = _search(database_url, 'plan*')
+    assert _ids(result) == [planning]
+    assert result['items'][0]['title'] == "<mark>Planning</mark> tool"
+
+
+def test_folded_matches_are_marked_in_escaped_text(database_url):
+    _seed(database_url, ("Café <b>for</b> CAFE owners", "Очень дорогой кофе в кафе", []))
+
+    item, = _search(database_url, 'cafe кафе')['items']
+
+    assert item['title'] == "<mark>Café</mark> &lt;b&gt;for&lt;/b&gt; <mark>CAFE</mark> owners"
+    assert item['snippet'] == "Очень дорогой кофе в <mark>кафе</mark>"
+
+
+def test_cursor_pages_through_tied_ranks_once_each(database_url):
+    ids = _seed(database_url, *[("Same idea", "same pain", [])] * 5)
+    assert len({item['score'] for item in _search(database_url, 'same')['items']}) == 1
+
+    seen, cursor = [], None
+    while True:
+        page = _search(database_url, 'same', cursor, limit=2)
+        seen += _ids(page)
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == sorted(ids)
+
+
+def test_analogue_names_are_searchable(database_url):
+    with_analogue, _ = _seed(database_url, ("Notes", "pain", ["Notion"]), ("Other", "pain", ["Trello"]))
+
+    assert _ids(_search(database_url, 'notion')) == [with_analogue]
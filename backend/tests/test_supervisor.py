@@ -0,0 +1,41 @@
+import pytest
+from rq import Queue
+
+from src.services import scheduler
+from src.workers.supervisor import Supervisor
+
+
+@pytest.fixture
+def supervisor(fake_redis, monkeypatch):
+    monkeypatch.setattr(scheduler.settings, 'scheduler_dispatch_window', 2)
+    monkeypatch.setattr(scheduler.settings, 'pipeline_mode', 'monolithic')
+    sup = Supervisor(min_workers=1, max_workers=8, concurrency=2)
+    sup.connection = fake_redis
+    sup.queues = [Queue(name, connection=fake_redis) for name in sup.queue_names]
+    return sup
+
+
+def test_burst_held_by_the_scheduler_scales_to_the_backlog(supervisor, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scheduler.time, 'time', lambda: now[0])
+    for i in range(50):
+        scheduler.submit(f"run{i}", f"ip:{i}", 'default')
+    scheduler.dispatch()
+    now[0] += 45
+
+    stats = supervisor.queue_stats()
+
+    # Two runs in RQ (the dispatch window), the rest held by the scheduler
+    assert stats['depth'] == 50
+    assert stats['oldest_age'] == 45
+    assert supervisor.desired_workers(stats['depth'], stats['oldest_age'], in_flight=0) == 8
+
+
+def test_removed_runs_leave_the_backlog_age(supervisor):
+    scheduler.submit('run1', 'ip:1', 'bulk')
+    assert supervisor.queue_stats()['depth'] == 1
+
+    scheduler.remove_pending('run1')
+
+    assert scheduler.pending_count() == 0
+    assert scheduler.oldest_pending_age() == 0
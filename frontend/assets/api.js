@@ -47,7 +47,8 @@ class ApiClient {
         return this.request('/api/runs', {
             method: 'POST',
             body: JSON.stringify({
-                optional_direction: optionalDirection || undefined
+                optional_direction: optionalDirection || undefined,
+                priority: 'interactive'
             })
         });
     }
@@ -56,6 +57,12 @@ class ApiClient {
         return this.request(`/api/runs/${runId}`);
     }
 
+    async cancelRun(runId) {
+        return this.request(`/api/runs/${runId}/cancel`, {
+            method: 'POST'
+        });
+    }
+
     async getRunIdeas(runId) {
         return this.request(`/api/runs/${runId}/ideas`);
     }
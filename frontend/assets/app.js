@@ -131,7 +131,7 @@ async function pollRunStatus(runId) {
             if (data.status === 'completed') {
                 clearInterval(interval);
                 window.location.href = `results.html?run_id=${runId}`;
-            } else if (data.status === 'failed') {
+            } else if (data.status === 'failed' || data.status === 'cancelled') {
                 clearInterval(interval);
                 showError(data.error_message || 'Прогон завершился с ошибкой');
             } else if (attempts >= maxAttempts) {
@@ -275,10 +275,13 @@ async function toggleDetailedEvidence() {
         button.textContent = 'Отправка...';
 
         try {
-            // Send purchase request to API
+            // Send purchase request to API; the key makes a retried click count once
+            const idempotencyKey = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : `${ideaId}-${Date.now()}-${Math.random().toString(36).slice(2)}`;
             const response = await fetch(`${API_BASE_URL}/api/purchases`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
                 body: JSON.stringify({ idea_id: ideaId })
             });
 